@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger("quiet_budget")
+
+
+def _env(name: str, default):
+    return type(default)(os.getenv(name, default))
+
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Expensive routes by class; everything else (marketing pages, dashboards, static) is never queued.
+ROUTE_CLASSES = {
+    ("POST", "/login"): "auth",
+    ("POST", "/register"): "auth",
+    ("POST", "/security/password"): "auth",
+    ("POST", "/check"): "write",
+    ("POST", "/api/v1/check"): "write",
+    ("POST", "/companion"): "write",
+    ("POST", "/companion/stream"): "write",
+    ("POST", "/account/export"): "write",
+}
+
+
+BUSY_MESSAGE = "We're busy right now. Please retry shortly."
+
+
+class Overloaded(Exception):
+    def __init__(self, gate: str, reason: str, retry_after: int):
+        super().__init__(f"{gate} {reason}")
+        self.gate = gate
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Gate:
+    """At most `limit` requests in flight, `queue` waiting, none waiting past `wait_seconds`."""
+
+    def __init__(self, name: str, limit: int, queue: int, wait_seconds: float):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.wait_seconds = wait_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "deadline": 0}
+        self._sem = None
+        self._loop = None
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._sem
+
+    def _reject(self, reason: str):
+        self.shed[reason] += 1
+        raise Overloaded(self.name, reason, max(1, math.ceil(self.wait_seconds)))
+
+    async def acquire(self):
+        sem = self._semaphore()
+        if sem.locked() and self.waiting >= self.queue:
+            self._reject("queue_full")
+        if not sem.locked():
+            await sem.acquire()
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                self._reject("deadline")
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._sem.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+GATES = {
+    # bcrypt hashing is CPU-bound, so keep this well under the threadpool size.
+    "auth": Gate(
+        "auth",
+        limit=_env("ADMISSION_AUTH_LIMIT", 4),
+        queue=_env("ADMISSION_AUTH_QUEUE", 16),
+        wait_seconds=_env("ADMISSION_AUTH_WAIT", 1.5),
+    ),
+    "write": Gate(
+        "write",
+        limit=_env("ADMISSION_WRITE_LIMIT", 8),
+        queue=_env("ADMISSION_WRITE_QUEUE", 32),
+        wait_seconds=_env("ADMISSION_WRITE_WAIT", 2.0),
+    ),
+}
+
+
+def gate_for(method: str, path: str) -> Gate | None:
+    if not ADMISSION_ENABLED:
+        return None
+    route_class = ROUTE_CLASSES.get((method, path.rstrip("/") or "/"))
+    return GATES.get(route_class) if route_class else None
+
+
+class AdmissionMiddleware:
+    """Pure ASGI and outermost, so the permit covers the whole response body.
+
+    A permit is given back once the last body chunk is sent (or the request ends
+    any other way), so streaming routes stay limited while they stream but
+    background tasks run outside the gate. Shed requests get a plain 503 that
+    never reaches the app.
+    """
+
+    def __init__(self, app, headers: dict | None = None):
+        self.app = app
+        self.headers = headers or {}
+
+    async def __call__(self, scope, receive, send):
+        gate = gate_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await gate.acquire()
+        except Overloaded as exc:
+            logger.warning("Shed %s %s (%s)", scope["method"], scope["path"], exc)
+            await self._shed(send, scope["path"], exc.retry_after)
+            return
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                gate.release()
+
+        async def send_and_release(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
+
+    async def _shed(self, send, path: str, retry_after: int):
+        if path.startswith(("/api/", "/companion")):
+            body, content_type = json.dumps({"error": BUSY_MESSAGE}).encode(), b"application/json"
+        else:
+            body, content_type = BUSY_MESSAGE.encode(), b"text/plain; charset=utf-8"
+        headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode()),
+                   (b"retry-after", str(retry_after).encode())]
+        headers += [(name.lower().encode(), value.encode()) for name, value in self.headers.items()]
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def metrics_lines() -> list[str]:
+    """Prometheus text exposition lines for every gate."""
+    lines = [
+        "# TYPE qbc_admission_in_flight gauge",
+        "# TYPE qbc_admission_queue_depth gauge",
+        "# TYPE qbc_admission_limit gauge",
+        "# TYPE qbc_admission_admitted_total counter",
+        "# TYPE qbc_admission_shed_total counter",
+    ]
+    for gate in GATES.values():
+        label = f'class="{gate.name}"'
+        lines.append(f"qbc_admission_in_flight{{{label}}} {gate.in_flight}")
+        lines.append(f"qbc_admission_queue_depth{{{label}}} {gate.waiting}")
+        lines.append(f"qbc_admission_limit{{{label}}} {gate.limit}")
+        lines.append(f"qbc_admission_admitted_total{{{label}}} {gate.admitted}")
+        for reason, count in gate.shed.items():
+            lines.append(f'qbc_admission_shed_total{{{label},reason="{reason}"}} {count}')
+    return lines
@@ -0,0 +1,194 @@
+import argparse
+import logging
+import math
+from datetime import datetime
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from db import AlertOutbox, AlertRule
+import shards
+
+MAX_RULES_PER_USER = 20
+
+# kind -> (label, min threshold, max threshold)
+RULE_KINDS = {
+    "non_ok_streak": ("Consecutive checks that are not on track", 1, 60),
+    "drift_above": ("Overspend above % of daily budget", 0, 1000),
+    "score_below": ("Health score below", 0, 100),
+    "runway_below": ("Runway at today's pace below (days)", 1, 365),
+}
+
+
+class RuleError(ValueError):
+    pass
+
+
+def validate_rule(kind: str, threshold) -> float:
+    if kind not in RULE_KINDS:
+        raise RuleError("Unknown alert type.")
+    try:
+        threshold = float(threshold)
+    except (TypeError, ValueError):
+        raise RuleError("Threshold must be a number.") from None
+    _, low, high = RULE_KINDS[kind]
+    if not math.isfinite(threshold) or not low <= threshold <= high:
+        raise RuleError(f"Threshold must be between {low} and {high}.")
+    return threshold
+
+
+def drift_pct(today: float, budget: float) -> float:
+    if budget <= 0:
+        return math.inf
+    return (today - budget) / budget * 100
+
+
+def runway_days(income: float, fixed: float, today: float) -> float:
+    """How long this period's spendable money lasts at today's spend."""
+    if today <= 0:
+        return math.inf
+    return max(0.0, income - fixed) / today
+
+
+def _observe(rule: AlertRule, status: str, drift: float, runway: float, score: int):
+    """Advance the rule's state; returns (condition holds, observed value)."""
+    if rule.kind == "non_ok_streak":
+        rule.streak = rule.streak + 1 if status != "ok" else 0
+        return rule.streak >= rule.threshold, rule.streak
+    if rule.kind == "drift_above":
+        return drift > rule.threshold, drift
+    if rule.kind == "score_below":
+        return score < rule.threshold, score
+    if rule.kind == "runway_below":
+        return runway < rule.threshold, runway
+    return False, 0
+
+
+def _message(rule: AlertRule, value: float) -> str:
+    if rule.kind == "non_ok_streak":
+        return f"{int(value)} checks in a row were not on track."
+    if rule.kind == "drift_above":
+        if math.isinf(value):
+            return "Nothing is left in your daily budget."
+        return f"Today's spend ran {value:.0f}% over your daily budget."
+    if rule.kind == "score_below":
+        return f"Your health score dropped to {int(value)}."
+    return f"At today's pace your money lasts about {value:.0f} days."
+
+
+def evaluate_check(
+    session: Session,
+    user_id: int,
+    status: str,
+    income: float,
+    fixed: float,
+    today: float,
+    budget: float,
+    score: int,
+) -> list[AlertOutbox]:
+    """Run the user's enabled rules against one new check; O(rules for this user).
+
+    Alerts are edge-triggered: a rule fires when its condition starts holding and
+    re-arms once a later check clears it.
+    """
+    rules = session.exec(
+        select(AlertRule).where(AlertRule.user_id == user_id, AlertRule.enabled.is_(True))
+    ).all()
+    if not rules:
+        return []
+
+    drift = drift_pct(today, budget)
+    runway = runway_days(income, fixed, today)
+    fired = []
+    for rule in rules:
+        holds, value = _observe(rule, status, drift, runway, score)
+        if holds and not rule.firing:
+            alert = AlertOutbox(
+                user_id=user_id,
+                rule_id=rule.id,
+                kind=rule.kind,
+                value=value if math.isfinite(value) else -1.0,
+                message=_message(rule, value),
+            )
+            session.add(alert)
+            fired.append(alert)
+        rule.firing = holds
+        session.add(rule)
+    return fired
+
+
+def list_rules(session: Session, user_id: int) -> list[AlertRule]:
+    return session.exec(select(AlertRule).where(AlertRule.user_id == user_id).order_by(AlertRule.id)).all()
+
+
+def add_rule(session: Session, user_id: int, kind: str, threshold) -> AlertRule:
+    threshold = validate_rule(kind, threshold)
+    if len(list_rules(session, user_id)) >= MAX_RULES_PER_USER:
+        raise RuleError(f"You can keep up to {MAX_RULES_PER_USER} alerts.")
+    rule = AlertRule(user_id=user_id, kind=kind, threshold=threshold)
+    session.add(rule)
+    return rule
+
+
+def delete_rule(session: Session, rule: AlertRule):
+    session.exec(delete(AlertOutbox).where(AlertOutbox.rule_id == rule.id))
+    session.delete(rule)
+
+
+def rule_view(rule: AlertRule) -> dict:
+    return {
+        "id": rule.id,
+        "kind": rule.kind,
+        "label": RULE_KINDS[rule.kind][0],
+        "threshold": rule.threshold,
+        "enabled": rule.enabled,
+        "firing": rule.firing,
+    }
+
+
+def alert_view(alert: AlertOutbox) -> dict:
+    return {
+        "id": alert.id,
+        "kind": alert.kind,
+        "message": alert.message,
+        "created_at": alert.created_at.isoformat(),
+        "delivered": alert.delivered_at is not None,
+    }
+
+
+def deliver_pending(send, batch: int = 100) -> int:
+    """Hand undelivered alerts to `send(alert)`, oldest first per shard, marking each as delivered."""
+    delivered = 0
+    for eng in shards.all_engines():
+        with Session(eng) as session:
+            pending = session.exec(
+                select(AlertOutbox)
+                .where(AlertOutbox.delivered_at.is_(None))
+                .order_by(AlertOutbox.id)
+                .limit(batch)
+            ).all()
+            for alert in pending:
+                send(alert)
+                alert.delivered_at = datetime.utcnow()
+                session.add(alert)
+                delivered += 1
+            session.commit()
+    return delivered
+
+
+def _log_alert(alert: AlertOutbox):
+    logging.info("Alert for user %s (%s): %s", alert.user_id, alert.kind, alert.message)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Spending alert outbox.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("deliver", help="log and mark pending alerts as delivered")
+    p.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    print(f"Delivered {deliver_pending(_log_alert, batch=args.batch)} alerts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import csv
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from db import CheckHistory, DailyCheckRollup, HealthScoreHistory
+from shards import all_engines
+
+ANALYTICS_TTL_SECONDS = int(os.getenv("ANALYTICS_TTL_SECONDS", "60"))
+HIGH_RISK_SCORE = 55
+HISTOGRAM_BUCKET = 10
+
+# Fleet queries run here, never on the request-serving threadpool.
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+
+_checks = CheckHistory.__table__.c
+_scores = HealthScoreHistory.__table__.c
+_rollups = DailyCheckRollup.__table__
+ROLLUP_COUNTS = ("checks", "ok", "caution", "danger", "users")
+
+_cache: dict[int, tuple[float, dict]] = {}
+_cache_lock = threading.Lock()
+
+
+def refresh_daily_rollups(conn, now: datetime | None = None) -> int:
+    """Re-aggregate from the last rolled-up day (it may have been partial) onwards."""
+    now = now or datetime.utcnow()
+    last_day = conn.execute(select(func.max(_rollups.c.day))).scalar()
+    since = datetime.strptime(last_day, "%Y-%m-%d") if last_day else datetime(1970, 1, 1)
+
+    day = func.date(_checks.created_at)
+    rows = conn.execute(
+        select(
+            day.label("day"),
+            func.count().label("checks"),
+            func.sum(case((_checks.status == "ok", 1), else_=0)).label("ok"),
+            func.sum(case((_checks.status == "caution", 1), else_=0)).label("caution"),
+            func.sum(case((_checks.status.not_in(("ok", "caution")), 1), else_=0)).label("danger"),
+            func.count(func.distinct(_checks.user_id)).label("users"),
+        )
+        .where(_checks.created_at >= since)
+        .group_by(day)
+    ).mappings().all()
+    if not rows:
+        return 0
+
+    stmt = sqlite_insert(_rollups).values([{**row, "updated_at": now} for row in rows])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_rollups.c.day],
+        set_={col: stmt.excluded[col] for col in ("checks", "ok", "caution", "danger", "users", "updated_at")},
+    )
+    conn.execute(stmt)
+    return len(rows)
+
+
+def _latest_scores():
+    ranked = select(
+        _scores.score,
+        func.row_number()
+        .over(partition_by=_scores.user_id, order_by=(_scores.created_at.desc(), _scores.id.desc()))
+        .label("rn"),
+    ).subquery()
+    return select(ranked.c.score).where(ranked.c.rn == 1).subquery()
+
+
+def _database_figures(conn, start_day: str, now: datetime):
+    refresh_daily_rollups(conn, now=now)
+    daily = conn.execute(
+        select(_rollups.c.day, _rollups.c.checks, _rollups.c.ok, _rollups.c.caution, _rollups.c.danger, _rollups.c.users)
+        .where(_rollups.c.day >= start_day)
+        .order_by(_rollups.c.day)
+    ).mappings().all()
+
+    latest = _latest_scores()
+    bucket = (latest.c.score // HISTOGRAM_BUCKET) * HISTOGRAM_BUCKET
+    histogram = conn.execute(
+        select(bucket.label("bucket"), func.count().label("users"))
+        .group_by(bucket)
+        .order_by(bucket)
+    ).mappings().all()
+    users_scored, high_risk = conn.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((latest.c.score < HIGH_RISK_SCORE, 1), else_=0)), 0),
+        )
+    ).one()
+    return daily, histogram, users_scored, high_risk
+
+
+def fleet_analytics(days: int = 30, now: datetime | None = None) -> dict:
+    now = now or datetime.utcnow()
+    start_day = (now - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    # With sharding every shard holds a disjoint set of users, so the figures add up.
+    daily_by_day: dict[str, dict] = {}
+    histogram: dict[int, int] = {}
+    users_scored = high_risk = 0
+    for eng in all_engines():
+        with eng.begin() as conn:
+            shard_daily, shard_histogram, shard_scored, shard_high_risk = _database_figures(conn, start_day, now)
+        for row in shard_daily:
+            merged = daily_by_day.setdefault(row["day"], dict.fromkeys(ROLLUP_COUNTS, 0) | {"day": row["day"]})
+            for key in ROLLUP_COUNTS:
+                merged[key] += row[key]
+        for row in shard_histogram:
+            histogram[int(row["bucket"])] = histogram.get(int(row["bucket"]), 0) + row["users"]
+        users_scored += shard_scored
+        high_risk += shard_high_risk
+    daily = [daily_by_day[day] for day in sorted(daily_by_day)]
+
+    status = {
+        "ok": sum(row["ok"] for row in daily),
+        "caution": sum(row["caution"] for row in daily),
+        "danger": sum(row["danger"] for row in daily),
+    }
+    return {
+        "generated_at": now.isoformat(),
+        "days": days,
+        "checks": sum(row["checks"] for row in daily),
+        "status_distribution": status,
+        "daily": daily,
+        "score_histogram": [
+            {"from": bucket, "to": min(100, bucket + HISTOGRAM_BUCKET - 1), "users": users}
+            for bucket, users in sorted(histogram.items())
+        ],
+        "users_scored": users_scored,
+        "high_risk_users": high_risk,
+        "high_risk_share": round(high_risk / users_scored, 4) if users_scored else 0.0,
+    }
+
+
+def cached_fleet_analytics(days: int = 30) -> dict:
+    with _cache_lock:
+        hit = _cache.get(days)
+        if hit and time.monotonic() - hit[0] < ANALYTICS_TTL_SECONDS:
+            return hit[1]
+    result = fleet_analytics(days)
+    with _cache_lock:
+        _cache[days] = (time.monotonic(), result)
+    return result
+
+
+def peek_cached(days: int) -> dict | None:
+    with _cache_lock:
+        hit = _cache.get(days)
+    if hit and time.monotonic() - hit[0] < ANALYTICS_TTL_SECONDS:
+        return hit[1]
+    return None
+
+
+def to_csv(result: dict, table: str = "daily") -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if table == "scores":
+        writer.writerow(["score_from", "score_to", "users"])
+        for row in result["score_histogram"]:
+            writer.writerow([row["from"], row["to"], row["users"]])
+    else:
+        writer.writerow(["day", "checks", "ok", "caution", "danger", "users"])
+        for row in result["daily"]:
+            writer.writerow([row["day"], row["checks"], row["ok"], row["caution"], row["danger"], row["users"]])
+    return buf.getvalue()
@@ -1,11 +1,15 @@
-from fastapi import FastAPI, Request, Form, Response
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import BackgroundTasks, FastAPI, Request, Form, Response
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 from passlib.context import CryptContext
 from itsdangerous import URLSafeSerializer, BadSignature
 from urllib.parse import urlencode
+import asyncio
+import json
+import math
 import statistics
 import secrets
 import time
@@ -13,9 +17,54 @@ import os
 import logging
 from datetime import datetime, timedelta
 
-from db import engine, init_db, User, CheckHistory, Profile, HealthScoreHistory
+from db import (
+    engine,
+    async_engine,
+    init_db,
+    overspend_ratio,
+    User,
+    CheckHistory,
+    Profile,
+    HealthScoreHistory,
+    DashboardSnapshot,
+    AlertOutbox,
+    AlertRule,
+)
 from plans import PLANS
-from companion_service import CompanionContext, respond
+import admission
+import alerts
+import analytics
+from companion_service import CompanionContext, respond, respond_stream
+from conversation_store import conversations
+import data_export
+import event_log
+import fixtures
+import shards
+from shards import async_user_session, user_session
+import goals
+import memory_diag
+import scoring_models
+from scoring_models import ScoringModel, get_model as get_scoring_model
+import template_cache
+import tracing
+from history_archive import load_archived_checks
+from history_search import HistoryFilters, check_view, search_history
+from history_records import HistoryRecord, fetch_history_records, fetch_history_records_async
+from dashboard_snapshot import (
+    WARMUP_WAIT_SECONDS,
+    begin_warmup,
+    etag_matches,
+    finish_warmup,
+    is_fresh,
+    load_snapshot,
+    save_snapshot,
+    snapshot_etag,
+    wait_for_warmup,
+)
+from streaks import get_streaks, record_check_streak
+from spend_stats import get_spend_stats, record_check_spend, spend_view
+from wallet_ledger import get_wallet, record_check_wallet
+from score_series import DEFAULT_MAX_POINTS, compact_user_scores, score_series
 
 try:
     import stripe
@@ -33,10 +82,18 @@ STRIPE_PORTAL_RETURN_URL = os.getenv("STRIPE_PORTAL_RETURN_URL", f"{APP_BASE_URL
 PRO_PAYWALL_ENABLED = False
 DEMO_MODE = os.getenv("DEMO_MODE", "false").lower() == "true"
 DEMO_PRO_EMAIL = "admin@test.com"
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
+template_cache.install(templates.env)
+# The public quick check scores in the browser with the same model as the server.
+templates.env.globals["quick_check_model"] = scoring_models.client_config(get_scoring_model())
+tracing.instrument_jinja(templates.env)
+tracing.instrument_engine(engine)
+tracing.instrument_engine(async_engine.sync_engine)
+shards.add_engine_hook(tracing.instrument_engine)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 cookie_signer = URLSafeSerializer("CHANGE_ME_TO_A_LONG_RANDOM_SECRET", salt="auth")
@@ -44,6 +101,8 @@ csrf_signer = URLSafeSerializer("CHANGE_ME_TO_A_LONG_RANDOM_SECRET", salt="csrf"
 
 logging.basicConfig(level=logging.INFO)
 login_attempts = {}
+memory_diag.watch("login_attempts", lambda: len(login_attempts))
+memory_diag.watch("companion_conversations", lambda: len(conversations))
 
 
 def _now():
@@ -83,6 +142,16 @@ def clear_login_failures(ip: str):
         del login_attempts[ip]
 
 
+def check_input_error(income: float, fixed: float, today: float, days_left: int):
+    if not all(math.isfinite(v) for v in (income, fixed, today)):
+        return "Please check your inputs."
+    if income <= 0 or fixed < 0 or today < 0 or days_left <= 0:
+        return "Please check your inputs."
+    if income > 1_000_000 or fixed > 1_000_000 or today > 1_000_000 or days_left > 365:
+        return "Inputs look out of range."
+    return None
+
+
 def analyser_depense(revenu: float, fixes: float, depense: float, jours: int):
     budget_rest = revenu - fixes
     budget_jour = budget_rest / jours if jours > 0 else 0
@@ -173,97 +242,37 @@ def render_template(template: str, context: dict):
     return resp
 
 
+@tracing.traced("plan_state")
+def _plan_state(session: Session, user_id: int):
+    user = session.get(User, user_id)
+    if not user:
+        return "free"
+    # The demo account's profile and history come from `python -m fixtures demo` (or SEED_DEMO).
+    if (user.email or "").strip().lower() == DEMO_PRO_EMAIL:
+        return "pro"
+    return user.plan or "free"
+
+
 def get_plan_state_for_user(user_id: int | None):
     if not user_id:
         return "free"
+    with user_session(user_id) as session:
+        return _plan_state(session, user_id)
 
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.id == user_id)).first()
-        if not user:
-            return "free"
-        email = (user.email or "").strip().lower()
-        if email == DEMO_PRO_EMAIL:
-            changed = False
-            if user.plan != "pro":
-                user.plan = "pro"
-                user.stripe_status = "active"
-                changed = True
 
-            profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-            if not profile:
-                profile = Profile(
-                    user_id=user_id,
-                    first_name="Admin",
-                    last_name="User",
-                    city="Demo City",
-                    country="Demo Land",
-                    companion_tone="coach",
-                )
-                session.add(profile)
-                changed = True
-
-            has_history = session.exec(
-                select(CheckHistory)
-                .where(CheckHistory.user_id == user_id)
-                .limit(1)
-            ).first()
-            if not has_history:
-                sample_runs = [
-                    {"income": 3600.0, "fixed": 2150.0, "today": 72.0, "days": 14},
-                    {"income": 3600.0, "fixed": 2150.0, "today": 81.0, "days": 13},
-                    {"income": 3600.0, "fixed": 2150.0, "today": 96.0, "days": 12},
-                    {"income": 3600.0, "fixed": 2150.0, "today": 108.0, "days": 11},
-                    {"income": 3600.0, "fixed": 2150.0, "today": 84.0, "days": 10},
-                    {"income": 3600.0, "fixed": 2150.0, "today": 118.0, "days": 9},
-                ]
-                now = datetime.utcnow()
-                for idx, run in enumerate(sample_runs):
-                    budget, status, msg = analyser_depense(run["income"], run["fixed"], run["today"], run["days"])
-                    session.add(
-                        CheckHistory(
-                            user_id=user_id,
-                            net_income=run["income"],
-                            fixed_expenses=run["fixed"],
-                            today_expense=run["today"],
-                            days_left=run["days"],
-                            daily_budget=float(budget),
-                            status=status,
-                            message=msg,
-                            created_at=now - timedelta(days=(len(sample_runs) - idx)),
-                        )
-                    )
-                changed = True
-
-            has_scores = session.exec(
-                select(HealthScoreHistory)
-                .where(HealthScoreHistory.user_id == user_id)
-                .limit(1)
-            ).first()
-            if not has_scores:
-                recent = session.exec(
-                    select(CheckHistory)
-                    .where(CheckHistory.user_id == user_id)
-                    .order_by(CheckHistory.created_at.desc())
-                    .limit(20)
-                ).all()
-                score, meta = compute_health_score(recent)
-                session.add(
-                    HealthScoreHistory(
-                        user_id=user_id,
-                        score=score,
-                        label=health_label(score),
-                        reason=health_reason(recent, meta["breakdown"]),
-                    )
-                )
-                changed = True
-
-            if changed:
-                session.commit()
-            return "pro"
+async def get_plan_state_for_user_async(user_id: int | None):
+    if not user_id:
+        return "free"
+    async with async_user_session(user_id) as session:
+        return await session.run_sync(_plan_state, user_id)
 
-        if user.plan:
-            return user.plan
-    return "free"
+
+def is_admin(user_id: int | None):
+    if not user_id or not ADMIN_EMAILS:
+        return False
+    with Session(engine) as session:
+        user = session.get(User, user_id)
+    return bool(user) and (user.email or "").strip().lower() in ADMIN_EMAILS
 
 
 def require_pro(user_id: int | None):
@@ -312,23 +321,105 @@ def demo_history():
     ]
 
 
-def get_recent_history(user_id: int, limit: int = 15):
-    with Session(engine) as session:
-        history = session.exec(
-            select(CheckHistory)
-            .where(CheckHistory.user_id == user_id)
-            .order_by(CheckHistory.created_at.desc())
-            .limit(limit)
-        ).all()
+def _scoring_fallback(history: list[HistoryRecord]):
     if DEMO_MODE and not history:
-        return demo_history()
+        return [HistoryRecord.from_check(h) for h in demo_history()]
     return history
 
 
-def compute_health_score(history: list[CheckHistory]):
-    if not history:
-        return 62, {"trend": 0, "breakdown": {}, "risk": "moderate"}
+async def get_scoring_history_async(user_id: int, limit: int = 15):
+    return _scoring_fallback(await fetch_history_records_async(user_id, limit=limit))
+
 
+def _read_streaks(session: Session, user_id: int):
+    streaks = get_streaks(session, user_id)
+    session.commit()
+    return streaks
+
+
+async def get_streaks_async(user_id: int):
+    async with async_user_session(user_id) as session:
+        return await session.run_sync(_read_streaks, user_id)
+
+
+async def get_profile_async(user_id: int, create: bool = False):
+    async with async_user_session(user_id) as session:
+        profile = (await session.exec(select(Profile).where(Profile.user_id == user_id))).first()
+        if not profile and create:
+            profile = Profile(user_id=user_id)
+            session.add(profile)
+            await session.commit()
+            await session.refresh(profile)
+    return profile
+
+
+def record_check(
+    session: Session,
+    user_id: int,
+    income: float,
+    fixed: float,
+    today: float,
+    days_left: int,
+    budget: float,
+    status: str,
+    message: str,
+):
+    check = CheckHistory(
+        user_id=user_id,
+        net_income=income,
+        fixed_expenses=fixed,
+        today_expense=today,
+        days_left=days_left,
+        daily_budget=float(budget),
+        status=status,
+        message=message,
+        overspend_ratio=overspend_ratio(today, float(budget)),
+    )
+    session.add(check)
+    session.flush()
+    # Everything below is a projection the event log can rebuild; the check is logged on commit.
+    event_log.append_on_commit(session, event_log.CheckEvent(
+        user_id, check.created_at, check.net_income, check.fixed_expenses, check.today_expense,
+        check.daily_budget, check.days_left, check.status, check.message,
+    ))
+
+    spend = spend_view(record_check_spend(session, user_id, today, float(budget)))
+    recent = fetch_history_records(user_id, limit=20, conn=shards.connection_for(session))
+    score, meta = compute_health_score(recent, spend=spend)
+    session.add(HealthScoreHistory(
+        user_id=user_id,
+        score=score,
+        label=health_label(score),
+        reason=health_reason(recent, meta["breakdown"]),
+    ))
+    compact_user_scores(session, user_id)
+    record_check_streak(session, user_id, status)
+    alerts.evaluate_check(session, user_id, status, income, fixed, today, budget, score)
+    goals.record_check_goals(session, user_id, today, float(budget))
+    record_check_wallet(session, user_id, check.created_at, income, fixed, today, days_left)
+    refresh_dashboard_snapshot(session, user_id)
+    return score
+
+
+@tracing.traced("score")
+def compute_health_score(history: list[HistoryRecord], spend: dict | None = None, model: ScoringModel | None = None):
+    """Score the recent window; `spend` (spend_stats.spend_view) adds long-horizon signals
+    to the breakdown without changing the score itself."""
+    model = model or get_scoring_model()
+    if not history:
+        return model.empty_score, {"trend": 0, "breakdown": {}, "risk": model.band(model.empty_score)[0]}
+    score, cached = scoring_models.memo.get_or_compute(model, history, _score_window)
+    # The memo's copy is shared; callers get their own.
+    meta = {**cached, "breakdown": dict(cached["breakdown"])}
+    if spend:
+        # Long-run overspend control across every check, not just this window.
+        meta["breakdown"]["drift_baseline"] = int(round((1.0 - min(1.0, max(0.0, spend["drift_mean"]))) * 100))
+        meta["anomaly"] = spend["anomaly"]
+        meta["spend"] = spend
+    return score, meta
+
+
+def _score_window(history: list[HistoryRecord], model: ScoringModel):
     drifts = []
     cushions = []
     budgets = []
@@ -337,7 +428,6 @@ def compute_health_score(history: list[CheckHistory]):
     ok = 0
     caution = 0
     danger = 0
-
     for h in history:
         budgets.append(float(h.daily_budget or 0))
         if h.status == "ok":
@@ -375,20 +465,11 @@ def compute_health_score(history: list[CheckHistory]):
     else:
         consistency = stability
 
-    goal_alignment = (ok + (caution * 0.5)) / total
+    goal_alignment = (ok + (caution * model.caution_credit)) / total
 
     affordability = max(0.0, 1.0 - fixed_ratio)
     buffer = max(0.0, min(1.0, (cushion + runway_ratio) / 2))
-    weights = {
-        "stability": 0.2,
-        "acceleration": 0.18,
-        "buffer": 0.18,
-        "affordability": 0.14,
-        "goal_alignment": 0.12,
-        "consistency": 0.1,
-        "shock": 0.08,
-    }
-
+    weights = model.weights
     score = (
         stability * weights["stability"]
         + acceleration * weights["acceleration"]
@@ -401,12 +482,10 @@ def compute_health_score(history: list[CheckHistory]):
 
     score = max(0, min(100, int(round(score))))
 
-    recent = history[:5]
-    previous = history[5:10]
-    recent_score = score
+    previous = history[model.trend_window:model.trend_window * 2]
     if previous:
-        prev_score, _ = compute_health_score(previous)
-        trend = recent_score - prev_score
+        prev_score, _ = compute_health_score(previous, model=model)
+        trend = score - prev_score
     else:
         trend = 0
 
@@ -422,36 +501,20 @@ def compute_health_score(history: list[CheckHistory]):
         "shock": int(round(shock * 100)),
     }
 
-    if score >= 75:
-        risk = "low"
-    elif score >= 55:
-        risk = "moderate"
-    else:
-        risk = "high"
-
-    return score, {"trend": trend, "breakdown": breakdown, "risk": risk}
-
-
-def health_label(score: int):
-    if score >= 75:
-        return "Steady"
-    if score >= 55:
-        return "Building"
-    return "Alert"
-
-
-def health_reason(history: list[CheckHistory], breakdown: dict):
-    reasons = []
-    if breakdown.get("cushion", 0) < 40:
-        reasons.append("Low cushion ratio")
-    if breakdown.get("affordability", 0) < 45:
-        reasons.append("Fixed expenses are heavy")
-    if breakdown.get("runway", 0) < 45:
-        reasons.append("Short runway vs days left")
-    if breakdown.get("acceleration", 0) < 45:
-        reasons.append("High drift acceleration")
-    if breakdown.get("consistency", 0) < 50:
-        reasons.append("Irregular budget pattern")
+    return score, {"trend": trend, "breakdown": breakdown, "risk": model.band(score)[0]}
+
+
+def health_label(score: int, model: ScoringModel | None = None):
+    return (model or get_scoring_model()).band(score)[1]
+
+
+def health_reason(history: list[HistoryRecord], breakdown: dict, model: ScoringModel | None = None):
+    model = model or get_scoring_model()
+    reasons = [
+        text for metric, below, text in model.reasons
+        # A missing long-run baseline never counts against the user.
+        if breakdown.get(metric, 100 if metric == "drift_baseline" else 0) < below
+    ]
     if not reasons:
         reasons.append("Stable rhythm and pace")
     return "; ".join(reasons[:2])
@@ -460,18 +523,26 @@ def health_reason(history: list[CheckHistory], breakdown: dict):
 def companion_insights(health_meta: dict):
     tips = []
     b = health_meta.get("breakdown", {})
+    if health_meta.get("anomaly"):
+        spend = health_meta.get("spend", {})
+        tips.append(
+            f"Your last check was well above your usual spend (about {spend.get('spend_mean', 0):.0f}/day)"
+            "—was that a one-off?"
+        )
     if b.get("cushion", 0) < 40:
         tips.append("Increase your cash buffer by setting a small weekly transfer.")
     if b.get("acceleration", 0) < 45:
         tips.append("Today’s spend is drifting above pace—try a soft cap for 48 hours.")
     if b.get("consistency", 0) < 50:
         tips.append("Your rhythm varies a lot—consider a simpler weekly plan.")
+    if b.get("drift_baseline", 100) < 60:
+        tips.append("Over the long run you spend past your daily budget—lower the pace target a little.")
     if not tips:
         tips.append("Your rhythm looks steady. Keep the same pace this week.")
     return tips[:3]
 
 
-def top_drivers(breakdown: dict):
+def top_drivers(breakdown: dict, model: ScoringModel | None = None):
     metrics = {
         "Stability": breakdown.get("stability", 0),
         "Drift control": breakdown.get("acceleration", 0),
@@ -481,9 +552,11 @@ def top_drivers(breakdown: dict):
         "Consistency": breakdown.get("consistency", 0),
         "Shock": breakdown.get("shock", 0),
     }
+    if "drift_baseline" in breakdown:
+        metrics["Long-run drift"] = breakdown["drift_baseline"]
     ranked = sorted(metrics.items(), key=lambda x: x[1])
     drivers = []
-    for name, score in ranked[:3]:
+    for name, score in ranked[:(model or get_scoring_model()).drivers]:
         if name == "Fixed ratio":
             drivers.append((name, f"{score}% of income fixed"))
         else:
@@ -491,16 +564,9 @@ def top_drivers(breakdown: dict):
     return drivers
 
 
-def next_steps(breakdown: dict):
-    steps = []
-    if breakdown.get("cushion", 0) < 45:
-        steps.append("Add a small buffer transfer this week.")
-    if breakdown.get("acceleration", 0) < 50:
-        steps.append("Set a 48‑hour soft cap to reduce drift.")
-    if breakdown.get("consistency", 0) < 55:
-        steps.append("Pick a single weekly pace and stick to it.")
-    if breakdown.get("affordability", 0) < 45:
-        steps.append("Review fixed costs for a quick trim.")
+def next_steps(breakdown: dict, model: ScoringModel | None = None):
+    model = model or get_scoring_model()
+    steps = [text for metric, below, text in model.steps if breakdown.get(metric, 0) < below]
     if not steps:
         steps.append("Keep your current pace — it’s working.")
     return steps[:3]
@@ -513,6 +579,7 @@ def normalize_tone(tone: str | None):
     return tone
 
 
+@tracing.traced("companion")
 def companion_engine(tone: str, health_meta: dict):
     tips = companion_insights(health_meta)
     tone = normalize_tone(tone)
@@ -527,29 +594,21 @@ def companion_engine(tone: str, health_meta: dict):
     return {"message": message, "tips": tips[1:], "actions": actions}
 
 
-def compute_streaks(history: list[CheckHistory]):
+def compute_streaks(history: list[HistoryRecord]):
+    # Window-only fallback; persisted counters live in streaks.get_streaks.
     stable = 0
     adjust = 0
-    goal = 0
     for h in history:
-        if h.status == "ok":
-            stable += 1
-        else:
+        if h.status not in ("ok", "caution"):
             break
-    for h in history:
-        if h.status in ("ok", "caution"):
-            adjust += 1
-        else:
-            break
-    for h in history:
-        if h.status == "ok":
-            goal += 1
-        else:
-            break
-    return {"stable": stable, "adjust": adjust, "goal": goal}
+        adjust += 1
+        if h.status == "ok" and stable == adjust - 1:
+            stable += 1
+    return {"stable": stable, "adjust": adjust, "goal": stable}
 
 
-def compute_projection(history: list[CheckHistory]):
+@tracing.traced("projection")
+def compute_projection(history: list[HistoryRecord]):
     if not history:
         return {"points": [62, 60, 58, 57, 59, 61], "buffer": "stable"}
     recent = history[:10]
@@ -564,21 +623,238 @@ def compute_projection(history: list[CheckHistory]):
     return {"points": points, "buffer": buffer}
 
 
+def dashboard_view(
+    history: list[HistoryRecord],
+    profile: Profile | None,
+    last_score: HealthScoreHistory | None,
+    plan_state: str,
+    streaks: dict | None = None,
+    spend: dict | None = None,
+    goal_summaries: list[dict] | None = None,
+):
+    ok_count = sum(1 for h in history if h.status == "ok")
+    caution_count = sum(1 for h in history if h.status == "caution")
+    danger_count = sum(1 for h in history if h.status == "danger")
+    total_count = ok_count + caution_count + danger_count
+    progress_value = int(round((ok_count / total_count) * 100)) if total_count else 0
+    if danger_count > 0:
+        pace_status = "danger"
+    elif caution_count > 0:
+        pace_status = "caution"
+    else:
+        pace_status = "ok"
+
+    health_score, health_meta = compute_health_score(history, spend=spend)
+    health_label_text = health_label(health_score)
+    health_reason_text = last_score.reason if last_score else health_reason(history, health_meta["breakdown"])
+    drivers = top_drivers(health_meta["breakdown"])
+    steps = next_steps(health_meta["breakdown"])
+    tone = normalize_tone(profile.companion_tone if profile else "calm")
+    companion = companion_engine(tone, health_meta)
+    health_score_display = last_score.score if last_score else health_score
+    if streaks is None:
+        streaks = compute_streaks(history)
+    projection = compute_projection(history)
+    return {
+        "stats": {"ok": ok_count, "caution": caution_count, "danger": danger_count},
+        "first_name": (profile.first_name.strip() if profile and profile.first_name else "there"),
+        "progress_value": progress_value,
+        "pace_status": pace_status,
+        "plan_state": plan_state,
+        "health_score": health_score_display,
+        "health_trend": health_meta["trend"],
+        "health_breakdown": health_meta["breakdown"],
+        "health_risk": health_meta["risk"],
+        "health_anomaly": health_meta.get("anomaly", False),
+        "spend": spend,
+        "health_label": health_label_text,
+        "health_reason": health_reason_text,
+        "health_drivers": drivers,
+        "health_steps": steps,
+        "companion": companion,
+        "companion_tone": tone,
+        "streaks": streaks,
+        "projection": projection,
+        "goals": goal_summaries or [],
+    }
+
+
+@tracing.traced("dashboard_view")
+def build_dashboard_view(session: Session, user_id: int):
+    plan_state = _plan_state(session, user_id)
+    history = _scoring_fallback(fetch_history_records(user_id, limit=5, conn=shards.connection_for(session)))
+    profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
+    last_score = session.exec(
+        select(HealthScoreHistory)
+        .where(HealthScoreHistory.user_id == user_id)
+        .order_by(HealthScoreHistory.created_at.desc())
+        .limit(1)
+    ).first()
+    return dashboard_view(
+        history,
+        profile,
+        last_score,
+        plan_state,
+        streaks=get_streaks(session, user_id),
+        spend=get_spend_stats(session, user_id),
+        goal_summaries=goals.goal_summaries(session, user_id),
+    )
+
+
+def refresh_dashboard_snapshot(session: Session, user_id: int):
+    view = build_dashboard_view(session, user_id)
+    save_snapshot(session, user_id, view)
+    return view
+
+
+def _load_dashboard_view(session: Session, user_id: int):
+    view = load_snapshot(session, user_id)
+    if view is None:
+        view = refresh_dashboard_snapshot(session, user_id)
+        session.commit()
+    return view
+
+
+def _load_fresh_snapshot(session: Session, user_id: int):
+    snapshot = session.get(DashboardSnapshot, user_id)
+    if not is_fresh(snapshot):
+        refresh_dashboard_snapshot(session, user_id)
+        session.commit()
+        snapshot = session.get(DashboardSnapshot, user_id)
+    return snapshot
+
+
+def dashboard_api_payload(view: dict):
+    return {
+        "api_version": 1,
+        "score": view["health_score"],
+        "trend": view["health_trend"],
+        "risk": view["health_risk"],
+        "label": view["health_label"],
+        "reason": view["health_reason"],
+        "breakdown": view["health_breakdown"],
+        "anomaly": view.get("health_anomaly", False),
+        "spend": view.get("spend"),
+        "drivers": [{"name": name, "value": value} for name, value in view["health_drivers"]],
+        "steps": view["health_steps"],
+        "pace_status": view["pace_status"],
+        "progress_value": view["progress_value"],
+        "stats": view["stats"],
+        "streaks": view["streaks"],
+        "projection": view["projection"],
+        "goals": view.get("goals", []),
+    }
+
+
+def _dashboard_view_for(user_id: int):
+    with user_session(user_id) as session:
+        return _load_dashboard_view(session, user_id)
+
+
+def _fresh_snapshot_for(user_id: int):
+    with user_session(user_id) as session:
+        return _load_fresh_snapshot(session, user_id)
+
+
+def _warmup_reader(request: Request, user_id: int):
+    """Snapshot reader for wait_for_warmup when login scheduled a warm-up.
+
+    Login leaves the qbc_warm cookie; with several workers its warm-up may be
+    running in another process, and the row it writes is all this one can see.
+    """
+    if not request.cookies.get("qbc_warm"):
+        return None
+
+    async def read():
+        async with async_user_session(user_id) as session:
+            return await session.get(DashboardSnapshot, user_id)
+
+    return read
+
+
+async def load_dashboard_view_async(user_id: int):
+    async with async_user_session(user_id) as session:
+        snapshot = await session.get(DashboardSnapshot, user_id)
+    if is_fresh(snapshot):
+        return json.loads(snapshot.payload)
+    # A rebuild scores and assembles the whole view; only that goes to the threadpool.
+    return await run_in_threadpool(_dashboard_view_for, user_id)
+
+
+def warm_dashboard(user_id: int):
+    """Background task after login: build the snapshot the dashboard redirect is about to read."""
+    ok = False
+    try:
+        with user_session(user_id) as session:
+            _load_dashboard_view(session, user_id)
+        ok = True
+    except Exception:
+        logging.exception("Dashboard warm-up failed")
+    finally:
+        finish_warmup(user_id, ok)
+
+
 @app.on_event("startup")
 def on_startup():
     init_db()
+    shards.init_shards()
+    fixtures.seed_on_startup()
+    template_cache.warm(templates.env)
+    memory_diag.start()
+
+
+SECURITY_HEADERS = {
+    "X-Frame-Options": "DENY",
+    "X-Content-Type-Options": "nosniff",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+}
 
 
 @app.middleware("http")
 async def security_headers(request: Request, call_next):
     resp = await call_next(request)
-    resp.headers["X-Frame-Options"] = "DENY"
-    resp.headers["X-Content-Type-Options"] = "nosniff"
-    resp.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    resp.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+    resp.headers.update(SECURITY_HEADERS)
     return resp
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    root = tracing.start_trace(f"{request.method} {request.url.path}", method=request.method)
+    if root is None:
+        return await call_next(request)
+    with root:
+        resp = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None:
+        root.name = f"{request.method} {route.path}"
+    root.set("status", resp.status_code)
+    if tracing.SERVER_TIMING_ENABLED:
+        resp.headers["Server-Timing"] = root.trace.server_timing()
+    tracing.finish_trace(root)
+    return resp
+
+
+if memory_diag.MEMORY_ROUTE_SAMPLE_RATE > 0:
+
+    @app.middleware("http")
+    async def sample_route_memory(request: Request, call_next):
+        if not memory_diag.should_sample():
+            return await call_next(request)
+        before = memory_diag.traced_bytes()
+        resp = await call_next(request)
+        route = request.scope.get("route")
+        memory_diag.observe_route(
+            f"{request.method} {route.path if route is not None else 'unmatched'}",
+            memory_diag.traced_bytes() - before,
+        )
+        return resp
+
+
+# Added last so it wraps every other middleware; see admission.AdmissionMiddleware.
+app.add_middleware(admission.AdmissionMiddleware, headers=SECURITY_HEADERS)
+
+
 @app.exception_handler(404)
 def not_found(request: Request, exc):
     return render_template("404.html", {"request": request})
@@ -698,7 +974,7 @@ def security_password_update(
             },
         )
 
-    with Session(engine) as session:
+    with user_session(user_id) as session:
         user = session.exec(select(User).where(User.id == user_id)).first()
         if not user or not pwd_context.verify(current_password, user.password_hash):
             return render_template(
@@ -758,7 +1034,7 @@ def social_youtube_alias(request: Request):
 
 
 @app.post("/check", response_class=HTMLResponse)
-def check(
+async def check(
     request: Request,
     csrf_token: str = Form(""),
     period: str = Form("monthly"),
@@ -772,49 +1048,19 @@ def check(
             "index.html",
             {"request": request, "result": None, "user_id": get_user_id_from_request(request), "error": "Session expired. Please try again."},
         )
-    if income <= 0 or fixed < 0 or today < 0 or days_left <= 0:
-        return render_template(
-            "index.html",
-            {"request": request, "result": None, "user_id": get_user_id_from_request(request), "error": "Please check your inputs."},
-        )
-    if income > 1_000_000 or fixed > 1_000_000 or today > 1_000_000 or days_left > 365:
+    error = check_input_error(income, fixed, today, days_left)
+    if error:
         return render_template(
             "index.html",
-            {"request": request, "result": None, "user_id": get_user_id_from_request(request), "error": "Inputs look out of range."},
+            {"request": request, "result": None, "user_id": get_user_id_from_request(request), "error": error},
         )
     budget_jour, etat, message = analyser_depense(income, fixed, today, days_left)
 
     user_id = get_user_id_from_request(request)
     if user_id:
-        with Session(engine) as session:
-            session.add(CheckHistory(
-                user_id=user_id,
-                net_income=income,
-                fixed_expenses=fixed,
-                today_expense=today,
-                days_left=days_left,
-                daily_budget=float(budget_jour),
-                status=etat,
-                message=message,
-            ))
-            session.commit()
-
-            recent = session.exec(
-                select(CheckHistory)
-                .where(CheckHistory.user_id == user_id)
-                .order_by(CheckHistory.created_at.desc())
-                .limit(20)
-            ).all()
-            score, meta = compute_health_score(recent)
-            label = health_label(score)
-            reason = health_reason(recent, meta["breakdown"])
-            session.add(HealthScoreHistory(
-                user_id=user_id,
-                score=score,
-                label=label,
-                reason=reason,
-            ))
-            session.commit()
+        async with async_user_session(user_id) as session:
+            await session.run_sync(record_check, user_id, income, fixed, today, days_left, budget_jour, etat, message)
+            await session.commit()
 
     params = urlencode(
         {
@@ -826,6 +1072,116 @@ def check(
     return RedirectResponse(url=f"/?{params}", status_code=303)
 
 
+@app.post("/api/v1/check")
+async def check_api(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        # Anonymous quick checks run client-side in quickCheckEngine.js.
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    if not validate_csrf(request, request.headers.get("x-csrf-token", "")):
+        return JSONResponse({"error": "Session expired. Please try again."}, status_code=403)
+    try:
+        data = await request.json()
+        income = float(data["income"])
+        fixed = float(data["fixed"])
+        today = float(data["today"])
+        days_left = int(data["days_left"])
+    except (ValueError, TypeError, KeyError):
+        return JSONResponse({"error": "Please check your inputs."}, status_code=422)
+    error = check_input_error(income, fixed, today, days_left)
+    if error:
+        return JSONResponse({"error": error}, status_code=422)
+
+    budget_jour, etat, message = analyser_depense(income, fixed, today, days_left)
+    async with async_user_session(user_id) as session:
+        score = await session.run_sync(record_check, user_id, income, fixed, today, days_left, budget_jour, etat, message)
+        await session.commit()
+    return JSONResponse(
+        {
+            "daily_budget": round(budget_jour, 2),
+            "status": etat,
+            "message": message,
+            "score": score,
+            "label": health_label(score),
+        }
+    )
+
+
+def _alert_rules_payload(session: Session, user_id: int):
+    return {
+        "rules": [alerts.rule_view(r) for r in alerts.list_rules(session, user_id)],
+        "kinds": {kind: label for kind, (label, _, _) in alerts.RULE_KINDS.items()},
+    }
+
+
+def _recent_alerts(session: Session, user_id: int, limit: int):
+    rows = session.exec(
+        select(AlertOutbox)
+        .where(AlertOutbox.user_id == user_id)
+        .order_by(AlertOutbox.id.desc())
+        .limit(limit)
+    ).all()
+    return [alerts.alert_view(a) for a in rows]
+
+
+@app.get("/api/v1/alerts")
+async def alerts_api(request: Request, limit: int = 20):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    async with async_user_session(user_id) as session:
+        items = await session.run_sync(_recent_alerts, user_id, max(1, min(100, limit)))
+    return JSONResponse({"alerts": items})
+
+
+@app.get("/api/v1/alerts/rules")
+async def alert_rules_api(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    async with async_user_session(user_id) as session:
+        payload = await session.run_sync(_alert_rules_payload, user_id)
+    return JSONResponse(payload)
+
+
+@app.post("/api/v1/alerts/rules")
+async def alert_rule_create(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    if not validate_csrf(request, request.headers.get("x-csrf-token", "")):
+        return JSONResponse({"error": "Session expired. Please try again."}, status_code=403)
+    try:
+        data = await request.json()
+        kind, threshold = data["kind"], data["threshold"]
+    except (ValueError, TypeError, KeyError):
+        return JSONResponse({"error": "Please check your inputs."}, status_code=422)
+    async with async_user_session(user_id) as session:
+        try:
+            rule = await session.run_sync(alerts.add_rule, user_id, kind, threshold)
+        except alerts.RuleError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=422)
+        await session.commit()
+        await session.refresh(rule)
+        return JSONResponse(alerts.rule_view(rule), status_code=201)
+
+
+@app.delete("/api/v1/alerts/rules/{rule_id}")
+async def alert_rule_delete(request: Request, rule_id: int):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    if not validate_csrf(request, request.headers.get("x-csrf-token", "")):
+        return JSONResponse({"error": "Session expired. Please try again."}, status_code=403)
+    async with async_user_session(user_id) as session:
+        rule = await session.get(AlertRule, rule_id)
+        if not rule or rule.user_id != user_id:
+            return JSONResponse({"error": "Not found."}, status_code=404)
+        await session.run_sync(alerts.delete_rule, rule)
+        await session.commit()
+    return Response(status_code=204)
+
+
 @app.get("/register", response_class=HTMLResponse)
 def register_page(request: Request):
     return render_template("register.html", {"request": request, "error": None})
@@ -885,6 +1241,7 @@ def signup_page(request: Request):
 @app.post("/login", response_class=HTMLResponse)
 def login(
     request: Request,
+    background_tasks: BackgroundTasks,
     csrf_token: str = Form(""),
     email: str = Form(...),
     password: str = Form(...),
@@ -904,8 +1261,23 @@ def login(
             record_login_failure(ip)
             return render_template("login.html", {"request": request, "error": "Invalid credentials."})
 
-    get_plan_state_for_user(user.id)
+    # Runs after the redirect is sent, so the dashboard it points at opens warm.
+    warming = begin_warmup(user.id)
+    if warming:
+        background_tasks.add_task(warm_dashboard, user.id)
     resp = RedirectResponse(url="/dashboard", status_code=303)
+    if warming:
+        # Tells the dashboard to wait on the row even if another worker serves it.
+        secure_cookie = os.getenv("COOKIE_SECURE", "false").lower() == "true"
+        resp.set_cookie(
+            "qbc_warm",
+            "1",
+            httponly=True,
+            samesite="lax",
+            secure=secure_cookie,
+            max_age=math.ceil(WARMUP_WAIT_SECONDS),
+            path="/",
+        )
     set_auth_cookie(resp, user.id)
     clear_login_failures(ip)
     return resp
@@ -919,91 +1291,34 @@ def logout():
 
 
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request):
+async def dashboard(request: Request):
     user_id = get_user_id_from_request(request)
     if not user_id:
         return RedirectResponse(url="/login", status_code=303)
-    plan_state = get_plan_state_for_user(user_id)
 
+    await wait_for_warmup(user_id, read=_warmup_reader(request, user_id))
     try:
-        history = get_recent_history(user_id, limit=5)
-        with Session(engine) as session:
-            profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-            last_score = session.exec(
-                select(HealthScoreHistory)
-                .where(HealthScoreHistory.user_id == user_id)
-                .order_by(HealthScoreHistory.created_at.desc())
-                .limit(1)
-            ).first()
+        view = await load_dashboard_view_async(user_id)
     except Exception:
         logging.exception("Dashboard load failed")
-        history = []
-        profile = None
-        last_score = None
-
-    ok_count = sum(1 for h in history if h.status == "ok")
-    caution_count = sum(1 for h in history if h.status == "caution")
-    danger_count = sum(1 for h in history if h.status == "danger")
-    total_count = ok_count + caution_count + danger_count
-    progress_value = int(round((ok_count / total_count) * 100)) if total_count else 0
-    if danger_count > 0:
-        pace_status = "danger"
-    elif caution_count > 0:
-        pace_status = "caution"
-    else:
-        pace_status = "ok"
+        view = dashboard_view([], None, None, await get_plan_state_for_user_async(user_id))
 
-    health_score, health_meta = compute_health_score(history)
-    health_label_text = health_label(health_score)
-    health_reason_text = last_score.reason if last_score else health_reason(history, health_meta["breakdown"])
-    drivers = top_drivers(health_meta["breakdown"])
-    steps = next_steps(health_meta["breakdown"])
-    tone = normalize_tone(profile.companion_tone if profile else "calm")
-    companion = companion_engine(tone, health_meta)
-    health_score_display = last_score.score if last_score else health_score
-    streaks = compute_streaks(history)
-    projection = compute_projection(history)
     return templates.TemplateResponse(
         "dashboard.html",
-        {
-            "request": request,
-            "history": history,
-            "stats": {"ok": ok_count, "caution": caution_count, "danger": danger_count},
-            "first_name": (profile.first_name.strip() if profile and profile.first_name else "there"),
-            "progress_value": progress_value,
-            "pace_status": pace_status,
-            "active_page": "dashboard",
-            "plan_state": plan_state,
-            "health_score": health_score_display,
-            "health_trend": health_meta["trend"],
-            "health_breakdown": health_meta["breakdown"],
-            "health_risk": health_meta["risk"],
-            "health_label": health_label_text,
-            "health_reason": health_reason_text,
-            "health_drivers": drivers,
-            "health_steps": steps,
-            "companion": companion,
-            "companion_tone": tone,
-            "streaks": streaks,
-            "projection": projection,
-        },
+        {"request": request, "active_page": "dashboard", **view},
     )
 
 
-@app.post("/companion")
-def companion_reply(request: Request, message: str = Form("")):
-    user_id = get_user_id_from_request(request)
-    if not user_id:
-        return JSONResponse({"reply": "Please sign in to access your Companion."}, status_code=401)
-    history = get_recent_history(user_id, limit=20)
-    health_score, health_meta = compute_health_score(history)
+async def _companion_context(user_id: int, profile: Profile | None):
+    history = await get_scoring_history_async(user_id, limit=20)
+    async with async_user_session(user_id) as session:
+        spend = await session.run_sync(get_spend_stats, user_id)
+    health_score, health_meta = compute_health_score(history, spend=spend)
     drivers = top_drivers(health_meta["breakdown"])
-    streaks = compute_streaks(history)
-    with Session(engine) as session:
-        profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
+    streaks = await get_streaks_async(user_id)
     name = profile.first_name.strip() if profile and profile.first_name else "there"
     tone = normalize_tone(profile.companion_tone if profile else "calm")
-    ctx = CompanionContext(
+    return CompanionContext(
         name=name,
         tone=tone,
         score=health_score,
@@ -1013,9 +1328,208 @@ def companion_reply(request: Request, message: str = Form("")):
         streak_goal=streaks["goal"],
         drivers=drivers,
     )
-    reply = respond(message, ctx)
+
+
+@app.post("/companion")
+async def companion_reply(request: Request, message: str = Form("")):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"reply": "Please sign in to access your Companion."}, status_code=401)
+    ctx = await _companion_context(user_id, await get_profile_async(user_id))
+    turns = conversations.history(user_id)
+    with tracing.span("companion"):
+        reply = respond(message, ctx, turns)
+    conversations.append(user_id, "user", message)
+    conversations.append(user_id, "assistant", reply)
     return JSONResponse({"reply": reply})
 
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _companion_events(user_id: int, message: str):
+    # The first frame goes out before any scoring work, so the client can open its bubble.
+    yield _sse("start", {})
+    try:
+        ctx = await _companion_context(user_id, await get_profile_async(user_id))
+    except Exception:
+        logging.exception("Companion context failed")
+        yield _sse("error", {"reply": "I couldn’t reach the Companion. Try again."})
+        return
+    turns = conversations.history(user_id)
+    conversations.append(user_id, "user", message)
+    parts = []
+    for segment in respond_stream(message, ctx, turns):
+        parts.append(segment)
+        yield _sse("segment", {"text": segment})
+    reply = "".join(parts)
+    conversations.append(user_id, "assistant", reply)
+    yield _sse("done", {"reply": reply})
+
+
+@app.post("/companion/stream")
+async def companion_stream(request: Request, message: str = Form("")):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"reply": "Please sign in to access your Companion."}, status_code=401)
+    return StreamingResponse(
+        _companion_events(user_id, message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/v1/scores")
+def score_series_api(request: Request, days: int = 30, points: int = DEFAULT_MAX_POINTS):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    days = max(1, min(3650, days))
+    end = datetime.utcnow()
+    with user_session(user_id) as session:
+        series = score_series(session, user_id, end - timedelta(days=days), end, max_points=points)
+    return JSONResponse({"days": days, "points": series})
+
+
+@app.get("/api/v1/dashboard")
+async def dashboard_api(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Cookie"}
+    await wait_for_warmup(user_id, read=_warmup_reader(request, user_id))
+    async with async_user_session(user_id) as session:
+        snapshot = await session.get(DashboardSnapshot, user_id)
+        if is_fresh(snapshot):
+            etag = snapshot_etag(snapshot)
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers={**headers, "ETag": etag})
+        else:
+            snapshot = await run_in_threadpool(_fresh_snapshot_for, user_id)
+            etag = snapshot_etag(snapshot)
+        view = json.loads(snapshot.payload)
+
+    return JSONResponse(dashboard_api_payload(view), headers={**headers, "ETag": etag})
+
+
+@app.get("/api/v1/streaks")
+async def streaks_api(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    return JSONResponse(await get_streaks_async(user_id))
+
+
+async def _fleet_analytics(request: Request, days: int):
+    user_id = get_user_id_from_request(request)
+    # Not on analytics.executor: a slow aggregate there must not hold up the admin check.
+    if not await run_in_threadpool(is_admin, user_id):
+        return None
+    days = max(1, min(366, days))
+    result = analytics.peek_cached(days)
+    if result is None:
+        result = await asyncio.wrap_future(analytics.executor.submit(analytics.cached_fleet_analytics, days))
+    return result
+
+
+@app.get("/admin/metrics")
+def admin_metrics(request: Request):
+    if not is_admin(get_user_id_from_request(request)):
+        return JSONResponse({"error": "Not found."}, status_code=404)
+    lines = (
+        admission.metrics_lines()
+        + scoring_models.metrics_lines()
+        + template_cache.metrics_lines(templates.env)
+        + memory_diag.metrics_lines()
+    )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+def _memory_admin(request: Request):
+    """None if the caller may use the memory tools, else the response to send."""
+    if not memory_diag.enabled() or not is_admin(get_user_id_from_request(request)):
+        return JSONResponse({"error": "Not found."}, status_code=404)
+    if request.method == "POST" and not validate_csrf(request, request.headers.get("x-csrf-token", "")):
+        return JSONResponse({"error": "Session expired. Please try again."}, status_code=403)
+    return None
+
+
+@app.get("/admin/memory")
+def admin_memory(request: Request):
+    denied = _memory_admin(request)
+    if denied:
+        return denied
+    return JSONResponse(memory_diag.status())
+
+
+@app.post("/admin/memory/tracing")
+def admin_memory_tracing(request: Request, enabled: bool = True, frames: int = memory_diag.MEMORY_TRACE_FRAMES):
+    denied = _memory_admin(request)
+    if denied:
+        return denied
+    if enabled:
+        memory_diag.start_tracing(frames)
+    else:
+        memory_diag.stop_tracing()
+    return JSONResponse(memory_diag.status())
+
+
+@app.post("/admin/memory/snapshots")
+def admin_memory_snapshot(request: Request, label: str = "", limit: int = 20, group_by: str = "lineno"):
+    denied = _memory_admin(request)
+    if denied:
+        return denied
+    try:
+        info = memory_diag.take_snapshot(label)
+        return JSONResponse({**info, "top": memory_diag.top(info["id"], max(1, min(200, limit)), group_by)})
+    except memory_diag.MemoryDiagError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=409)
+
+
+@app.get("/admin/memory/snapshots/{snapshot_id}")
+def admin_memory_top(request: Request, snapshot_id: int, limit: int = 20, group_by: str = "lineno"):
+    denied = _memory_admin(request)
+    if denied:
+        return denied
+    try:
+        return JSONResponse({"id": snapshot_id, "top": memory_diag.top(snapshot_id, max(1, min(200, limit)), group_by)})
+    except memory_diag.MemoryDiagError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=404)
+
+
+@app.get("/admin/memory/diff")
+def admin_memory_diff(request: Request, old: int, new: int, limit: int = 20, group_by: str = "lineno"):
+    denied = _memory_admin(request)
+    if denied:
+        return denied
+    try:
+        return JSONResponse({"old": old, "new": new, "diff": memory_diag.diff(old, new, max(1, min(200, limit)), group_by)})
+    except memory_diag.MemoryDiagError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=404)
+
+
+@app.get("/admin/analytics")
+async def admin_analytics(request: Request, days: int = 30):
+    result = await _fleet_analytics(request, days)
+    if result is None:
+        return JSONResponse({"error": "Not found."}, status_code=404)
+    return JSONResponse(result)
+
+
+@app.get("/admin/analytics.csv")
+async def admin_analytics_csv(request: Request, days: int = 30, table: str = "daily"):
+    result = await _fleet_analytics(request, days)
+    if result is None:
+        return JSONResponse({"error": "Not found."}, status_code=404)
+    return PlainTextResponse(
+        analytics.to_csv(result, table=table),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="analytics-{table}.csv"'},
+    )
+
+
 @app.get("/check", response_class=HTMLResponse)
 def check_page(request: Request):
     return RedirectResponse(url="/run-check", status_code=303)
@@ -1047,7 +1561,7 @@ def profile_update(
         return RedirectResponse(url="/login", status_code=303)
 
     if not validate_csrf(request, csrf_token):
-        with Session(engine) as session:
+        with user_session(user_id) as session:
             profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
             if not profile:
                 profile = Profile(user_id=user_id)
@@ -1059,7 +1573,7 @@ def profile_update(
             {"request": request, "profile": profile, "active_page": "account", "plan_state": get_plan_state_for_user(user_id), "error": "Session expired. Please try again."},
         )
 
-    with Session(engine) as session:
+    with user_session(user_id) as session:
         profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
         if not profile:
             profile = Profile(user_id=user_id)
@@ -1071,6 +1585,7 @@ def profile_update(
         profile.city = city.strip()
         profile.country = country.strip()
         profile.phone = phone.strip()
+        refresh_dashboard_snapshot(session, user_id)
         session.commit()
 
     return RedirectResponse(url="/account", status_code=303)
@@ -1088,12 +1603,13 @@ def preferences_update(
     if not validate_csrf(request, csrf_token):
         return RedirectResponse(url="/account#preferences", status_code=303)
     tone = normalize_tone(companion_tone)
-    with Session(engine) as session:
+    with user_session(user_id) as session:
         profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
         if not profile:
             profile = Profile(user_id=user_id)
             session.add(profile)
         profile.companion_tone = tone
+        refresh_dashboard_snapshot(session, user_id)
         session.commit()
     return RedirectResponse(url=f"/account#preferences", status_code=303)
 
@@ -1113,21 +1629,98 @@ def run_check_page(request: Request):
     )
 
 
+def _history_page(session: Session, user_id: int, filters: HistoryFilters, cursor: str | None, limit: int = 50):
+    page = search_history(session, user_id, filters, limit, cursor)
+    items = page["items"]
+    if filters.is_empty() and not cursor and len(items) < limit:
+        # An unfiltered first page tops up from the monthly archive, then the demo rows.
+        items += load_archived_checks(session, user_id, limit=limit - len(items))
+        if DEMO_MODE and not items:
+            items = demo_history()
+        page["items"] = items
+    return page
+
+
 @app.get("/history", response_class=HTMLResponse)
-def history_page(request: Request):
+async def history_page(request: Request):
     user_id = get_user_id_from_request(request)
     if not user_id:
         return RedirectResponse(url="/login", status_code=303)
 
-    history = get_recent_history(user_id, limit=50)
-
-    plan_state = get_plan_state_for_user(user_id)
+    cursor = request.query_params.get("cursor") or None
+    error = None
+    try:
+        filters = HistoryFilters.from_params(request.query_params)
+    except ValueError as exc:
+        filters, error = HistoryFilters(), str(exc)
+    async with async_user_session(user_id) as session:
+        try:
+            page = await session.run_sync(_history_page, user_id, filters, cursor)
+        except ValueError as exc:
+            page, error = {"items": [], "next_cursor": None, "total": 0, "total_capped": False}, str(exc)
+
+    next_url = None
+    if page["next_cursor"]:
+        next_url = "/history?" + urlencode({**filters.as_params(), "cursor": page["next_cursor"]})
+    plan_state = await get_plan_state_for_user_async(user_id)
     return templates.TemplateResponse(
         "history.html",
-        {"request": request, "history": history, "active_page": "history", "plan_state": plan_state},
+        {
+            "request": request,
+            "history": page["items"],
+            "total": page["total"],
+            "total_capped": page["total_capped"],
+            "filters": filters,
+            "filtered": not filters.is_empty(),
+            "next_url": next_url,
+            "error": error,
+            "active_page": "history",
+            "plan_state": plan_state,
+        },
     )
 
 
+@app.get("/api/v1/history")
+async def history_api(request: Request, limit: int = 50, cursor: str | None = None):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    try:
+        filters = HistoryFilters.from_params(request.query_params)
+        async with async_user_session(user_id) as session:
+            page = await session.run_sync(search_history, user_id, filters, limit, cursor, cursor is None)
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status_code=422)
+    return JSONResponse(
+        {
+            "items": [check_view(c) for c in page["items"]],
+            "next_cursor": page["next_cursor"],
+            "total": page["total"],
+            "total_capped": page["total_capped"],
+        }
+    )
+
+
+def _goals_page(request: Request, user_id: int, error: str | None = None, status_code: int = 200):
+    with user_session(user_id) as session:
+        plan_state = _plan_state(session, user_id)
+        views = [goals.goal_view(goal) for goal in goals.list_goals(session, user_id)]
+        session.commit()
+    resp = render_template(
+        "goals.html",
+        {
+            "request": request,
+            "active_page": "goals",
+            "plan_state": plan_state,
+            "goals": views,
+            "max_goals": goals.MAX_GOALS_PER_USER,
+            "error": error,
+        },
+    )
+    resp.status_code = status_code
+    return resp
+
+
 @app.get("/goals", response_class=HTMLResponse)
 def goals_page(request: Request):
     user_id = get_user_id_from_request(request)
@@ -1136,11 +1729,86 @@ def goals_page(request: Request):
     gate = pro_guard(request, user_id, "goals")
     if gate:
         return gate
-    plan_state = get_plan_state_for_user(user_id)
-    return templates.TemplateResponse(
-        "goals.html",
-        {"request": request, "active_page": "goals", "plan_state": plan_state},
-    )
+    return _goals_page(request, user_id)
+
+
+@app.post("/goals", response_class=HTMLResponse)
+def goal_create(
+    request: Request,
+    csrf_token: str = Form(""),
+    name: str = Form(""),
+    target_amount: str = Form(""),
+    deadline: str = Form(""),
+):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return RedirectResponse(url="/login", status_code=303)
+    if not validate_csrf(request, csrf_token):
+        return _goals_page(request, user_id, "Session expired. Please try again.", 400)
+    with user_session(user_id) as session:
+        try:
+            goal = goals.create_goal(session, user_id, name, target_amount, deadline)
+        except goals.GoalError as exc:
+            return _goals_page(request, user_id, str(exc), 400)
+        session.flush()
+        goal_id = goal.id
+        refresh_dashboard_snapshot(session, user_id)
+        session.commit()
+    return RedirectResponse(url=f"/goals#goal-{goal_id}", status_code=303)
+
+
+@app.post("/goals/{goal_id}/contribute", response_class=HTMLResponse)
+def goal_contribute(request: Request, goal_id: int, csrf_token: str = Form(""), amount: str = Form("")):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return RedirectResponse(url="/login", status_code=303)
+    if not validate_csrf(request, csrf_token):
+        return _goals_page(request, user_id, "Session expired. Please try again.", 400)
+    with user_session(user_id) as session:
+        goal = goals.get_goal(session, user_id, goal_id)
+        if goal is None:
+            return _goals_page(request, user_id, "That goal no longer exists.", 404)
+        try:
+            goals.add_contribution(session, goal, amount)
+        except goals.GoalError as exc:
+            return _goals_page(request, user_id, str(exc), 400)
+        refresh_dashboard_snapshot(session, user_id)
+        session.commit()
+    return RedirectResponse(url=f"/goals#goal-{goal_id}", status_code=303)
+
+
+@app.post("/goals/{goal_id}/delete", response_class=HTMLResponse)
+def goal_delete(request: Request, goal_id: int, csrf_token: str = Form("")):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return RedirectResponse(url="/login", status_code=303)
+    if not validate_csrf(request, csrf_token):
+        return _goals_page(request, user_id, "Session expired. Please try again.", 400)
+    with user_session(user_id) as session:
+        goal = goals.get_goal(session, user_id, goal_id)
+        if goal is not None:
+            goals.delete_goal(session, goal)
+            refresh_dashboard_snapshot(session, user_id)
+            session.commit()
+    return RedirectResponse(url="/goals", status_code=303)
+
+
+@app.get("/api/v1/goals")
+def api_goals(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    with user_session(user_id) as session:
+        views = [goals.goal_view(goal) for goal in goals.list_goals(session, user_id)]
+        session.commit()
+    return {"api_version": 1, "goals": views}
+
+
+def _wallet_state(session: Session, user_id: int):
+    plan_state = _plan_state(session, user_id)
+    wallet = get_wallet(session, user_id)
+    session.commit()
+    return plan_state, wallet
 
 
 @app.get("/wallet", response_class=HTMLResponse)
@@ -1151,34 +1819,76 @@ def wallet_page(request: Request):
     gate = pro_guard(request, user_id, "wallet")
     if gate:
         return gate
-    plan_state = get_plan_state_for_user(user_id)
+    with user_session(user_id) as session:
+        plan_state, wallet = _wallet_state(session, user_id)
     return templates.TemplateResponse(
         "wallet.html",
-        {"request": request, "active_page": "wallet", "plan_state": plan_state},
+        {"request": request, "active_page": "wallet", "plan_state": plan_state, "wallet": wallet},
     )
 
 
+@app.get("/api/v1/wallet")
+def api_wallet(request: Request):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return JSONResponse({"error": "Please sign in."}, status_code=401)
+    with user_session(user_id) as session:
+        _, wallet = _wallet_state(session, user_id)
+    return {"api_version": 1, "wallet": wallet}
+
+
 @app.get("/account", response_class=HTMLResponse)
-def account_page(request: Request):
+async def account_page(request: Request):
     user_id = get_user_id_from_request(request)
     if not user_id:
         return RedirectResponse(url="/login", status_code=303)
 
-    with Session(engine) as session:
-        profile = session.exec(select(Profile).where(Profile.user_id == user_id)).first()
-        if not profile:
-            profile = Profile(user_id=user_id)
-            session.add(profile)
-            session.commit()
-            session.refresh(profile)
+    profile = await get_profile_async(user_id, create=True)
 
-    plan_state = get_plan_state_for_user(user_id)
+    plan_state = await get_plan_state_for_user_async(user_id)
     return render_template(
         "account.html",
-        {"request": request, "profile": profile, "active_page": "account", "plan_state": plan_state},
+        {
+            "request": request,
+            "profile": profile,
+            "active_page": "account",
+            "plan_state": plan_state,
+            "export_token": request.query_params.get("export", ""),
+        },
     )
 
 
+@app.post("/account/export")
+def account_export(request: Request, csrf_token: str = Form("")):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return RedirectResponse(url="/login", status_code=303)
+    if not validate_csrf(request, csrf_token):
+        return RedirectResponse(url="/account#security", status_code=303)
+
+    if data_export.export_row_count(user_id) > data_export.EXPORT_BACKGROUND_ROWS:
+        token = data_export.start_export_job(user_id)
+        return RedirectResponse(url=f"/account?{urlencode({'export': token})}#security", status_code=303)
+    return StreamingResponse(
+        data_export.iter_export(user_id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{data_export.export_filename(user_id)}"'},
+    )
+
+
+@app.get("/account/export/{token}")
+def account_export_download(request: Request, token: str):
+    user_id = get_user_id_from_request(request)
+    if not user_id:
+        return RedirectResponse(url="/login", status_code=303)
+    status, path = data_export.export_job_status(user_id, token)
+    if status == "pending":
+        return JSONResponse({"status": "pending"}, status_code=202, headers={"Retry-After": "10"})
+    if status == "missing":
+        return JSONResponse({"error": "Export not found or expired."}, status_code=404)
+    return FileResponse(path, media_type="application/zip", filename=data_export.export_filename(user_id))
+
+
 @app.get("/billing", response_class=HTMLResponse)
 def billing_page(request: Request):
     user_id = get_user_id_from_request(request)
@@ -1200,7 +1910,7 @@ def upgrade_page(request: Request):
     plan_state = get_plan_state_for_user(user_id)
     email = ""
     if user_id:
-        with Session(engine) as session:
+        with user_session(user_id) as session:
             user = session.exec(select(User).where(User.id == user_id)).first()
             if user:
                 email = user.email
@@ -1239,25 +1949,27 @@ def checkout(request: Request, csrf_token: str = Form(""), plan_interval: str =
         return render_template("upgrade.html", {"request": request, "active_page": "upgrade", "plan_state": "free", "error": "Stripe price ID missing."})
 
     stripe.api_key = STRIPE_SECRET_KEY
-    with Session(engine) as session:
+    with user_session(user_id) as session:
         user = session.exec(select(User).where(User.id == user_id)).first()
         if not user:
             return RedirectResponse(url="/login", status_code=303)
         customer_id = user.stripe_customer_id
         if not customer_id:
-            customer = stripe.Customer.create(email=user.email)
+            with tracing.span("stripe", call="Customer.create"):
+                customer = stripe.Customer.create(email=user.email)
             customer_id = customer["id"]
             user.stripe_customer_id = customer_id
             session.add(user)
             session.commit()
 
-    checkout_session = stripe.checkout.Session.create(
-        customer=customer_id,
-        line_items=[{"price": price_id, "quantity": 1}],
-        mode="subscription",
-        success_url=f"{APP_BASE_URL}/billing?success=1",
-        cancel_url=f"{APP_BASE_URL}/upgrade?canceled=1",
-    )
+    with tracing.span("stripe", call="checkout.Session.create"):
+        checkout_session = stripe.checkout.Session.create(
+            customer=customer_id,
+            line_items=[{"price": price_id, "quantity": 1}],
+            mode="subscription",
+            success_url=f"{APP_BASE_URL}/billing?success=1",
+            cancel_url=f"{APP_BASE_URL}/upgrade?canceled=1",
+        )
     logging.info("Stripe checkout session created for user %s", user_id)
     return RedirectResponse(url=checkout_session.url, status_code=303)
 
@@ -1290,14 +2002,17 @@ async def stripe_webhook(request: Request):
         subscription_id = data.get("id")
         plan_state = "pro" if status in ("active", "trialing") else "free"
         with Session(engine) as session:
-            user = session.exec(select(User).where(User.stripe_customer_id == customer_id)).first()
-            if user:
+            user_id = session.exec(select(User.id).where(User.stripe_customer_id == customer_id)).first()
+        if user_id:
+            with user_session(user_id) as session:
+                user = session.get(User, user_id)
                 user.plan = plan_state
                 user.stripe_subscription_id = subscription_id
                 user.stripe_status = status
                 session.add(user)
+                refresh_dashboard_snapshot(session, user_id)
                 session.commit()
-                logging.info("Stripe subscription update user %s status %s", user.id, status)
+            logging.info("Stripe subscription update user %s status %s", user_id, status)
     return Response(status_code=200)
 
 
@@ -1309,12 +2024,13 @@ def billing_portal(request: Request):
     if not stripe or not STRIPE_SECRET_KEY:
         return RedirectResponse(url="/billing", status_code=303)
     stripe.api_key = STRIPE_SECRET_KEY
-    with Session(engine) as session:
+    with user_session(user_id) as session:
         user = session.exec(select(User).where(User.id == user_id)).first()
         if not user or not user.stripe_customer_id:
             return RedirectResponse(url="/billing", status_code=303)
-        portal = stripe.billing_portal.Session.create(
-            customer=user.stripe_customer_id,
-            return_url=STRIPE_PORTAL_RETURN_URL,
-        )
+        with tracing.span("stripe", call="billing_portal.Session.create"):
+            portal = stripe.billing_portal.Session.create(
+                customer=user.stripe_customer_id,
+                return_url=STRIPE_PORTAL_RETURN_URL,
+            )
     return RedirectResponse(url=portal.url, status_code=303)
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from db import overspend_ratio, CheckHistory, HealthScoreHistory
+from history_records import fetch_history_records
+
+
+def _temp_engine(**kwargs):
+    path = os.path.join(tempfile.mkdtemp(prefix="qbc-bench-"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", echo=False, **kwargs)
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _seed_checks(engine, users: int, checks: int):
+    import random
+
+    from fixtures import check_rows
+
+    now = datetime.utcnow()
+    rows = [
+        row
+        for user_id in range(1, users + 1)
+        for row in check_rows(user_id, checks, random.Random(user_id), now, spacing=timedelta(hours=1))
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(CheckHistory.__table__), rows)
+
+
+def _timeit(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_hydration(args):
+    engine = _temp_engine()
+    _seed_checks(engine, users=1, checks=500)
+
+    def orm():
+        with Session(engine) as session:
+            return session.exec(
+                select(CheckHistory)
+                .where(CheckHistory.user_id == 1)
+                .order_by(CheckHistory.created_at.desc())
+                .limit(args.limit)
+            ).all()
+
+    def core():
+        with engine.connect() as conn:
+            return fetch_history_records(1, limit=args.limit, conn=conn)
+
+    orm_us = _timeit(orm, args.iterations)
+    core_us = _timeit(core, args.iterations)
+    print(f"history hydration, {args.limit} rows x {args.iterations} requests")
+    print(f"  ORM CheckHistory     {orm_us:9.1f} us/request")
+    print(f"  Core HistoryRecord   {core_us:9.1f} us/request  ({orm_us / core_us:.1f}x)")
+
+
+def bench_search(args):
+    from sqlalchemy import text
+
+    from history_search import HistoryFilters, search_history
+
+    engine = _temp_engine()
+    _seed_checks(engine, users=2, checks=args.checks)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    cases = [
+        {},
+        {"status": "danger"},
+        {"min_overspend": "30"},
+        {"status": "danger", "min_overspend": "30", "start": "2000-01-01", "end": "2100-01-01"},
+        {"min_spend": "100", "max_budget": "200"},
+    ]
+    print(f"history search over {args.checks} checks, first page + count, next page")
+    with Session(engine) as session:
+        for params in cases:
+            filters = HistoryFilters.from_params(params)
+            first = {}
+
+            def first_page():
+                first.update(search_history(session, 1, filters, limit=50))
+
+            first_us = _timeit(first_page, args.iterations)
+            cursor = first["next_cursor"]
+            next_us = _timeit(lambda: search_history(session, 1, filters, 50, cursor, False), args.iterations) if cursor else 0
+            total = f"{first['total']}{'+' if first['total_capped'] else ''}"
+            print(f"  {str(params):70} {total:>7} rows  {first_us / 1000:6.2f} ms  next {next_us / 1000:6.2f} ms")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def bench_concurrency(args):
+    import random
+
+    import httpx
+    from sqlalchemy import update
+
+    import shards
+    from db import DashboardSnapshot
+    from fixtures import check_rows
+
+    # Per-user tables go to throwaway shards; app.db is only read (users, plans).
+    directory = tempfile.mkdtemp(prefix="qbc-routes-")
+    os.environ["ADMISSION_ENABLED"] = "false"
+    os.environ["EVENT_LOG_DIR"] = os.path.join(directory, "events")
+    shards.SHARD_COUNT, shards.SHARD_DIR = args.shards, os.path.join(directory, "shards")
+    shards.init_shards()
+    import app as app_module
+    from starlette.concurrency import run_in_threadpool
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    now = datetime.utcnow()
+    for user_id in range(1, args.users + 1):
+        with shards.engine_for(user_id).begin() as conn:
+            conn.execute(insert(CheckHistory.__table__), check_rows(user_id, 50, random.Random(user_id), now))
+
+    csrf = app_module.csrf_signer.dumps("bench")
+
+    def headers(user_id: int) -> dict:
+        auth = app_module.cookie_signer.dumps({"user_id": user_id})
+        return {"cookie": f"qbc_auth={auth}; qbc_csrf={csrf}", "x-csrf-token": csrf}
+
+    def mark_stale():
+        for eng in shards.all_engines():
+            with eng.begin() as conn:
+                conn.execute(update(DashboardSnapshot.__table__).values(stale=True))
+
+    shipped = app_module.load_dashboard_view_async
+
+    async def threadpool_only(user_id: int):
+        # The previous shape: every load in the threadpool, fresh snapshot or not.
+        return await run_in_threadpool(app_module._dashboard_view_for, user_id)
+
+    async def run(client, label: str, send):
+        latencies = []
+
+        async def one(i: int):
+            start = time.perf_counter()
+            resp = await send(1 + i % args.users)
+            resp.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        print(
+            f"  {label:38} p50 {statistics.median(latencies):7.1f} ms  p95 {_percentile(latencies, 0.95):7.1f} ms"
+            f"  p99 {_percentile(latencies, 0.99):7.1f} ms  {args.requests / elapsed:6.0f} req/s"
+        )
+
+    async def main():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            dashboard = lambda user_id: client.get("/dashboard", headers=headers(user_id))
+            check = lambda user_id: client.post(
+                "/api/v1/check", headers=headers(user_id),
+                json={"income": 3200, "fixed": 1900, "today": 95, "days_left": 12},
+            )
+            # Builds every snapshot once.
+            await asyncio.gather(*(dashboard(user_id) for user_id in range(1, args.users + 1)))
+            for name, load in (("async read", shipped), ("threadpool", threadpool_only)):
+                app_module.load_dashboard_view_async = load
+                await run(client, f"dashboard, fresh snapshot, {name}", dashboard)
+                mark_stale()
+                await run(client, f"dashboard, rebuild, {name}", dashboard)
+            app_module.load_dashboard_view_async = shipped
+            await run(client, "check (api)", check)
+        await app_module.async_engine.dispose()
+
+    print(f"{args.requests} concurrent requests over {args.users} users, {args.shards} shards, real route handlers")
+    asyncio.run(main())
+
+
+def _shard_writer(directory: str, count: int, worker: int, seconds: float, users: int, results):
+    import random
+
+    import shards
+
+    engines = [shards.make_engine(shards.shard_path(i, directory)) for i in range(count)]
+    rng = random.Random(worker)
+    checks = CheckHistory.__table__
+    scores = HealthScoreHistory.__table__
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, users)
+        today = rng.uniform(20, 180)
+        # The rows record_check writes for every check, one transaction per check.
+        with engines[shards.shard_for(user_id, count)].begin() as conn:
+            conn.execute(insert(checks).values(
+                user_id=user_id, net_income=3200.0, fixed_expenses=1900.0, today_expense=today, days_left=12,
+                daily_budget=108.3, status="ok", message="bench", overspend_ratio=overspend_ratio(today, 108.3),
+                created_at=datetime.utcnow(),
+            ))
+            conn.execute(insert(scores).values(
+                user_id=user_id, score=70, label="Stable", reason="bench", created_at=datetime.utcnow(),
+            ))
+        done += 1
+    results.put(done)
+
+
+def bench_shards(args):
+    import multiprocessing
+
+    import shards
+
+    print(f"{args.workers} writer processes, {args.seconds:.0f} s per layout, {os.cpu_count()} CPUs")
+    baseline = None
+    for count in args.counts:
+        directory = tempfile.mkdtemp(prefix="qbc-shards-")
+        for i in range(count):
+            shards.migrate(shards.make_engine(shards.shard_path(i, directory)))
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_shard_writer, args=(directory, count, w, args.seconds, args.users, results))
+            for w in range(args.workers)
+        ]
+        for proc in procs:
+            proc.start()
+        total = sum(results.get() for _ in procs)
+        for proc in procs:
+            proc.join()
+        rate = total / args.seconds
+        baseline = baseline or rate
+        print(f"  {count:3d} shards  {rate:8.0f} checks/s  x{rate / baseline:4.2f}")
+
+
+def bench_replay(args):
+    import event_log
+
+    directory = tempfile.mkdtemp(prefix="qbc-events-")
+    log = event_log.EventLog(directory)
+    start = datetime.utcnow() - timedelta(minutes=args.events)
+    started = time.perf_counter()
+    for i in range(args.events):
+        today = 60.0 + (i * 13) % 90
+        log.append(event_log.encode_check(event_log.CheckEvent(
+            user_id=1 + i % args.users, net_income=3200.0, fixed_expenses=1900.0, today_expense=today,
+            days_left=1 + (i // args.users) % 30, daily_budget=108.3, status=("ok", "caution", "danger")[i % 3],
+            message="bench", created_at=start + timedelta(minutes=i),
+        )))
+    log.close()
+    append_rate = args.events / (time.perf_counter() - started)
+    print(f"append: {append_rate:,.0f} events/s")
+
+    if args.shards > 1:
+        import shards
+
+        # The worker processes read the layout from the environment.
+        os.environ["SHARD_COUNT"] = str(args.shards)
+        os.environ["SHARD_DIR"] = tempfile.mkdtemp(prefix="qbc-shards-")
+        shards.SHARD_COUNT, shards.SHARD_DIR = args.shards, os.environ["SHARD_DIR"]
+        for i in range(args.shards):
+            shards.migrate(shards.shard_engine(i))
+        result = event_log.replay(args.only.split(","), directory=directory, batch=args.batch, log=lambda _msg: None, workers=args.workers)
+    else:
+        engine = _temp_engine()
+        result = event_log.replay(
+            args.only.split(","), directory=directory, batch=args.batch,
+            engines=[engine], route=lambda _user_id: engine, log=lambda _msg: None,
+        )
+    per_10m = 10_000_000 / result["events_per_second"] / 60
+    print(f"replay {'+'.join(result['projections'])}: {result['events_per_second']:,} events/s (~{per_10m:.0f} min for 10M)")
+
+
+def bench_render(args):
+    from types import SimpleNamespace
+
+    import jinja2
+
+    import template_cache
+    from plans import PLANS
+
+    def make_env(bytecode_dir: str = ""):
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader("templates"), autoescape=True)
+        template_cache.install(env, bytecode_dir)
+        env.globals["url_for"] = lambda name, path="": f"/{name}/{path}"
+        return env
+
+    pages = [
+        ("layout_app.html", {"active_page": "dashboard"}),
+        ("_sidebar.html", {"active_page": "history"}),
+        ("pricing.html", {"request": SimpleNamespace(url=SimpleNamespace(path="/pricing")), "user_id": None, "plans": PLANS}),
+    ]
+    print(f"template render, {args.iterations} renders each")
+    for name, context in pages:
+        env = make_env()
+        template = env.get_template(name)
+        size = env.fragment_cache.size
+        env.fragment_cache.size = 0
+        uncached = _timeit(lambda: template.render(**context), args.iterations)
+        env.fragment_cache.size = size
+        template.render(**context)
+        cached = _timeit(lambda: template.render(**context), args.iterations)
+        print(f"  {name:18} fragments rendered {uncached:7.1f} us   cached {cached:7.1f} us  ({uncached / cached:4.1f}x)")
+
+    directory = tempfile.mkdtemp(prefix="qbc-jinja-")
+    started = time.perf_counter()
+    count = template_cache.warm(make_env())
+    compiled = (time.perf_counter() - started) * 1000
+    template_cache.warm(make_env(directory))
+    started = time.perf_counter()
+    template_cache.warm(make_env(directory))
+    loaded = (time.perf_counter() - started) * 1000
+    print(f"load {count} templates: compile {compiled:.1f} ms, from bytecode cache {loaded:.1f} ms")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot request paths.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("hydration", help="ORM vs Core history reads for scoring")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--iterations", type=int, default=2000)
+    p.set_defaults(func=bench_hydration)
+
+    p = sub.add_parser("concurrency", help="concurrent /dashboard and /api/v1/check requests against the real handlers")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--shards", type=int, default=2)
+    p.set_defaults(func=bench_concurrency)
+
+    p = sub.add_parser("search", help="filtered history search with keyset pagination")
+    p.add_argument("--checks", type=int, default=100_000)
+    p.add_argument("--iterations", type=int, default=20)
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("shards", help="check write throughput by shard count")
+    p.add_argument("--counts", type=lambda v: [int(c) for c in v.split(",")], default=[1, 2, 4, 8])
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--users", type=int, default=10_000)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.set_defaults(func=bench_shards)
+
+    p = sub.add_parser("replay", help="event log append and replay throughput")
+    p.add_argument("--events", type=int, default=200_000)
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--only", default="scores,spend,streaks,wallet")
+    p.add_argument("--batch", type=int, default=20_000)
+    p.add_argument("--shards", type=int, default=1, help="replay into this many shards, one process each")
+    p.add_argument("--workers", type=int, default=0, help="processes for a sharded replay (0: one per shard, up to the CPU count)")
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser("render", help="template shell rendering with and without fragment/bytecode caches")
+    p.add_argument("--iterations", type=int, default=2000)
+    p.set_defaults(func=bench_render)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import re
 from dataclasses import dataclass
 
 
@@ -31,31 +32,87 @@ def _driver_line(ctx: CompanionContext) -> str:
     return f"Top driver: {top[0]} ({top[1]})."
 
 
-def respond(message: str, ctx: CompanionContext) -> str:
-    msg = (message or "").strip().lower()
-    prefix = _tone_prefix(ctx.tone)
-    name = ctx.name or "there"
+# Short replies that continue the previous topic instead of starting over.
+FOLLOW_UPS = ("why", "more", "go on", "how", "what else", "and then", "then what", "tell me more", "really")
+
+FOLLOW_UP_REPLIES = {
+    "explain": "Stability carries the most weight, so a run of calm checks moves your score fastest.",
+    "scenario": "Hold the cut for two weeks. If drift stays under 10%, make it your new baseline.",
+    "risk": "Fixed costs above half of income are the usual culprit — review those before flexible spend.",
+    "plan": "Start with the weekly pace. Once it holds, the spend cap and buffer transfer get easier.",
+}
 
-    canned = [
-        f"{prefix} Hey {name}, your current score is {ctx.score}. {_driver_line(ctx)}",
-        f"{prefix} You're at {ctx.score}/100. Keep a steady pace for 48 hours to lift stability.",
-        f"{prefix} Risk is {ctx.risk}. A small buffer transfer this week will help.",
-        f"{prefix} Stable streak: {ctx.streak_stable} days. Keep it alive with one calm check today.",
-        f"{prefix} Adjustments streak: {ctx.streak_adjust} days. You're responding early — keep that rhythm.",
-        f"{prefix} Goal streak: {ctx.streak_goal} days. A tiny goal deposit keeps momentum positive.",
-        f"{prefix} If you trim 5% on flexible spend, your drift should soften this week.",
-        f"{prefix} If income rises 5%, your cushion trend improves over the next 4 weeks.",
-        f"{prefix} I can show risk drivers or build a plan — your call.",
-        f"{prefix} You're not behind — you're building a clearer signal.",
-    ]
 
+def _topic(msg: str) -> str | None:
     if "explain" in msg or "score" in msg:
-        return f"{prefix} Your score blends stability, drift, cushion, and consistency. {_driver_line(ctx)}"
+        return "explain"
     if "scenario" in msg or "what if" in msg:
-        return f"{prefix} Try a 5% expense reduction scenario — it typically lifts runway by 1–2 points."
+        return "scenario"
     if "risk" in msg or "driver" in msg:
-        return f"{prefix} {_driver_line(ctx)} Lowering fixed ratio usually improves risk first."
+        return "risk"
     if "plan" in msg:
-        return f"{prefix} Plan: set a weekly pace, cap flexible spend, and add a small buffer transfer."
+        return "plan"
+    return None
+
+
+def _is_follow_up(msg: str) -> bool:
+    msg = msg.strip(" ?!.")
+    return any(msg == f or msg.startswith(f + " ") for f in FOLLOW_UPS)
+
+
+def _last_topic(history) -> str | None:
+    for role, text in reversed(history):
+        if role == "user":
+            topic = _topic((text or "").strip().lower())
+            if topic:
+                return topic
+    return None
+
+
+def _body(msg: str, ctx: CompanionContext, history) -> str:
+    topic = _topic(msg)
+    if topic == "explain":
+        return f"Your score blends stability, drift, cushion, and consistency. {_driver_line(ctx)}"
+    if topic == "scenario":
+        return "Try a 5% expense reduction scenario — it typically lifts runway by 1–2 points."
+    if topic == "risk":
+        return f"{_driver_line(ctx)} Lowering fixed ratio usually improves risk first."
+    if topic == "plan":
+        return "Plan: set a weekly pace, cap flexible spend, and add a small buffer transfer."
+
+    if _is_follow_up(msg):
+        last = _last_topic(history)
+        if last:
+            return FOLLOW_UP_REPLIES[last]
+
+    name = ctx.name or "there"
+    canned = [
+        f"Hey {name}, your current score is {ctx.score}. {_driver_line(ctx)}",
+        f"You're at {ctx.score}/100. Keep a steady pace for 48 hours to lift stability.",
+        f"Risk is {ctx.risk}. A small buffer transfer this week will help.",
+        f"Stable streak: {ctx.streak_stable} days. Keep it alive with one calm check today.",
+        f"Adjustments streak: {ctx.streak_adjust} days. You're responding early — keep that rhythm.",
+        f"Goal streak: {ctx.streak_goal} days. A tiny goal deposit keeps momentum positive.",
+        "If you trim 5% on flexible spend, your drift should soften this week.",
+        "If income rises 5%, your cushion trend improves over the next 4 weeks.",
+        "I can show risk drivers or build a plan — your call.",
+        "You're not behind — you're building a clearer signal.",
+    ]
+    # Rotate through the open-ended replies as the conversation goes on.
+    replies = sum(1 for role, _ in history if role == "assistant")
+    return canned[(ctx.score + replies) % len(canned)]
+
+
+def respond_stream(message: str, ctx: CompanionContext, history=()):
+    """Yield the reply in segments: the tone prefix first, then one sentence at a time.
+
+    `history` is the conversation so far as (role, text) pairs, oldest first.
+    """
+    msg = (message or "").strip().lower()
+    yield _tone_prefix(ctx.tone)
+    for sentence in re.split(r"(?<=[.!?])\s+", _body(msg, ctx, history)):
+        yield " " + sentence
+
 
-    return canned[ctx.score % len(canned)]
+def respond(message: str, ctx: CompanionContext, history=()) -> str:
+    return "".join(respond_stream(message, ctx, history))
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+COMPANION_MAX_TURNS = int(os.getenv("COMPANION_MAX_TURNS", "12"))
+COMPANION_TTL_SECONDS = int(os.getenv("COMPANION_TTL_SECONDS", "1800"))
+# Across all users; the least recently active conversations are dropped first.
+COMPANION_MAX_USERS = int(os.getenv("COMPANION_MAX_USERS", "5000"))
+COMPANION_MAX_CHARS = int(os.getenv("COMPANION_MAX_CHARS", str(4 * 1024 * 1024)))
+MAX_TURN_CHARS = 500
+
+
+class ConversationStore:
+    """Per-user ring buffers of (role, text) turns with TTL and a global size cap."""
+
+    def __init__(
+        self,
+        max_turns: int = COMPANION_MAX_TURNS,
+        ttl_seconds: float = COMPANION_TTL_SECONDS,
+        max_users: int = COMPANION_MAX_USERS,
+        max_chars: int = COMPANION_MAX_CHARS,
+        clock=time.monotonic,
+    ):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self._clock = clock
+        # user_id -> (last_active, deque of turns), least recently active first.
+        self._conversations: OrderedDict[int, tuple[float, deque]] = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._conversations)
+
+    @property
+    def chars(self) -> int:
+        return self._chars
+
+    def _drop(self, user_id: int):
+        _, turns = self._conversations.pop(user_id)
+        self._chars -= sum(len(text) for _, text in turns)
+
+    def _evict(self, now: float):
+        # Oldest activity sits at the front, so expiry stops at the first live entry.
+        while self._conversations:
+            user_id, (last_active, _) = next(iter(self._conversations.items()))
+            expired = now - last_active > self.ttl_seconds
+            if not (expired or len(self._conversations) > self.max_users or self._chars > self.max_chars):
+                break
+            self._drop(user_id)
+
+    def history(self, user_id: int) -> list[tuple[str, str]]:
+        now = self._clock()
+        with self._lock:
+            self._evict(now)
+            entry = self._conversations.get(user_id)
+            return list(entry[1]) if entry else []
+
+    def append(self, user_id: int, role: str, text: str):
+        text = (text or "")[:MAX_TURN_CHARS]
+        now = self._clock()
+        with self._lock:
+            entry = self._conversations.pop(user_id, None)
+            turns = entry[1] if entry else deque(maxlen=self.max_turns)
+            if len(turns) == turns.maxlen:
+                self._chars -= len(turns[0][1])
+            turns.append((role, text))
+            self._chars += len(text)
+            self._conversations[user_id] = (now, turns)
+            self._evict(now)
+
+    def clear(self, user_id: int):
+        with self._lock:
+            if user_id in self._conversations:
+                self._drop(user_id)
+
+
+conversations = ConversationStore()
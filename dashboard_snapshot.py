@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from datetime import date, datetime
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session
+
+import scoring_models
+from db import DashboardSnapshot
+
+# Bump when the shape of the dashboard view model changes; older rows rebuild lazily.
+SNAPSHOT_SCHEMA_VERSION = 4
+LOGIN_WARMUP_ENABLED = os.getenv("LOGIN_WARMUP_ENABLED", "true").lower() == "true"
+# How long a dashboard request waits for the login's in-flight warm-up before building its own.
+WARMUP_WAIT_SECONDS = float(os.getenv("WARMUP_WAIT_SECONDS", "2.0"))
+# How often a worker without the claim re-reads the snapshot row while another worker warms it.
+WARMUP_POLL_SECONDS = float(os.getenv("WARMUP_POLL_SECONDS", "0.1"))
+
+# user id -> (monotonic claim time, Future)
+_warmups: dict[int, tuple[float, Future]] = {}
+_warmups_lock = threading.Lock()
+
+
+def is_fresh(snapshot: DashboardSnapshot | None, today: date | None = None) -> bool:
+    # Scores, labels, reasons and steps depend on the model, so switching SCORING_MODEL rebuilds.
+    # Goal status and forecasts are as of the build day (UTC, as in goals), so a new day rebuilds too.
+    return (
+        bool(snapshot)
+        and not snapshot.stale
+        and snapshot.schema_version == SNAPSHOT_SCHEMA_VERSION
+        and snapshot.scoring_model == scoring_models.SCORING_MODEL
+        and snapshot.built_at.date() == (today or datetime.utcnow().date())
+    )
+
+
+def load_snapshot(session: Session, user_id: int) -> dict | None:
+    snapshot = session.get(DashboardSnapshot, user_id)
+    if not is_fresh(snapshot):
+        return None
+    return json.loads(snapshot.payload)
+
+
+def save_snapshot(session: Session, user_id: int, view: dict) -> DashboardSnapshot:
+    """Insert or overwrite the user's snapshot in one statement.
+
+    A login warm-up and a dashboard request (or two workers) can both build a
+    first snapshot; a get-then-insert would fail the second one on the primary key.
+    """
+    stmt = sqlite_insert(DashboardSnapshot).values(
+        user_id=user_id,
+        schema_version=SNAPSHOT_SCHEMA_VERSION,
+        version=1,
+        stale=False,
+        scoring_model=scoring_models.SCORING_MODEL,
+        payload=json.dumps(view, separators=(",", ":")),
+        built_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DashboardSnapshot.user_id],
+        set_={
+            "version": DashboardSnapshot.version + 1,
+            **{name: stmt.excluded[name] for name in ("schema_version", "stale", "scoring_model", "payload", "built_at")},
+        },
+    )
+    return session.scalars(stmt.returning(DashboardSnapshot), execution_options={"populate_existing": True}).one()
+
+
+def invalidate_snapshot(session: Session, user_id: int):
+    """For writers that cannot rebuild inline; the next dashboard load rebuilds."""
+    session.exec(
+        update(DashboardSnapshot)
+        .where(DashboardSnapshot.user_id == user_id)
+        .values(stale=True)
+    )
+
+
+def snapshot_etag(snapshot: DashboardSnapshot) -> str:
+    # version moves on every check, preference/profile edit and plan change for this user.
+    return f'W/"dash-{snapshot.user_id}-{snapshot.schema_version}-{snapshot.scoring_model}-{snapshot.version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+def _expire_warmups(now: float):
+    """Drop claims older than WARMUP_WAIT_SECONDS; call with the lock held.
+
+    A claim's task may never run (the client left before the response went out,
+    or login failed after claiming), and nothing should wait on it past the cap.
+    """
+    for user_id, (claimed_at, future) in list(_warmups.items()):
+        if now - claimed_at > WARMUP_WAIT_SECONDS:
+            del _warmups[user_id]
+            if not future.done():
+                future.set_result(False)
+
+
+def begin_warmup(user_id: int) -> Future | None:
+    """Claim the warm-up for this user; None if disabled or one is already running."""
+    if not LOGIN_WARMUP_ENABLED:
+        return None
+    now = time.monotonic()
+    with _warmups_lock:
+        _expire_warmups(now)
+        if user_id in _warmups:
+            return None
+        future = Future()
+        _warmups[user_id] = (now, future)
+    return future
+
+
+def finish_warmup(user_id: int, ok: bool = True):
+    with _warmups_lock:
+        claim = _warmups.pop(user_id, None)
+    if claim is not None and not claim[1].done():
+        claim[1].set_result(ok)
+
+
+async def wait_for_warmup(
+    user_id: int,
+    timeout: float = WARMUP_WAIT_SECONDS,
+    read: Callable[[], Awaitable[DashboardSnapshot | None]] | None = None,
+) -> bool:
+    """Let a warm-up started by login finish, so the first dashboard reads its snapshot.
+
+    Claims only live in this process. When login ran its warm-up in another
+    worker, pass `read` (which loads the user's snapshot row) and this polls
+    the row until that build lands or the wait runs out.
+    """
+    now = time.monotonic()
+    with _warmups_lock:
+        _expire_warmups(now)
+        claim = _warmups.get(user_id)
+    if claim is None:
+        return False if read is None else await _poll_snapshot(read, timeout)
+    claimed_at, future = claim
+    timeout = min(timeout, WARMUP_WAIT_SECONDS - (now - claimed_at))
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        return False
+
+
+async def _poll_snapshot(read: Callable[[], Awaitable[DashboardSnapshot | None]], timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while True:
+        if is_fresh(await read()):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(WARMUP_POLL_SECONDS, remaining))
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import secrets
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from db import engine, CheckArchive, CheckHistory, HealthScoreHistory, Profile, User
+from history_archive import unpack_checks
+from shards import engine_for
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+# Accounts with more rows than this are exported by a background job instead of inline.
+EXPORT_BACKGROUND_ROWS = int(os.getenv("EXPORT_BACKGROUND_ROWS", "20000"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_TTL_SECONDS = int(os.getenv("EXPORT_TTL_SECONDS", str(24 * 3600)))
+
+USER_FIELDS = ("id", "email", "plan", "stripe_status", "created_at")
+
+logger = logging.getLogger("quiet_budget")
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+
+
+class _Sink:
+    """Unseekable file object for ZipFile: collects written bytes until drained."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+def _line(row) -> bytes:
+    return json.dumps(dict(row), default=_json_default, ensure_ascii=False).encode() + b"\n"
+
+
+def _stream(conn, stmt):
+    """Row mappings fetched EXPORT_CHUNK_ROWS at a time from a streaming cursor."""
+    result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(stmt)
+    for partition in result.mappings().partitions():
+        yield partition
+
+
+def _check_chunks(conn, user_id: int):
+    """Every check, oldest first: archived months (each packed oldest-first), then the hot table."""
+    # Archived months are unpacked one blob at a time.
+    archives = CheckArchive.__table__
+    stmt = (
+        select(archives.c.payload)
+        .where(archives.c.user_id == user_id)
+        .order_by(archives.c.month)
+    )
+    result = conn.execution_options(stream_results=True, yield_per=1).execute(stmt)
+    for (payload,) in result:
+        yield [
+            {**row.model_dump(exclude={"id"}), "id": None, "archived": True}
+            for row in unpack_checks(payload, user_id)
+        ]
+
+    checks = CheckHistory.__table__
+    stmt = select(checks).where(checks.c.user_id == user_id).order_by(checks.c.created_at)
+    for rows in _stream(conn, stmt):
+        yield [dict(row, archived=False) for row in rows]
+
+
+def _members(global_conn, conn, user_id: int):
+    users = User.__table__
+    profiles = Profile.__table__
+    scores = HealthScoreHistory.__table__
+    yield "user.ndjson", _stream(
+        global_conn, select(*(users.c[name] for name in USER_FIELDS)).where(users.c.id == user_id)
+    )
+    yield "profile.ndjson", _stream(global_conn, select(profiles).where(profiles.c.user_id == user_id))
+    yield "check_history.ndjson", _check_chunks(conn, user_id)
+    yield "health_score_history.ndjson", _stream(
+        conn, select(scores).where(scores.c.user_id == user_id).order_by(scores.c.created_at)
+    )
+
+
+def iter_export(user_id: int):
+    """Yield a zip archive (one NDJSON member per table) as it is produced.
+
+    Only one chunk of rows and its compressed bytes are held at a time.
+    """
+    sink = _Sink()
+    counts = {}
+    with (
+        engine.connect() as global_conn,
+        engine_for(user_id).connect() as conn,
+        zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive,
+    ):
+        for name, chunks in _members(global_conn, conn, user_id):
+            counts[name] = 0
+            with archive.open(name, "w", force_zip64=True) as member:
+                for rows in chunks:
+                    for row in rows:
+                        member.write(_line(row))
+                    counts[name] += len(rows)
+                    data = sink.drain()
+                    if data:
+                        yield data
+        manifest = {"user_id": user_id, "generated_at": datetime.utcnow(), "rows": counts}
+        archive.writestr("manifest.json", json.dumps(manifest, default=_json_default, indent=2))
+    yield sink.drain()
+
+
+def export_row_count(user_id: int) -> int:
+    with engine_for(user_id).connect() as conn:
+        checks = conn.execute(
+            select(func.count()).select_from(CheckHistory).where(CheckHistory.user_id == user_id)
+        ).scalar()
+        archived = conn.execute(
+            select(func.coalesce(func.sum(CheckArchive.row_count), 0)).where(CheckArchive.user_id == user_id)
+        ).scalar()
+        scores = conn.execute(
+            select(func.count()).select_from(HealthScoreHistory).where(HealthScoreHistory.user_id == user_id)
+        ).scalar()
+    return checks + archived + scores
+
+
+def export_filename(user_id: int) -> str:
+    return f"quiet-budget-export-{user_id}-{datetime.utcnow():%Y%m%d}.zip"
+
+
+# Background jobs: <user_id>-<token>.zip.part while running, renamed to .zip when done.
+# The token is unguessable and is only served back to the user it belongs to.
+
+def _job_path(user_id: int, token: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{user_id}-{token}.zip")
+
+
+def _write_export(user_id: int, token: str):
+    path = _job_path(user_id, token)
+    try:
+        with open(path + ".part", "wb") as fh:
+            for data in iter_export(user_id):
+                fh.write(data)
+        os.replace(path + ".part", path)
+    except Exception:
+        logger.exception("Data export failed for user %s", user_id)
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
+
+
+def prune_exports(now: float | None = None) -> int:
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+    cutoff = (now or time.time()) - EXPORT_TTL_SECONDS
+    removed = 0
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def start_export_job(user_id: int) -> str:
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    token = secrets.token_urlsafe(24)
+    open(_job_path(user_id, token) + ".part", "wb").close()
+    executor.submit(_write_export, user_id, token)
+    return token
+
+
+def export_job_status(user_id: int, token: str) -> tuple[str, str | None]:
+    """("ready", path), ("pending", None) or ("missing", None)."""
+    if not token or not token.replace("-", "").replace("_", "").isalnum():
+        return "missing", None
+    path = _job_path(user_id, token)
+    if os.path.exists(path):
+        return "ready", path
+    if os.path.exists(path + ".part"):
+        return "pending", None
+    return "missing", None
@@ -1,11 +1,17 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 import sqlite3
+from sqlalchemy import Index, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, Field, create_engine
 
 DATABASE_URL = "sqlite:///./app.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./app.db"
 engine = create_engine(DATABASE_URL, echo=False)
+# Same database through aiosqlite, for routes that should not hold a threadpool slot.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
 
 
 class User(SQLModel, table=True):
@@ -19,7 +25,46 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+def overspend_ratio(today_expense: float, daily_budget: float) -> Optional[float]:
+    """(today - budget) / budget, stored so history search can filter on it via an index."""
+    if not daily_budget or daily_budget <= 0:
+        return None
+    return (today_expense - daily_budget) / daily_budget
+
+
+def insert_or_ignore(session, row: SQLModel) -> bool:
+    """Insert `row` unless its primary key already exists; True if this call inserted it.
+
+    The create half of get-or-create for per-user state rows: two transactions that
+    both found the row missing cannot both insert it.
+    """
+    stmt = sqlite_insert(type(row)).values(**row.model_dump()).on_conflict_do_nothing()
+    return session.execute(stmt).rowcount == 1
+
+
+# History search indexes; also created on existing databases by _ensure_indexes.
+CHECK_SEARCH_INDEXES = (
+    # Keyset order, and a covering index so filtered counts never touch the table.
+    Index(
+        "ix_checkhistory_search",
+        "user_id", "created_at", "id", "status", "overspend_ratio", "today_expense", "daily_budget",
+    ),
+    Index(
+        "ix_checkhistory_user_status_created",
+        "user_id", "status", "created_at", "id", "overspend_ratio", "today_expense", "daily_budget",
+    ),
+    # Partial: only checks that went over budget, which is what overspend filters ask for.
+    Index(
+        "ix_checkhistory_user_overspend",
+        "user_id", "overspend_ratio", "created_at",
+        sqlite_where=text("overspend_ratio > 0"),
+    ),
+)
+
+
 class CheckHistory(SQLModel, table=True):
+    __table_args__ = CHECK_SEARCH_INDEXES
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(index=True, foreign_key="user.id")
 
@@ -31,6 +76,7 @@ class CheckHistory(SQLModel, table=True):
     daily_budget: float
     status: str
     message: str
+    overspend_ratio: Optional[float] = Field(default=None)
 
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -56,13 +102,186 @@ class HealthScoreHistory(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class ScoreRollup(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_scorerollup_user_res_bucket", "user_id", "resolution", "bucket_start", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    resolution: str
+    bucket_start: datetime
+    count: int
+    score_min: int
+    score_max: int
+    score_sum: int
+
+
+class CheckArchive(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_checkarchive_user_month", "user_id", "month", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    month: str
+    row_count: int
+    first_at: datetime
+    last_at: datetime
+    payload: bytes
+
+
+class DashboardSnapshot(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    schema_version: int
+    version: int = Field(default=0)
+    stale: bool = Field(default=False)
+    # name@version of the scoring model the payload was built with.
+    scoring_model: str = Field(default="")
+    payload: str
+    built_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class UserStreak(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    stable_current: int = Field(default=0)
+    stable_best: int = Field(default=0)
+    adjust_current: int = Field(default=0)
+    adjust_best: int = Field(default=0)
+    goal_current: int = Field(default=0)
+    goal_best: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DailyCheckRollup(SQLModel, table=True):
+    day: str = Field(primary_key=True)
+    checks: int = Field(default=0)
+    ok: int = Field(default=0)
+    caution: int = Field(default=0)
+    danger: int = Field(default=0)
+    users: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SpendStats(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    # Welford running mean / sum of squared deviations over every check.
+    spend_n: int = Field(default=0)
+    spend_mean: float = Field(default=0.0)
+    spend_m2: float = Field(default=0.0)
+    drift_n: int = Field(default=0)
+    drift_mean: float = Field(default=0.0)
+    drift_m2: float = Field(default=0.0)
+    # Exponentially weighted mean / variance, weighted towards recent checks.
+    spend_ewma: float = Field(default=0.0)
+    drift_ewma: float = Field(default=0.0)
+    drift_ewvar: float = Field(default=0.0)
+    last_z: float = Field(default=0.0)
+    last_anomaly: bool = Field(default=False)
+    anomalies: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AlertRule(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True, foreign_key="user.id")
+    kind: str
+    threshold: float
+    enabled: bool = Field(default=True)
+    # Evaluation state, updated on every check so rules never rescan history.
+    firing: bool = Field(default=False)
+    streak: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AlertOutbox(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_alertoutbox_pending", "delivered_at", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True, foreign_key="user.id")
+    rule_id: int = Field(foreign_key="alertrule.id")
+    kind: str
+    value: float
+    message: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    delivered_at: Optional[datetime] = Field(default=None)
+
+
+class Goal(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True, foreign_key="user.id")
+    name: str
+    target_amount: float
+    deadline: Optional[date] = Field(default=None)
+    # Progress, maintained as contributions and checks are recorded.
+    saved_amount: float = Field(default=0.0)
+    contributions: int = Field(default=0)
+    last_contribution_at: Optional[datetime] = Field(default=None)
+    headroom_ewma: float = Field(default=0.0)
+    checks: int = Field(default=0)
+    # Cached forecast; forecast_key fingerprints the inputs it was computed from.
+    pace_per_day: float = Field(default=0.0)
+    pace_basis: str = Field(default="none")
+    required_per_day: Optional[float] = Field(default=None)
+    projected_date: Optional[date] = Field(default=None)
+    forecast_status: str = Field(default="no_pace")
+    forecast_key: str = Field(default="")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = Field(default=None)
+
+
+class GoalContribution(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    goal_id: int = Field(index=True, foreign_key="goal.id")
+    user_id: int = Field(foreign_key="user.id")
+    amount: float
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class WalletLedger(SQLModel, table=True):
+    user_id: int = Field(primary_key=True, foreign_key="user.id")
+    # Current budget period, derived from the check's days_left.
+    period_start: date
+    period_end: date
+    income: float = Field(default=0.0)
+    fixed: float = Field(default=0.0)
+    # Spend before the last check day, plus that day's latest figure.
+    spent_before: float = Field(default=0.0)
+    day: date
+    day_spent: float = Field(default=0.0)
+    days_tracked: int = Field(default=0)
+    checks: int = Field(default=0)
+    days_left: int = Field(default=0)
+    # Closing figures of the period before this one.
+    previous_period_end: Optional[date] = Field(default=None)
+    previous_remaining: Optional[float] = Field(default=None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ReplayCheckpoint(SQLModel, table=True):
+    # Event log position whose rows this database already holds, per projection set.
+    name: str = Field(primary_key=True)
+    segment: int = Field(default=0)
+    offset: int = Field(default=0)
+    events: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# PRAGMA user_version after the one-time fixes in _ensure_columns.
+DATA_VERSION = 1
+
+
 def init_db():
     SQLModel.metadata.create_all(engine)
     _ensure_columns()
+    _ensure_indexes()
 
 
-def _ensure_columns():
-    with sqlite3.connect("app.db") as conn:
+def _ensure_columns(path: str = "app.db"):
+    # Each block skips tables this database does not have (shards hold only some).
+    with sqlite3.connect(path) as conn:
         cur = conn.cursor()
         cur.execute("PRAGMA table_info(user)")
         cols = {row[1] for row in cur.fetchall()}
@@ -73,13 +292,58 @@ def _ensure_columns():
             "stripe_status": "TEXT",
         }
         for col, ddl in needed.items():
-            if col not in cols:
+            if cols and col not in cols:
                 cur.execute(f"ALTER TABLE user ADD COLUMN {col} {ddl}")
         conn.commit()
-    with sqlite3.connect("app.db") as conn:
+    with sqlite3.connect(path) as conn:
         cur = conn.cursor()
         cur.execute("PRAGMA table_info(profile)")
         cols = {row[1] for row in cur.fetchall()}
-        if "companion_tone" not in cols:
+        if cols and "companion_tone" not in cols:
             cur.execute("ALTER TABLE profile ADD COLUMN companion_tone TEXT DEFAULT 'calm'")
         conn.commit()
+    with sqlite3.connect(path) as conn:
+        cur = conn.cursor()
+        cur.execute("PRAGMA table_info(checkhistory)")
+        cols = {row[1] for row in cur.fetchall()}
+        if cols and "overspend_ratio" not in cols:
+            cur.execute("ALTER TABLE checkhistory ADD COLUMN overspend_ratio REAL")
+            cur.execute(
+                "UPDATE checkhistory SET overspend_ratio = (today_expense - daily_budget) / daily_budget "
+                "WHERE daily_budget > 0"
+            )
+        conn.commit()
+    with sqlite3.connect(path) as conn:
+        cur = conn.cursor()
+        cur.execute("PRAGMA table_info(dashboardsnapshot)")
+        cols = {row[1] for row in cur.fetchall()}
+        if cols and "scoring_model" not in cols:
+            cur.execute("ALTER TABLE dashboardsnapshot ADD COLUMN scoring_model TEXT DEFAULT ''")
+        conn.commit()
+    with sqlite3.connect(path) as conn:
+        cur = conn.cursor()
+        # One-time data fixes, tracked in PRAGMA user_version so startup doesn't rescan tables.
+        (version,) = cur.execute("PRAGMA user_version").fetchone()
+        if version < 1:
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('alertoutbox', 'alertrule')")
+            if len(cur.fetchall()) == 2:
+                # Deleting a rule used to leave its alerts behind.
+                cur.execute("DELETE FROM alertoutbox WHERE rule_id NOT IN (SELECT id FROM alertrule)")
+        if version < DATA_VERSION:
+            cur.execute(f"PRAGMA user_version = {DATA_VERSION}")
+        conn.commit()
+
+
+# create_all only indexes new tables; these cover fleet-wide scans on existing ones.
+EXTRA_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_checkhistory_created_at ON checkhistory (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_healthscorehistory_user_created ON healthscorehistory (user_id, created_at)",
+)
+
+
+def _ensure_indexes(bind=None):
+    with (bind or engine).begin() as conn:
+        for ddl in EXTRA_INDEX_DDL:
+            conn.execute(text(ddl))
+        for index in CHECK_SEARCH_INDEXES:
+            index.create(conn, checkfirst=True)
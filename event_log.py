@@ -0,0 +1,864 @@
+import argparse
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+from multiprocessing import get_context
+from types import SimpleNamespace
+from typing import NamedTuple, get_args
+
+from sqlalchemy import delete, event, func, insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+
+import shards
+import spend_stats
+import streaks
+import wallet_ledger
+from db import (
+    overspend_ratio,
+    CheckArchive,
+    CheckHistory,
+    DailyCheckRollup,
+    DashboardSnapshot,
+    HealthScoreHistory,
+    ReplayCheckpoint,
+    ScoreRollup,
+    SpendStats,
+    UserStreak,
+    WalletLedger,
+)
+from history_archive import STATUS_CODES, STATUS_NAMES, _from_micros, _to_micros, unpack_checks
+from score_series import compact_database
+
+EVENT_LOG_ENABLED = os.getenv("EVENT_LOG_ENABLED", "true").lower() == "true"
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "events")
+EVENT_LOG_SEGMENT_BYTES = int(os.getenv("EVENT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+EVENT_LOG_FSYNC = os.getenv("EVENT_LOG_FSYNC", "false").lower() == "true"
+REPLAY_BATCH = int(os.getenv("EVENT_REPLAY_BATCH", "20000"))
+REPLAY_CHECKPOINT_EVENTS = int(os.getenv("EVENT_REPLAY_CHECKPOINT_EVENTS", "1000000"))
+# Processes for a sharded replay, one shard each at a time; 0 means one per shard, up to the CPU count.
+REPLAY_WORKERS = int(os.getenv("EVENT_REPLAY_WORKERS", "0"))
+
+logger = logging.getLogger("quiet_budget")
+
+EVENT_VERSION = 1
+# Each record is its payload length and crc32, then the payload.
+_FRAME = struct.Struct("<II")
+# version, user_id, created_at (µs since epoch), income, fixed, today, budget, days_left, status; the message follows.
+_CHECK = struct.Struct("<Bqqddddhb")
+_USER_ID = struct.Struct("<xq")
+_SEGMENT_NAME = re.compile(r"^checks-(\d{6})\.log$")
+
+# Scoring reads the newest 20 checks, the same window record_check uses.
+SCORE_WINDOW = 20
+
+# Projection -> tables it owns; a rebuild empties them first.
+PROJECTIONS = {
+    "checks": (CheckHistory, CheckArchive, DailyCheckRollup),
+    "scores": (HealthScoreHistory, ScoreRollup),
+    "spend": (SpendStats,),
+    "streaks": (UserStreak,),
+    "wallet": (WalletLedger,),
+}
+# "checks" also drops the monthly archives, so it only runs when asked for.
+DEFAULT_PROJECTIONS = ("scores", "spend", "streaks", "wallet")
+
+
+class CorruptLog(Exception):
+    def __init__(self, path: str, offset: int, reason: str):
+        super().__init__(f"{path} at byte {offset}: {reason}")
+        self.path = path
+        self.offset = offset
+
+
+class UnloggedHistory(Exception):
+    """The database holds checks the log does not, so a from-scratch replay would lose them."""
+
+    def __init__(self, users: list[int]):
+        super().__init__(
+            f"{len(users)} users have checks missing from the event log (e.g. user {users[0]}); "
+            "run `python -m event_log bootstrap` first"
+        )
+        self.users = users
+
+
+class CheckEvent(NamedTuple):
+    user_id: int
+    created_at: datetime
+    net_income: float
+    fixed_expenses: float
+    today_expense: float
+    daily_budget: float
+    days_left: int
+    status: str
+    message: str
+
+
+def encode_check(check) -> bytes:
+    head = _CHECK.pack(
+        EVENT_VERSION,
+        check.user_id,
+        _to_micros(check.created_at),
+        float(check.net_income),
+        float(check.fixed_expenses),
+        float(check.today_expense),
+        float(check.daily_budget),
+        max(-32768, min(32767, int(check.days_left))),
+        STATUS_CODES.get(check.status, STATUS_CODES["danger"]),
+    )
+    return head + (check.message or "").encode()
+
+
+def decode_check(payload: bytes) -> CheckEvent:
+    version, user_id, micros, income, fixed, today, budget, days_left, status = _CHECK.unpack_from(payload)
+    if version != EVENT_VERSION:
+        raise ValueError(f"Unknown event version {version}")
+    return CheckEvent(
+        user_id, _from_micros(micros), income, fixed, today, budget, days_left,
+        STATUS_NAMES.get(status, "danger"), payload[_CHECK.size:].decode(),
+    )
+
+
+def segment_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"checks-{index:06d}.log")
+
+
+def segments(directory: str) -> list[int]:
+    if not os.path.isdir(directory):
+        return []
+    found = (_SEGMENT_NAME.match(name) for name in os.listdir(directory))
+    return sorted(int(m.group(1)) for m in found if m)
+
+
+class EventLog:
+    """Append-only segment files, shared safely between worker processes via flock."""
+
+    def __init__(self, directory: str = EVENT_LOG_DIR, segment_bytes: int = EVENT_LOG_SEGMENT_BYTES, fsync: bool = EVENT_LOG_FSYNC):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._lock_fd = None
+        self._fd = None
+        self._segment = None
+
+    def _open(self, index: int):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(segment_path(self.directory, index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment = index
+
+    def append(self, payload: bytes) -> tuple[int, int]:
+        """Write one record; returns its (segment, offset)."""
+        return self.append_many([payload])
+
+    def append_many(self, payloads: list[bytes]) -> tuple[int, int]:
+        """Write records in order under one lock; returns the (segment, offset) of the first."""
+        records = [_FRAME.pack(len(payload), zlib.crc32(payload)) + payload for payload in payloads]
+        with self._lock:
+            if self._lock_fd is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._lock_fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                if self._segment is None:
+                    self._open(max(segments(self.directory), default=0))
+                # Another process may have moved on to newer segments.
+                while os.path.exists(segment_path(self.directory, self._segment + 1)):
+                    self._open(self._segment + 1)
+                offset = os.fstat(self._fd).st_size
+                first = None
+                pending = []
+                for record in records:
+                    if offset and offset + len(record) > self.segment_bytes:
+                        if pending:
+                            os.write(self._fd, b"".join(pending))
+                            pending = []
+                        self._open(self._segment + 1)
+                        offset = 0
+                    if first is None:
+                        first = (self._segment, offset)
+                    pending.append(record)
+                    offset += len(record)
+                if pending:
+                    os.write(self._fd, b"".join(pending))
+                if self.fsync:
+                    os.fsync(self._fd)
+                return first
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            for fd in (self._fd, self._lock_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._lock_fd = self._segment = None
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def _shared_log() -> EventLog:
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = EventLog(EVENT_LOG_DIR)
+        return _log
+
+
+def append_check(check):
+    if not EVENT_LOG_ENABLED:
+        return None
+    return _shared_log().append(encode_check(check))
+
+
+def append_checks(checks):
+    """Several checks under one lock, e.g. a bulk load; they must already be committed."""
+    if not EVENT_LOG_ENABLED or not checks:
+        return None
+    return _shared_log().append_many([encode_check(check) for check in checks])
+
+
+_PENDING = "event_log_pending"
+
+
+def append_on_commit(session, check: CheckEvent):
+    """Log `check` once `session` commits; a rollback drops it.
+
+    The log therefore never holds a check the database rejected. A crash between
+    the commit and the append loses that event instead, and replay refuses to run
+    while the database has more checks for a user than the log does.
+    """
+    if EVENT_LOG_ENABLED:
+        session.info.setdefault(_PENDING, []).append(check)
+
+
+# One thread, so appends handed off by async routes keep their commit order.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-log")
+
+
+def _append_committed_checks(checks: list):
+    try:
+        append_checks(checks)
+    except OSError:
+        logger.exception("Could not append %s checks for user %s to the event log", len(checks), checks[0].user_id)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _append_committed(session):
+    checks = session.info.pop(_PENDING, None)
+    if not checks:
+        return
+    if _on_event_loop():
+        # An AsyncSession commits on the loop thread; the flock and write must not stall it.
+        _writer.submit(_append_committed_checks, checks)
+    else:
+        _append_committed_checks(checks)
+
+
+def drain():
+    """Wait for appends handed to the writer thread so far."""
+    _writer.submit(lambda: None).result()
+
+
+@event.listens_for(OrmSession, "after_soft_rollback")
+def _drop_rolled_back(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING, None)
+
+
+def iter_records(directory: str = EVENT_LOG_DIR, start: tuple[int, int] = (0, 0)):
+    """Yield (segment, end offset, payload) for every record at or after `start`, via mmap.
+
+    A torn record at the very end of the newest segment (a crash mid-append) ends the
+    log; damage anywhere else raises CorruptLog.
+    """
+    indexes = [i for i in segments(directory) if i >= start[0]]
+    for n, index in enumerate(indexes):
+        path = segment_path(directory, index)
+        pos = start[1] if index == start[0] else 0
+        last = n == len(indexes) - 1
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= pos:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                while pos < size:
+                    if pos + _FRAME.size > size:
+                        reason = "truncated header"
+                    else:
+                        length, crc = _FRAME.unpack_from(mm, pos)
+                        end = pos + _FRAME.size + length
+                        if end > size:
+                            reason = "truncated record"
+                        else:
+                            payload = mm[pos + _FRAME.size:end]
+                            if zlib.crc32(payload) == crc:
+                                yield index, end, payload
+                                pos = end
+                                continue
+                            reason = "checksum mismatch"
+                    if last and reason.startswith("truncated"):
+                        logger.warning("Event log %s ends with a torn record at byte %s", path, pos)
+                        return
+                    raise CorruptLog(path, pos, reason)
+
+
+def iter_checks(directory: str = EVENT_LOG_DIR, start: tuple[int, int] = (0, 0)):
+    for index, end, payload in iter_records(directory, start):
+        yield (index, end), decode_check(payload)
+
+
+# Bootstrap
+
+def logged_counts(directory: str = EVENT_LOG_DIR) -> dict[int, int]:
+    counts = {}
+    for _, _, payload in iter_records(directory):
+        (user_id,) = _USER_ID.unpack_from(payload)
+        counts[user_id] = counts.get(user_id, 0) + 1
+    return counts
+
+
+def stored_counts(engines) -> dict[int, int]:
+    """Checks per user in the database, hot rows and archived months together."""
+    counts = {}
+    for eng in engines:
+        with eng.connect() as conn:
+            for model, count in ((CheckHistory, func.count()), (CheckArchive, func.sum(CheckArchive.row_count))):
+                for user_id, n in conn.execute(select(model.user_id, count).group_by(model.user_id)):
+                    counts[user_id] = counts.get(user_id, 0) + n
+    return counts
+
+
+def unlogged_users(directory: str = EVENT_LOG_DIR, engines=None) -> list[int]:
+    """Users with more checks in the database than in the log: history from before the log, or a lost append."""
+    logged = logged_counts(directory)
+    stored = stored_counts(engines or shards.all_engines())
+    return sorted(user_id for user_id, n in stored.items() if n > logged.get(user_id, 0))
+
+
+def _stored_checks(session: Session, user_id: int) -> list:
+    rows = []
+    for archive in session.exec(select(CheckArchive).where(CheckArchive.user_id == user_id)):
+        rows.extend(unpack_checks(archive.payload, user_id))
+    rows.extend(session.exec(select(CheckHistory).where(CheckHistory.user_id == user_id).order_by(CheckHistory.id)))
+    rows.sort(key=lambda row: row.created_at)
+    return rows
+
+
+def bootstrap(directory: str = EVENT_LOG_DIR, engines=None, log=print) -> dict:
+    """Write a new log from every check the database holds, oldest first per user.
+
+    For databases with history from before the log; run it once, offline, before
+    the first replay. Every check in an existing log is also in the database, so
+    the old log is moved aside rather than merged.
+    """
+    engines = engines or shards.all_engines()
+    started = time.perf_counter()
+    directory = directory.rstrip("/")
+    staging = directory + ".bootstrap"
+    shutil.rmtree(staging, ignore_errors=True)
+    out = EventLog(staging)
+    events = users = 0
+    try:
+        for eng in engines:
+            with Session(eng) as session:
+                user_ids = set(session.exec(select(CheckHistory.user_id).distinct()))
+                user_ids.update(session.exec(select(CheckArchive.user_id).distinct()))
+                for user_id in sorted(user_ids):
+                    for check in _stored_checks(session, user_id):
+                        out.append(encode_check(check))
+                        events += 1
+                    users += 1
+                    session.expunge_all()
+            log(f"  {users} users, {events} checks")
+    finally:
+        out.close()
+
+    replaced = None
+    if os.path.exists(directory):
+        replaced = f"{directory}.replaced-{datetime.utcnow():%Y%m%d%H%M%S}"
+        os.replace(directory, replaced)
+    os.replace(staging, directory)
+    return {"events": events, "users": users, "replaced": replaced, "seconds": round(time.perf_counter() - started, 2)}
+
+
+# Replay
+
+def _blank(model, **values):
+    """A plain attribute bag with the model's defaults; much cheaper than ORM instances in a hot loop."""
+    fields = {}
+    for name, field in model.model_fields.items():
+        if field.default_factory is not None:
+            fields[name] = field.default_factory()
+        else:
+            fields[name] = None if field.is_required() else field.default
+    fields.update(values)
+    return SimpleNamespace(**fields)
+
+
+# Per check: ok, caution, danger, budget, budget², then a (count, value) pair each
+# for cushion, fixed ratio, |drift| and runway, in app._score_window's terms.
+_NO_TERM = (0, 0.0)
+
+
+def _window_terms(status: str, income: float, fixed: float, today: float, budget: float, days_left: int) -> tuple:
+    income = float(income or 0)
+    fixed = float(fixed or 0)
+    budget = float(budget or 0)
+    cushion = fixed_ratio = drift = runway = _NO_TERM
+    if income > 0:
+        cushion = (1, max(0.0, min(1.0, (income - fixed) / income)))
+        fixed_ratio = (1, max(0.0, min(1.0, fixed / income)))
+    if budget and today is not None:
+        if budget > 0:
+            drift = (1, abs((float(today) - budget) / budget))
+        if income - fixed > 0 and days_left > 0:
+            runway = (1, max(0.0, min(1.0, (budget * float(days_left)) / max(1.0, income - fixed))))
+    return (
+        int(status == "ok"), int(status == "caution"), int(status not in ("ok", "caution")),
+        budget, budget * budget, *cushion, *fixed_ratio, *drift, *runway,
+    )
+
+
+_TERM_COUNT = len(_window_terms("ok", 0, 0, 0, 0, 0))
+
+
+class ScoreWindow:
+    """Running sums over a user's newest SCORE_WINDOW checks, so replay scores each check in O(1).
+
+    Gives app._score_window's score and breakdown without rescanning the window. The
+    sums are recomputed from the stored terms once per window's worth of checks, which
+    keeps add-then-subtract rounding from building up.
+    """
+
+    __slots__ = ("terms", "sums", "pushed")
+
+    def __init__(self, terms=()):
+        self.terms = deque((tuple(row) for row in terms), maxlen=SCORE_WINDOW)
+        self.pushed = 0
+        self._resum()
+
+    def _resum(self):
+        self.sums = [sum(column) for column in zip(*self.terms)] if self.terms else [0] * _TERM_COUNT
+
+    def push(self, terms: tuple):
+        if len(self.terms) == SCORE_WINDOW:
+            self.sums = [s + new - old for s, new, old in zip(self.sums, terms, self.terms[0])]
+        else:
+            self.sums = [s + new for s, new in zip(self.sums, terms)]
+        self.terms.append(terms)
+        self.pushed += 1
+        if self.pushed % SCORE_WINDOW == 0:
+            self._resum()
+
+    def score(self, model) -> tuple[int, dict]:
+        ok, caution, danger, budget_sum, budget_sq, cushions, cushion_sum, fixeds, fixed_sum, drifts, drift_sum, runways, runway_sum = self.sums
+        n = ok + caution + danger
+        total = max(1, n)
+        stability = ok / total
+        shock = (ok + caution) / total
+        acceleration = max(0.0, 1.0 - min(1.0, drift_sum / max(1, drifts)))
+        cushion = cushion_sum / max(1, cushions)
+        fixed_ratio = fixed_sum / fixeds if fixeds else 0.0
+        runway_ratio = runway_sum / runways if runways else cushion
+        mean = budget_sum / n if n else 0.0
+        if n > 2 and mean > 0:
+            cv = math.sqrt(max(0.0, budget_sq / n - mean * mean)) / mean
+            consistency = max(0.0, 1.0 - min(1.0, cv))
+        else:
+            consistency = stability
+        goal_alignment = (ok + (caution * model.caution_credit)) / total
+        affordability = max(0.0, 1.0 - fixed_ratio)
+        buffer = max(0.0, min(1.0, (cushion + runway_ratio) / 2))
+        weights = model.weights
+        score = (
+            stability * weights["stability"]
+            + acceleration * weights["acceleration"]
+            + buffer * weights["buffer"]
+            + affordability * weights["affordability"]
+            + goal_alignment * weights["goal_alignment"]
+            + consistency * weights["consistency"]
+            + shock * weights["shock"]
+        ) * 100
+        breakdown = {
+            "stability": int(round(stability * 100)),
+            "acceleration": int(round(acceleration * 100)),
+            "cushion": int(round(cushion * 100)),
+            "buffer": int(round(buffer * 100)),
+            "affordability": int(round(affordability * 100)),
+            "runway": int(round(runway_ratio * 100)),
+            "goal_alignment": int(round(goal_alignment * 100)),
+            "consistency": int(round(consistency * 100)),
+            "shock": int(round(shock * 100)),
+        }
+        return max(0, min(100, int(round(score)))), breakdown
+
+
+def _new_user(user_id: int):
+    return SimpleNamespace(
+        window=ScoreWindow(),
+        spend=_blank(SpendStats, user_id=user_id),
+        streak=_blank(UserStreak, user_id=user_id),
+        wallet=_blank(WalletLedger, user_id=user_id),
+    )
+
+
+# Checkpoints are JSON: plain data, and readable by any later version of this module.
+_STATE_MODELS = {"spend": SpendStats, "streak": UserStreak, "wallet": WalletLedger}
+_DATE_PARSERS = {date: date.fromisoformat, datetime: datetime.fromisoformat}
+
+
+def _state_to_json(state) -> dict:
+    return {name: value.isoformat() if isinstance(value, date) else value for name, value in vars(state).items()}
+
+
+def _state_from_json(model, data: dict):
+    for name, field in model.model_fields.items():
+        value = data.get(name)
+        if isinstance(value, str):
+            parser = next((_DATE_PARSERS[t] for t in (field.annotation, *get_args(field.annotation)) if t in _DATE_PARSERS), None)
+            if parser:
+                data[name] = parser(value)
+    return SimpleNamespace(**data)
+
+
+def _checkpoint_path(directory: str, key: str) -> str:
+    return os.path.join(directory, "checkpoints", f"{key}.json")
+
+
+def _save_checkpoint(path: str, position, events: int, users: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    state = {
+        str(user_id): {
+            "window": [list(terms) for terms in user.window.terms],
+            **{attr: _state_to_json(getattr(user, attr)) for attr in _STATE_MODELS},
+        }
+        for user_id, user in users.items()
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"position": list(position), "events": events, "users": state}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(path: str):
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    users = {
+        int(user_id): SimpleNamespace(
+            window=ScoreWindow(state["window"]),
+            **{attr: _state_from_json(model, state[attr]) for attr, model in _STATE_MODELS.items()},
+        )
+        for user_id, state in saved["users"].items()
+    }
+    return tuple(saved["position"]), saved["events"], users
+
+
+def _done_positions(engines, key: str) -> dict:
+    done = {}
+    for eng in engines:
+        with Session(eng) as session:
+            row = session.get(ReplayCheckpoint, key)
+            done[eng] = (row.segment, row.offset) if row else (-1, -1)
+    return done
+
+
+def _flush(buffers: dict, key: str, position, events: int):
+    """One transaction per database: the batch's rows plus the position they reach."""
+    for eng, tables in buffers.items():
+        with eng.begin() as conn:
+            for table, rows in tables.items():
+                if rows:
+                    conn.execute(insert(table), rows)
+            stmt = sqlite_insert(ReplayCheckpoint.__table__).values(
+                name=key, segment=position[0], offset=position[1], events=events, updated_at=datetime.utcnow()
+            )
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["name"],
+                set_={col: stmt.excluded[col] for col in ("segment", "offset", "events", "updated_at")},
+            ))
+    buffers.clear()
+
+
+def _write_state(engines, route, names, users: dict):
+    """Replace the per-user state tables with the replayed state."""
+    state_tables = [
+        (model, attr)
+        for name, model, attr in (("spend", SpendStats, "spend"), ("streaks", UserStreak, "streak"), ("wallet", WalletLedger, "wallet"))
+        if name in names
+    ]
+    if not state_tables:
+        return
+    rows = {eng: {model: [] for model, _ in state_tables} for eng in engines}
+    for user_id, user in users.items():
+        for model, attr in state_tables:
+            state = getattr(user, attr)
+            if model is WalletLedger and not state.checks:
+                continue
+            rows[route(user_id)][model].append(vars(state))
+    for eng, tables in rows.items():
+        with eng.begin() as conn:
+            for model, table_rows in tables.items():
+                conn.execute(delete(model.__table__))
+                for i in range(0, len(table_rows), REPLAY_BATCH):
+                    conn.execute(insert(model.__table__), table_rows[i:i + REPLAY_BATCH])
+
+
+def _quiet(_message: str):
+    pass
+
+
+def _replay_shard(index: int, names, directory: str, resume: bool, batch: int, checkpoint_events: int, verbose: bool) -> dict:
+    """One worker process's share of a sharded replay: the events routed to shard `index`."""
+    return _replay(
+        names, directory, resume, batch, checkpoint_events, [shards.shard_engine(index)], shards.engine_for,
+        print if verbose else _quiet, f"shard-{index:02d}",
+    )
+
+
+def replay(
+    names=DEFAULT_PROJECTIONS,
+    directory: str = EVENT_LOG_DIR,
+    resume: bool = False,
+    batch: int = REPLAY_BATCH,
+    checkpoint_events: int = REPLAY_CHECKPOINT_EVENTS,
+    engines=None,
+    route=None,
+    log=print,
+    workers: int = REPLAY_WORKERS,
+) -> dict:
+    """Rebuild the chosen projections from the event log, from scratch or from the last checkpoint.
+
+    Run it offline: the app's inline writes would interleave with the rebuild. A
+    from-scratch run raises UnloggedHistory, touching nothing, if the database has
+    checks the log does not. With SHARD_COUNT > 1 each shard replays in its own
+    process; every process reads the whole log and keeps only its shard's users.
+    """
+    names = tuple(sorted(set(names)))
+    unknown = set(names) - set(PROJECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown projections: {', '.join(sorted(unknown))}")
+    key = "+".join(names)
+    if engines is not None or shards.SHARD_COUNT < 2:
+        engines = engines or shards.all_engines()
+        if not (resume and os.path.exists(_checkpoint_path(directory, key))):
+            _refuse_unlogged(directory, engines)
+        return _replay(names, directory, resume, batch, checkpoint_events, engines, route or shards.engine_for, log)
+
+    count = shards.SHARD_COUNT
+    fresh = [i for i in range(count) if not (resume and os.path.exists(_checkpoint_path(directory, f"{key}.shard-{i:02d}")))]
+    _refuse_unlogged(directory, [shards.shard_engine(i) for i in fresh])
+    workers = max(1, min(count, workers or os.cpu_count() or 1))
+    started = time.perf_counter()
+    log(f"Replaying {key} into {count} shards with {workers} processes")
+    # spawn: a forked child would share the parent's open SQLite connections.
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        parts = list(pool.map(
+            _replay_shard, range(count), [names] * count, [directory] * count, [resume] * count,
+            [batch] * count, [checkpoint_events] * count, [log is print] * count,
+        ))
+    seconds = time.perf_counter() - started
+    replayed = sum(part["replayed"] for part in parts)
+    return {
+        "projections": names,
+        "events": sum(part["events"] for part in parts),
+        "replayed": replayed,
+        "users": sum(part["users"] for part in parts),
+        "seconds": round(seconds, 2),
+        "events_per_second": round(replayed / seconds) if seconds else None,
+    }
+
+
+def _refuse_unlogged(directory: str, engines):
+    if engines:
+        missing = unlogged_users(directory, engines)
+        if missing:
+            raise UnloggedHistory(missing)
+
+
+def _replay(names, directory, resume, batch, checkpoint_events, engines, route, log, part: str = "") -> dict:
+    # Scoring lives with the routes; importing it here keeps app.py free of a cycle.
+    from app import get_scoring_model, health_reason
+
+    key = "+".join(names)
+    path = _checkpoint_path(directory, f"{key}.{part}" if part else key)
+
+    if resume and os.path.exists(path):
+        position, events, users = _load_checkpoint(path)
+        done = _done_positions(engines, key)
+        log(f"Resuming {key}{f' {part}' if part else ''} after {events} events at segment {position[0]} byte {position[1]}")
+    else:
+        position, events, users = (0, 0), 0, {}
+        done = dict.fromkeys(engines, (-1, -1))
+        for eng in engines:
+            with eng.begin() as conn:
+                for name in names:
+                    for model in reversed(PROJECTIONS[name]):
+                        conn.execute(delete(model.__table__))
+                conn.execute(delete(ReplayCheckpoint.__table__).where(ReplayCheckpoint.name == key))
+        if os.path.exists(path):
+            os.remove(path)
+
+    want_checks = "checks" in names
+    want_scores = "scores" in names
+    want_spend = want_scores or "spend" in names
+    want_streaks = "streaks" in names
+    want_wallet = "wallet" in names
+    checks_table = CheckHistory.__table__
+    scores_table = HealthScoreHistory.__table__
+    model = get_scoring_model()
+
+    started = time.perf_counter()
+    replayed = 0
+    buffers = {}
+    routes = {}
+    for position, event in iter_checks(directory, position):
+        user_id = event.user_id
+        eng = routes.get(user_id)
+        if eng is None:
+            eng = routes[user_id] = route(user_id)
+        if eng not in done:
+            # Another process's shard.
+            continue
+        user = users.get(user_id)
+        if user is None:
+            user = users[user_id] = _new_user(user_id)
+        if want_spend:
+            spend_stats.observe(user.spend, event.today_expense, event.daily_budget)
+        if want_streaks:
+            streaks.advance(user.streak, event.status)
+        if want_wallet:
+            wallet_ledger.observe(
+                user.wallet, event.created_at.date(), event.net_income, event.fixed_expenses,
+                event.today_expense, event.days_left,
+            )
+        if want_scores:
+            user.window.push(_window_terms(
+                event.status, event.net_income, event.fixed_expenses,
+                event.today_expense, event.daily_budget, event.days_left,
+            ))
+
+        # Rows up to this database's checkpoint were committed by an earlier run.
+        if position > done[eng]:
+            tables = buffers.setdefault(eng, {})
+            if want_checks:
+                tables.setdefault(checks_table, []).append({
+                    "user_id": user_id,
+                    "net_income": event.net_income,
+                    "fixed_expenses": event.fixed_expenses,
+                    "today_expense": event.today_expense,
+                    "days_left": event.days_left,
+                    "daily_budget": event.daily_budget,
+                    "status": event.status,
+                    "message": event.message,
+                    "overspend_ratio": overspend_ratio(event.today_expense, event.daily_budget),
+                    "created_at": event.created_at,
+                })
+            if want_scores:
+                score, breakdown = user.window.score(model)
+                # compute_health_score's long-run signal, from spend_view's rounded drift mean.
+                drift_mean = round(user.spend.drift_mean, 4)
+                breakdown["drift_baseline"] = int(round((1.0 - min(1.0, max(0.0, drift_mean))) * 100))
+                tables.setdefault(scores_table, []).append({
+                    "user_id": user_id,
+                    "score": score,
+                    "label": model.band(score)[1],
+                    "reason": health_reason((), breakdown, model),
+                    "created_at": event.created_at,
+                })
+
+        events += 1
+        replayed += 1
+        if replayed % batch == 0:
+            _flush(buffers, key, position, events)
+        if replayed % checkpoint_events == 0:
+            _flush(buffers, key, position, events)
+            _save_checkpoint(path, position, events, users)
+            rate = replayed / (time.perf_counter() - started)
+            log(f"  {events} events, {len(users)} users, {rate:,.0f} events/s")
+
+    _flush(buffers, key, position, events)
+    _write_state(engines, route, names, users)
+    for eng in engines:
+        with eng.begin() as conn:
+            if want_scores:
+                # Fold aged raw scores into rollups, as record_check does on every check.
+                compact_database(conn)
+            conn.execute(update(DashboardSnapshot.__table__).values(stale=True))
+    if os.path.exists(path):
+        os.remove(path)
+
+    seconds = time.perf_counter() - started
+    return {
+        "projections": names,
+        "events": events,
+        "replayed": replayed,
+        "users": len(users),
+        "seconds": round(seconds, 2),
+        "events_per_second": round(replayed / seconds) if seconds else None,
+    }
+
+
+def verify(directory: str = EVENT_LOG_DIR) -> dict:
+    counts = {}
+    for index, _, _ in iter_records(directory):
+        counts[index] = counts.get(index, 0) + 1
+    return {"segments": len(segments(directory)), "events": sum(counts.values()), "per_segment": counts}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Append-only check event log.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("replay", help="rebuild derived tables from the log (stop the app first)")
+    p.add_argument("--only", default=",".join(DEFAULT_PROJECTIONS), help=f"comma-separated, from {', '.join(PROJECTIONS)}")
+    p.add_argument("--resume", action="store_true", help="continue from the last checkpoint instead of starting over")
+    p.add_argument("--batch", type=int, default=REPLAY_BATCH)
+    p.add_argument("--workers", type=int, default=REPLAY_WORKERS, help="processes for a sharded replay (0: one per shard, up to the CPU count)")
+    sub.add_parser("bootstrap", help="write a new log from the checks already in the database (stop the app first)")
+    sub.add_parser("verify", help="check every record's length and checksum")
+    args = parser.parse_args(argv)
+    if args.command == "bootstrap":
+        result = bootstrap()
+        moved = f"; the old log is in {result['replaced']}" if result["replaced"] else ""
+        print(f"Logged {result['events']} checks for {result['users']} users in {result['seconds']} s{moved}")
+    elif args.command == "replay":
+        try:
+            result = replay([n.strip() for n in args.only.split(",") if n.strip()], resume=args.resume, batch=args.batch, workers=args.workers)
+        except UnloggedHistory as exc:
+            raise SystemExit(str(exc))
+        print(
+            f"Replayed {result['replayed']} of {result['events']} events for {result['users']} users "
+            f"into {', '.join(result['projections'])} in {result['seconds']} s ({result['events_per_second']} events/s)"
+        )
+    else:
+        result = verify()
+        print(f"{result['events']} events in {result['segments']} segments: {result['per_segment']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import argparse
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+import event_log
+import shards
+from db import engine, overspend_ratio, CheckHistory, HealthScoreHistory, Profile, SpendStats, User
+from history_records import HistoryRecord
+from score_series import compact_user_scores
+from spend_stats import observe, rebuild_spend_stats, spend_view
+from streaks import rebuild_streak
+from wallet_ledger import rebuild_ledger
+
+# Startup seeding; the CLI does the same on demand.
+SEED_DEMO = os.getenv("SEED_DEMO", "false").lower() == "true"
+DEMO_PRO_PASSWORD = os.getenv("DEMO_PRO_PASSWORD", "")
+SEED_SANDBOX_USERS = int(os.getenv("SEED_SANDBOX_USERS", "0"))
+SEED_SANDBOX_CHECKS = int(os.getenv("SEED_SANDBOX_CHECKS", "60"))
+SANDBOX_PASSWORD = os.getenv("SANDBOX_PASSWORD", "sandbox-password")
+FIXTURE_BATCH = int(os.getenv("FIXTURE_BATCH", "5000"))
+
+logger = logging.getLogger("quiet_budget")
+
+# The demo account's history, oldest first.
+DEMO_RUNS = (
+    {"income": 3600.0, "fixed": 2150.0, "today": 72.0, "days": 14},
+    {"income": 3600.0, "fixed": 2150.0, "today": 81.0, "days": 13},
+    {"income": 3600.0, "fixed": 2150.0, "today": 96.0, "days": 12},
+    {"income": 3600.0, "fixed": 2150.0, "today": 108.0, "days": 11},
+    {"income": 3600.0, "fixed": 2150.0, "today": 84.0, "days": 10},
+    {"income": 3600.0, "fixed": 2150.0, "today": 118.0, "days": 9},
+)
+TONES = ("calm", "direct", "playful", "coach")
+CITIES = (("Lisbon", "Portugal"), ("Lyon", "France"), ("Leeds", "United Kingdom"), ("Austin", "United States"), ("Porto", "Portugal"))
+SCORE_WINDOW = 20
+
+
+def _days_to_payday(day: date) -> int:
+    """Paid on the 1st: days left in the month, counting today."""
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (next_month - day).days
+
+
+def check_rows(user_id: int, checks: int, rng: random.Random, now: datetime | None = None, spacing: timedelta = timedelta(days=1)) -> list[dict]:
+    """A plausible history for one user, oldest first, as CheckHistory insert rows.
+
+    Each user gets their own income, fixed costs and spending habit; days vary
+    around the habit with the odd splurge, so statuses, streaks and anomalies all show up.
+    """
+    from app import analyser_depense
+
+    now = now or datetime.utcnow()
+    income = round(rng.uniform(1800, 6500), -1)
+    fixed = round(income * rng.uniform(0.35, 0.7), -1)
+    habit = (income - fixed) / 30 * rng.uniform(0.7, 1.25)
+    rows = []
+    for i in range(checks):
+        created_at = now - spacing * (checks - i) + timedelta(minutes=rng.randint(0, 600))
+        days_left = _days_to_payday(created_at.date())
+        today = max(0.0, rng.gauss(habit, habit * 0.35))
+        if rng.random() < 0.05:
+            today *= rng.uniform(2, 3.5)
+        today = round(today, 2)
+        budget, status, message = analyser_depense(income, fixed, today, days_left)
+        rows.append({
+            "user_id": user_id,
+            "net_income": income,
+            "fixed_expenses": fixed,
+            "today_expense": today,
+            "days_left": days_left,
+            "daily_budget": float(budget),
+            "status": status,
+            "message": message,
+            "overspend_ratio": overspend_ratio(today, float(budget)),
+            "created_at": created_at,
+        })
+    return rows
+
+
+def score_rows(rows: list[dict]) -> list[dict]:
+    """One HealthScoreHistory row per check of one user, scored as record_check would:
+    the same window, plus the spend statistics up to and including that check."""
+    from app import compute_health_score, health_label, health_reason
+
+    window = deque(maxlen=SCORE_WINDOW)
+    spend = SpendStats(user_id=rows[0]["user_id"]) if rows else None
+    scores = []
+    for row in rows:
+        observe(spend, row["today_expense"], row["daily_budget"])
+        window.appendleft(HistoryRecord(
+            row["status"], row["net_income"], row["fixed_expenses"],
+            row["today_expense"], row["daily_budget"], row["days_left"],
+        ))
+        recent = list(window)
+        score, meta = compute_health_score(recent, spend=spend_view(spend))
+        scores.append({
+            "user_id": row["user_id"],
+            "score": score,
+            "label": health_label(score),
+            "reason": health_reason(recent, meta["breakdown"]),
+            "created_at": row["created_at"],
+        })
+    return scores
+
+
+def derive_state(user_id: int):
+    """Build the per-user state tables now rather than on the user's first request."""
+    with shards.user_session(user_id) as session:
+        rebuild_spend_stats(session, user_id)
+        rebuild_streak(session, user_id)
+        rebuild_ledger(session, user_id)
+        compact_user_scores(session, user_id)
+        session.commit()
+
+
+def _insert_batched(bind, table, rows: list[dict], batch: int):
+    with bind.begin() as conn:
+        for i in range(0, len(rows), batch):
+            conn.execute(insert(table), rows[i:i + batch])
+
+
+def _write_history(histories: dict[int, list[dict]], with_scores: bool, batch: int):
+    """Bulk-insert checks (and scores) grouped by the database each user lives in."""
+    by_engine = {}
+    for user_id, rows in histories.items():
+        tables = by_engine.setdefault(shards.engine_for(user_id), {"checks": [], "scores": []})
+        tables["checks"].extend(rows)
+        if with_scores:
+            tables["scores"].extend(score_rows(rows))
+    for bind, tables in by_engine.items():
+        _insert_batched(bind, CheckHistory.__table__, tables["checks"], batch)
+        if tables["scores"]:
+            _insert_batched(bind, HealthScoreHistory.__table__, tables["scores"], batch)
+    # Logged once committed, as record_check does, so a replay keeps these users' projections.
+    for rows in histories.values():
+        for i in range(0, len(rows), batch):
+            event_log.append_checks([
+                event_log.CheckEvent(*(row[name] for name in event_log.CheckEvent._fields)) for row in rows[i:i + batch]
+            ])
+
+
+def seed_demo(password: str = DEMO_PRO_PASSWORD) -> bool:
+    """Give the demo account its pro plan, profile and sample history; returns whether anything changed.
+
+    The account is created only when a password is configured; otherwise an existing one is filled in.
+    """
+    from app import DEMO_PRO_EMAIL, pwd_context
+
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.email == DEMO_PRO_EMAIL)).first()
+        if user is None:
+            if not password:
+                return False
+            user = User(email=DEMO_PRO_EMAIL, password_hash=pwd_context.hash(password))
+        changed = user.id is None or user.plan != "pro"
+        user.plan = "pro"
+        user.stripe_status = "active"
+        session.add(user)
+        session.flush()
+        if session.exec(select(Profile.id).where(Profile.user_id == user.id)).first() is None:
+            session.add(Profile(
+                user_id=user.id,
+                first_name="Admin",
+                last_name="User",
+                city="Demo City",
+                country="Demo Land",
+                companion_tone="coach",
+            ))
+            changed = True
+        session.commit()
+        user_id = user.id
+
+    with shards.user_session(user_id) as session:
+        has_history = session.exec(select(CheckHistory.id).where(CheckHistory.user_id == user_id).limit(1)).first()
+    if has_history is None:
+        from app import analyser_depense
+
+        now = datetime.utcnow()
+        rows = []
+        for idx, run in enumerate(DEMO_RUNS):
+            budget, status, message = analyser_depense(run["income"], run["fixed"], run["today"], run["days"])
+            rows.append({
+                "user_id": user_id,
+                "net_income": run["income"],
+                "fixed_expenses": run["fixed"],
+                "today_expense": run["today"],
+                "days_left": run["days"],
+                "daily_budget": float(budget),
+                "status": status,
+                "message": message,
+                "overspend_ratio": overspend_ratio(run["today"], float(budget)),
+                "created_at": now - timedelta(days=len(DEMO_RUNS) - idx),
+            })
+        _write_history({user_id: rows}, with_scores=True, batch=FIXTURE_BATCH)
+        derive_state(user_id)
+        changed = True
+    return changed
+
+
+def seed_sandbox(
+    users: int,
+    checks: int,
+    prefix: str = "sandbox",
+    seed: int = 1,
+    password: str = SANDBOX_PASSWORD,
+    with_scores: bool = True,
+    derive: bool = True,
+    batch: int = FIXTURE_BATCH,
+    log=print,
+) -> dict:
+    """Create `users` accounts named <prefix>-<n>@example.test with `checks` checks each.
+
+    Accounts that already exist are left alone, so re-running only tops up.
+    """
+    from app import pwd_context
+
+    started = time.perf_counter()
+    emails = [f"{prefix}-{n}@example.test" for n in range(1, users + 1)]
+    # One bcrypt hash for every sandbox account; hashing per user would dominate the run.
+    password_hash = pwd_context.hash(password)
+    created = {}
+    for i in range(0, len(emails), batch):
+        chunk = emails[i:i + batch]
+        with Session(engine) as session:
+            existing = set(session.exec(select(User.email).where(User.email.in_(chunk))))
+            fresh = [email for email in chunk if email not in existing]
+            if not fresh:
+                continue
+            session.connection().execute(
+                insert(User.__table__),
+                [{"email": email, "password_hash": password_hash, "plan": "free", "created_at": datetime.utcnow()} for email in fresh],
+            )
+            ids = dict(session.exec(select(User.email, User.id).where(User.email.in_(fresh))).all())
+            profiles = []
+            for email in fresh:
+                rng = random.Random(f"{seed}:{email}")
+                city, country = rng.choice(CITIES)
+                profiles.append({
+                    "user_id": ids[email],
+                    "first_name": email.split("@", 1)[0].replace("-", " ").title(),
+                    "last_name": "",
+                    "address": "",
+                    "city": city,
+                    "country": country,
+                    "phone": "",
+                    "companion_tone": rng.choice(TONES),
+                })
+            session.connection().execute(insert(Profile.__table__), profiles)
+            session.commit()
+        now = datetime.utcnow()
+        histories = {ids[email]: check_rows(ids[email], checks, random.Random(f"{seed}:{email}"), now) for email in fresh}
+        _write_history(histories, with_scores, batch)
+        if derive:
+            for user_id in histories:
+                derive_state(user_id)
+        created.update(ids)
+        log(f"  {len(created)} accounts seeded")
+
+    return {
+        "users": len(created),
+        "checks": len(created) * checks,
+        "skipped": len(emails) - len(created),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def seed_on_startup():
+    """SEED_DEMO / SEED_SANDBOX_USERS; each worker may try, only the first one writes."""
+    try:
+        if SEED_DEMO and seed_demo():
+            logger.info("Seeded the demo account")
+        if SEED_SANDBOX_USERS > 0:
+            result = seed_sandbox(SEED_SANDBOX_USERS, SEED_SANDBOX_CHECKS, log=lambda _msg: None)
+            if result["users"]:
+                logger.info("Seeded %s sandbox accounts with %s checks", result["users"], result["checks"])
+    except IntegrityError:
+        logger.info("Fixtures are being seeded by another worker")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Seed demo and sandbox accounts, e.g. for local work or load tests.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("demo", help="plan, profile and sample history for DEMO_PRO_EMAIL")
+    p.add_argument("--password", default=DEMO_PRO_PASSWORD, help="create the account with this password if missing")
+    p = sub.add_parser("sandbox", help="N accounts with M checks each")
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--checks", type=int, default=SEED_SANDBOX_CHECKS)
+    p.add_argument("--prefix", default="sandbox")
+    p.add_argument("--seed", type=int, default=1, help="same seed, same histories")
+    p.add_argument("--password", default=SANDBOX_PASSWORD)
+    p.add_argument("--no-scores", action="store_true", help="skip the per-check health score rows")
+    p.add_argument("--no-derive", action="store_true", help="leave streaks, spend stats and wallet to lazy backfill")
+    p.add_argument("--batch", type=int, default=FIXTURE_BATCH)
+    args = parser.parse_args(argv)
+
+    from db import init_db
+
+    init_db()
+    shards.init_shards()
+    if args.command == "demo":
+        print("Demo account seeded" if seed_demo(args.password) else "Demo account already seeded (or missing; pass --password)")
+    else:
+        result = seed_sandbox(
+            args.users, args.checks, prefix=args.prefix, seed=args.seed, password=args.password,
+            with_scores=not args.no_scores, derive=not args.no_derive, batch=args.batch,
+        )
+        print(
+            f"Seeded {result['users']} accounts and {result['checks']} checks in {result['seconds']} s "
+            f"({result['skipped']} already existed)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import math
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from dashboard_snapshot import invalidate_snapshot
+from db import Goal, GoalContribution
+import shards
+
+MAX_GOALS_PER_USER = 12
+MAX_AMOUNT = 1_000_000_000
+GOAL_HEADROOM_ALPHA = float(os.getenv("GOAL_HEADROOM_ALPHA", "0.2"))
+# A goal's contribution pace is averaged over at least this many days.
+PACE_MIN_DAYS = 7
+MAX_FORECAST_DAYS = 365 * 50
+
+
+class GoalError(ValueError):
+    pass
+
+
+def _amount(value, label: str) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise GoalError(f"{label} must be a number.") from None
+    if not math.isfinite(value) or abs(value) > MAX_AMOUNT:
+        raise GoalError(f"{label} is out of range.")
+    return value
+
+
+def validate_goal(name: str, target_amount, deadline) -> tuple[str, float, date | None]:
+    name = (name or "").strip()
+    if not name or len(name) > 80:
+        raise GoalError("Give the goal a name of up to 80 characters.")
+    target = _amount(target_amount, "Target")
+    if target <= 0:
+        raise GoalError("Target must be more than zero.")
+    if isinstance(deadline, str):
+        deadline = deadline.strip() or None
+        if deadline:
+            try:
+                deadline = date.fromisoformat(deadline)
+            except ValueError:
+                raise GoalError("Dates must look like 2026-03-31.") from None
+    return name, round(target, 2), deadline
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def forecast_key(goal: Goal, today: date) -> str:
+    """Everything the forecast depends on; the cached forecast is reused while this matches."""
+    return "|".join((
+        f"{goal.saved_amount:.2f}",
+        f"{goal.target_amount:.2f}",
+        goal.deadline.isoformat() if goal.deadline else "",
+        str(goal.contributions),
+        # Headroom moves a little on every check; whole units are enough for a forecast.
+        str(round(goal.headroom_ewma)) if not goal.contributions else "",
+        today.isoformat(),
+    ))
+
+
+def _forecast(goal: Goal, today: date):
+    remaining = max(0.0, goal.target_amount - goal.saved_amount)
+    if remaining <= 0:
+        done_on = goal.completed_at.date() if goal.completed_at else today
+        return {"pace": goal.pace_per_day, "basis": goal.pace_basis, "required": 0.0, "projected": done_on, "status": "done"}
+
+    if goal.contributions:
+        days = max(PACE_MIN_DAYS, (today - goal.created_at.date()).days + 1)
+        pace, basis = max(0.0, goal.saved_amount) / days, "contributions"
+    elif goal.checks and goal.headroom_ewma > 0:
+        # No money set aside yet: assume the usual daily underspend goes to the goal.
+        pace, basis = goal.headroom_ewma, "headroom"
+    else:
+        pace, basis = 0.0, "none"
+
+    required = None
+    if goal.deadline:
+        required = remaining / max(1, (goal.deadline - today).days)
+
+    days_needed = math.ceil(remaining / pace) if pace > 0 else None
+    projected = today + timedelta(days=days_needed) if days_needed and days_needed <= MAX_FORECAST_DAYS else None
+    if goal.deadline and goal.deadline < today:
+        status = "overdue"
+    elif projected is None:
+        status = "no_pace"
+    elif goal.deadline and projected > goal.deadline:
+        status = "behind"
+    else:
+        status = "on_track"
+    return {"pace": pace, "basis": basis, "required": required, "projected": projected, "status": status}
+
+
+def refresh_forecast(goal: Goal, today: date | None = None) -> bool:
+    """Recompute the cached forecast if its inputs changed; returns whether it did."""
+    today = today or _today()
+    key = forecast_key(goal, today)
+    if key == goal.forecast_key:
+        return False
+    forecast = _forecast(goal, today)
+    goal.pace_per_day = round(forecast["pace"], 4)
+    goal.pace_basis = forecast["basis"]
+    goal.required_per_day = round(forecast["required"], 2) if forecast["required"] is not None else None
+    goal.projected_date = forecast["projected"]
+    goal.forecast_status = forecast["status"]
+    goal.forecast_key = key
+    return True
+
+
+def create_goal(session: Session, user_id: int, name: str, target_amount, deadline=None) -> Goal:
+    name, target, deadline = validate_goal(name, target_amount, deadline)
+    count = session.exec(select(func.count()).select_from(Goal).where(Goal.user_id == user_id)).one()
+    if count >= MAX_GOALS_PER_USER:
+        raise GoalError(f"You can keep up to {MAX_GOALS_PER_USER} goals.")
+    goal = Goal(user_id=user_id, name=name, target_amount=target, deadline=deadline)
+    refresh_forecast(goal)
+    session.add(goal)
+    return goal
+
+
+def get_goal(session: Session, user_id: int, goal_id: int) -> Goal | None:
+    goal = session.get(Goal, goal_id)
+    return goal if goal is not None and goal.user_id == user_id else None
+
+
+def add_contribution(session: Session, goal: Goal, amount, now: datetime | None = None) -> GoalContribution:
+    """Record money set aside (negative to take some back) and update progress in O(1)."""
+    amount = round(_amount(amount, "Amount"), 2)
+    if amount == 0:
+        raise GoalError("Amount must not be zero.")
+    if goal.saved_amount + amount < 0:
+        raise GoalError("You can't take back more than you've saved.")
+    now = now or datetime.utcnow()
+    contribution = GoalContribution(goal_id=goal.id, user_id=goal.user_id, amount=amount, created_at=now)
+    goal.saved_amount = round(goal.saved_amount + amount, 2)
+    goal.contributions += 1
+    goal.last_contribution_at = now
+    if goal.saved_amount >= goal.target_amount:
+        goal.completed_at = goal.completed_at or now
+    else:
+        goal.completed_at = None
+    refresh_forecast(goal, now.date())
+    session.add(contribution)
+    session.add(goal)
+    return contribution
+
+
+def record_check_goals(session: Session, user_id: int, today_expense: float, budget: float, today: date | None = None):
+    """Fold one check's underspend into every open goal; O(open goals for this user)."""
+    goals = session.exec(select(Goal).where(Goal.user_id == user_id, Goal.completed_at.is_(None))).all()
+    headroom = max(0.0, float(budget or 0) - float(today_expense or 0))
+    for goal in goals:
+        if goal.checks:
+            goal.headroom_ewma += GOAL_HEADROOM_ALPHA * (headroom - goal.headroom_ewma)
+        else:
+            goal.headroom_ewma = headroom
+        goal.checks += 1
+        refresh_forecast(goal, today)
+        session.add(goal)
+    return goals
+
+
+def list_goals(session: Session, user_id: int, today: date | None = None) -> list[Goal]:
+    """The user's goals with forecasts brought up to date (normally only once a day)."""
+    goals = session.exec(
+        select(Goal).where(Goal.user_id == user_id).order_by(Goal.completed_at.is_not(None), Goal.id)
+    ).all()
+    for goal in goals:
+        if refresh_forecast(goal, today):
+            session.add(goal)
+    return goals
+
+
+def delete_goal(session: Session, goal: Goal):
+    session.exec(delete(GoalContribution).where(GoalContribution.goal_id == goal.id))
+    session.delete(goal)
+
+
+def rebuild_goal(session: Session, goal: Goal) -> Goal:
+    """Recompute progress from the contribution rows, e.g. after a manual fix-up."""
+    total, count, last = session.exec(
+        select(
+            func.coalesce(func.sum(GoalContribution.amount), 0.0),
+            func.count(GoalContribution.id),
+            func.max(GoalContribution.created_at),
+        ).where(GoalContribution.goal_id == goal.id)
+    ).one()
+    goal.saved_amount = round(total, 2)
+    goal.contributions = count
+    goal.last_contribution_at = last
+    if goal.saved_amount < goal.target_amount:
+        goal.completed_at = None
+    elif goal.completed_at is None:
+        goal.completed_at = last or datetime.utcnow()
+    goal.forecast_key = ""
+    refresh_forecast(goal)
+    session.add(goal)
+    return goal
+
+
+def goal_view(goal: Goal) -> dict:
+    pct = min(100, int(goal.saved_amount / goal.target_amount * 100)) if goal.target_amount else 0
+    return {
+        "id": goal.id,
+        "name": goal.name,
+        "target": goal.target_amount,
+        "saved": goal.saved_amount,
+        "remaining": round(max(0.0, goal.target_amount - goal.saved_amount), 2),
+        "pct": pct,
+        "deadline": goal.deadline.isoformat() if goal.deadline else None,
+        "status": goal.forecast_status,
+        "pace_per_day": round(goal.pace_per_day, 2),
+        "pace_basis": goal.pace_basis,
+        "required_per_day": goal.required_per_day,
+        "projected_date": goal.projected_date.isoformat() if goal.projected_date else None,
+        "contributions": goal.contributions,
+    }
+
+
+def goal_summaries(session: Session, user_id: int, limit: int = 3) -> list[dict]:
+    return [goal_view(goal) for goal in list_goals(session, user_id)[:limit]]
+
+
+def rebuild_all(user_id: int | None = None) -> int:
+    rebuilt = 0
+    for uid in [user_id] if user_id is not None else shards.user_ids(Goal):
+        with shards.user_session(uid) as session:
+            for goal in session.exec(select(Goal).where(Goal.user_id == uid)).all():
+                rebuild_goal(session, goal)
+                rebuilt += 1
+            invalidate_snapshot(session, uid)
+            session.commit()
+    return rebuilt
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Maintain precomputed goal progress.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute progress from the contribution rows")
+    rebuild.add_argument("--user", type=int, default=None, help="only this user id")
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        print(f"Rebuilt {rebuild_all(args.user)} goals")
+
+
+if __name__ == "__main__":
+    main()
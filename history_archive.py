@@ -0,0 +1,233 @@
+import argparse
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from db import overspend_ratio, CheckArchive, CheckHistory
+import shards
+
+CHECK_RETENTION_DAYS = int(os.getenv("CHECK_RETENTION_DAYS", "180"))
+# Scoring reads the newest 20 checks, so those always stay in the hot table.
+MIN_HOT_ROWS = 20
+
+PACK_VERSION = 2
+_HEADER = struct.Struct("<BI")
+_AMOUNTS = ("net_income", "fixed_expenses", "today_expense", "daily_budget")
+
+
+def _columns(amount_code: str) -> tuple:
+    """(attribute, array typecode) in on-disk order."""
+    return (("created_at", "q"), *((name, amount_code) for name in _AMOUNTS), ("days_left", "h"), ("status", "b"))
+
+
+# Version 1 stored amounts as float32, which moves cents on amounts past ~100k;
+# version 2 stores the exact float64. Version 1 archives stay readable.
+_COLUMNS = {1: _columns("f"), 2: _columns("d")}
+STATUS_CODES = {"ok": 0, "caution": 1, "danger": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+STATUS_MESSAGES = {
+    "ok": "You’re on track.",
+    "caution": "You still have funds — just stay mindful.",
+    "danger": "Funds are low — careful planning helps here.",
+}
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(ts: datetime) -> int:
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _column_value(row: CheckHistory, name: str):
+    if name == "created_at":
+        return _to_micros(row.created_at)
+    if name == "status":
+        return STATUS_CODES.get(row.status, STATUS_CODES["danger"])
+    if name == "days_left":
+        return max(-32768, min(32767, int(row.days_left)))
+    return float(getattr(row, name) or 0)
+
+
+def pack_checks(rows: list[CheckHistory]) -> bytes:
+    """One column array per field, zlib-compressed; messages are not stored (see unpack_checks)."""
+    parts = [_HEADER.pack(PACK_VERSION, len(rows))]
+    for name, code in _COLUMNS[PACK_VERSION]:
+        col = array(code, (_column_value(row, name) for row in rows))
+        if sys.byteorder != "little":
+            col.byteswap()
+        parts.append(col.tobytes())
+    return zlib.compress(b"".join(parts), 6)
+
+
+def unpack_checks(payload: bytes, user_id: int) -> list[CheckHistory]:
+    """The archived checks, oldest first, as transient CheckHistory rows.
+
+    The archive does not keep each check's message: rows come back with the
+    canonical STATUS_MESSAGES text for their status instead.
+    """
+    raw = zlib.decompress(payload)
+    version, count = _HEADER.unpack_from(raw)
+    if version not in _COLUMNS:
+        raise ValueError(f"Unsupported archive pack version {version}")
+    offset = _HEADER.size
+    columns = {}
+    for name, code in _COLUMNS[version]:
+        col = array(code)
+        size = col.itemsize * count
+        col.frombytes(raw[offset:offset + size])
+        if sys.byteorder != "little":
+            col.byteswap()
+        columns[name] = col
+        offset += size
+
+    if version == 1:
+        # float32 noise; rounding gets most amounts back to the cent.
+        for name in _AMOUNTS:
+            columns[name] = [round(value, 2) for value in columns[name]]
+
+    rows = []
+    for i in range(count):
+        status = STATUS_NAMES.get(columns["status"][i], "danger")
+        rows.append(
+            CheckHistory(
+                user_id=user_id,
+                net_income=columns["net_income"][i],
+                fixed_expenses=columns["fixed_expenses"][i],
+                today_expense=columns["today_expense"][i],
+                days_left=columns["days_left"][i],
+                daily_budget=columns["daily_budget"][i],
+                status=status,
+                message=STATUS_MESSAGES[status],
+                overspend_ratio=overspend_ratio(columns["today_expense"][i], columns["daily_budget"][i]),
+                created_at=_from_micros(columns["created_at"][i]),
+            )
+        )
+    return rows
+
+
+def _store_month(session: Session, user_id: int, month: str, rows: list[CheckHistory]):
+    archive = session.exec(
+        select(CheckArchive)
+        .where(CheckArchive.user_id == user_id)
+        .where(CheckArchive.month == month)
+    ).first()
+    if archive:
+        rows = unpack_checks(archive.payload, user_id) + rows
+    rows.sort(key=lambda r: r.created_at)
+    if not archive:
+        archive = CheckArchive(user_id=user_id, month=month, row_count=0, first_at=rows[0].created_at, last_at=rows[0].created_at, payload=b"")
+    archive.row_count = len(rows)
+    archive.first_at = rows[0].created_at
+    archive.last_at = rows[-1].created_at
+    archive.payload = pack_checks(rows)
+    session.add(archive)
+
+
+def archive_user_checks(session: Session, user_id: int, before: datetime) -> int:
+    keep_ids = session.exec(
+        select(CheckHistory.id)
+        .where(CheckHistory.user_id == user_id)
+        .order_by(CheckHistory.created_at.desc())
+        .limit(MIN_HOT_ROWS)
+    ).all()
+    query = (
+        select(CheckHistory)
+        .where(CheckHistory.user_id == user_id)
+        .where(CheckHistory.created_at < before)
+        .order_by(CheckHistory.created_at)
+    )
+    if keep_ids:
+        query = query.where(CheckHistory.id.not_in(keep_ids))
+    rows = session.exec(query).all()
+    if not rows:
+        return 0
+
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row.created_at.strftime("%Y-%m"), []).append(row)
+    for month, month_rows in by_month.items():
+        _store_month(session, user_id, month, month_rows)
+
+    ids = [row.id for row in rows]
+    session.exec(delete(CheckHistory).where(CheckHistory.id.in_(ids)))
+    return len(ids)
+
+
+def archive_checks(retention_days: int = CHECK_RETENTION_DAYS, now: datetime | None = None) -> int:
+    before = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    moved = 0
+    user_ids = []
+    for eng in shards.all_engines():
+        with Session(eng) as session:
+            user_ids += session.exec(
+                select(CheckHistory.user_id)
+                .where(CheckHistory.created_at < before)
+                .distinct()
+            ).all()
+    for user_id in user_ids:
+        with shards.user_session(user_id) as session:
+            moved += archive_user_checks(session, user_id, before)
+            session.commit()
+    return moved
+
+
+def load_archived_checks(
+    session: Session,
+    user_id: int,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    newest_first: bool = True,
+    limit: int | None = None,
+) -> list[CheckHistory]:
+    query = select(CheckArchive).where(CheckArchive.user_id == user_id)
+    if start is not None:
+        query = query.where(CheckArchive.last_at >= start)
+    if end is not None:
+        query = query.where(CheckArchive.first_at <= end)
+    query = query.order_by(CheckArchive.month.desc() if newest_first else CheckArchive.month)
+
+    out = []
+    for archive in session.exec(query):
+        rows = unpack_checks(archive.payload, user_id)
+        if start is not None or end is not None:
+            rows = [
+                r for r in rows
+                if (start is None or r.created_at >= start) and (end is None or r.created_at <= end)
+            ]
+        if newest_first:
+            rows.reverse()
+        out.extend(rows)
+        if limit is not None and len(out) >= limit:
+            return out[:limit]
+    return out
+
+
+def iter_user_checks(session: Session, user_id: int, start: datetime | None = None, end: datetime | None = None):
+    """Every check for a user, hot rows first then archived months, newest first."""
+    query = select(CheckHistory).where(CheckHistory.user_id == user_id)
+    if start is not None:
+        query = query.where(CheckHistory.created_at >= start)
+    if end is not None:
+        query = query.where(CheckHistory.created_at <= end)
+    yield from session.exec(query.order_by(CheckHistory.created_at.desc()))
+    yield from load_archived_checks(session, user_id, start=start, end=end)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Move old checks into per-user monthly archive blobs.")
+    parser.add_argument("--days", type=int, default=CHECK_RETENTION_DAYS, help="hot retention horizon in days")
+    args = parser.parse_args(argv)
+    print(f"Archived {archive_checks(retention_days=args.days)} checks")
+
+
+if __name__ == "__main__":
+    main()
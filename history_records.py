@@ -0,0 +1,82 @@
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import Session
+
+from db import CheckHistory
+from history_archive import load_archived_checks
+from shards import async_engine_for, engine_for
+
+_checks = CheckHistory.__table__.c
+
+
+class HistoryRecord:
+    """The six numeric/status fields the scoring functions read from a check."""
+
+    __slots__ = ("status", "net_income", "fixed_expenses", "today_expense", "daily_budget", "days_left")
+
+    def __init__(self, status, net_income, fixed_expenses, today_expense, daily_budget, days_left):
+        self.status = status
+        self.net_income = net_income
+        self.fixed_expenses = fixed_expenses
+        self.today_expense = today_expense
+        self.daily_budget = daily_budget
+        self.days_left = days_left
+
+    @classmethod
+    def from_check(cls, check: CheckHistory):
+        return cls(
+            check.status,
+            check.net_income,
+            check.fixed_expenses,
+            check.today_expense,
+            check.daily_budget,
+            check.days_left,
+        )
+
+    def __repr__(self):
+        return f"HistoryRecord(status={self.status!r}, daily_budget={self.daily_budget!r}, today_expense={self.today_expense!r})"
+
+
+SCORING_COLUMNS = (
+    _checks.status,
+    _checks.net_income,
+    _checks.fixed_expenses,
+    _checks.today_expense,
+    _checks.daily_budget,
+    _checks.days_left,
+)
+
+
+def _fetch(conn: Connection, user_id: int, limit: int) -> list[HistoryRecord]:
+    stmt = (
+        select(*SCORING_COLUMNS)
+        .where(_checks.user_id == user_id)
+        .order_by(_checks.created_at.desc())
+        .limit(limit)
+    )
+    records = [HistoryRecord(*row) for row in conn.execute(stmt)]
+    if len(records) < limit:
+        with Session(bind=conn) as session:
+            archived = load_archived_checks(session, user_id, limit=limit - len(records))
+        records.extend(HistoryRecord.from_check(h) for h in archived)
+    return records
+
+
+def fetch_history_records(user_id: int, limit: int = 15, conn: Connection | None = None) -> list[HistoryRecord]:
+    """Newest-first scoring records via a Core column select (no ORM hydration)."""
+    if conn is not None:
+        return _fetch(conn, user_id, limit)
+    with engine_for(user_id).connect() as conn:
+        return _fetch(conn, user_id, limit)
+
+
+async def fetch_history_records_async(
+    user_id: int,
+    limit: int = 15,
+    conn: AsyncConnection | None = None,
+) -> list[HistoryRecord]:
+    if conn is not None:
+        return await conn.run_sync(_fetch, user_id, limit)
+    async with async_engine_for(user_id).connect() as conn:
+        return await conn.run_sync(_fetch, user_id, limit)
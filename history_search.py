@@ -0,0 +1,157 @@
+import base64
+from dataclasses import dataclass, fields
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, select
+
+from db import CheckHistory
+
+STATUSES = ("ok", "caution", "danger")
+MAX_PAGE_SIZE = 100
+# Counting stops here ("10000+"), which bounds the cost of broad filters.
+COUNT_CAP = 10000
+
+_checks = CheckHistory.__table__.c
+
+
+@dataclass
+class HistoryFilters:
+    status: str | None = None
+    start: date | None = None
+    end: date | None = None
+    min_spend: float | None = None
+    max_spend: float | None = None
+    min_budget: float | None = None
+    max_budget: float | None = None
+    # Percent over the daily budget, e.g. 30 for "spent 30% more than budget".
+    min_overspend: float | None = None
+    max_overspend: float | None = None
+
+    @classmethod
+    def from_params(cls, params) -> "HistoryFilters":
+        """Parse query parameters; raises ValueError with a user-facing message."""
+        values = {}
+        for f in fields(cls):
+            raw = (params.get(f.name) or "").strip()
+            if not raw:
+                continue
+            if f.name == "status":
+                if raw not in STATUSES:
+                    raise ValueError("Unknown status.")
+                values[f.name] = raw
+            elif f.name in ("start", "end"):
+                try:
+                    values[f.name] = date.fromisoformat(raw)
+                except ValueError:
+                    raise ValueError("Dates must look like 2026-03-31.") from None
+            else:
+                try:
+                    values[f.name] = float(raw)
+                except ValueError:
+                    raise ValueError("Amounts must be numbers.") from None
+        filters = cls(**values)
+        if filters.start and filters.end and filters.start > filters.end:
+            raise ValueError("The start date is after the end date.")
+        return filters
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) is None for f in fields(self))
+
+    def as_params(self) -> dict:
+        params = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if value is not None:
+                params[f.name] = value.isoformat() if isinstance(value, date) else str(value)
+        return params
+
+    def conditions(self, user_id: int) -> list:
+        conds = [_checks.user_id == user_id]
+        if self.status:
+            conds.append(_checks.status == self.status)
+        if self.start:
+            conds.append(_checks.created_at >= datetime.combine(self.start, datetime.min.time()))
+        if self.end:
+            conds.append(_checks.created_at < datetime.combine(self.end + timedelta(days=1), datetime.min.time()))
+        if self.min_spend is not None:
+            conds.append(_checks.today_expense >= self.min_spend)
+        if self.max_spend is not None:
+            conds.append(_checks.today_expense <= self.max_spend)
+        if self.min_budget is not None:
+            conds.append(_checks.daily_budget >= self.min_budget)
+        if self.max_budget is not None:
+            conds.append(_checks.daily_budget <= self.max_budget)
+        if self.min_overspend is not None:
+            conds.append(_checks.overspend_ratio >= self.min_overspend / 100)
+            if self.min_overspend > 0:
+                # Repeats the partial index predicate so SQLite may use it.
+                conds.append(_checks.overspend_ratio > 0)
+        if self.max_overspend is not None:
+            conds.append(_checks.overspend_ratio <= self.max_overspend / 100)
+        return conds
+
+
+def encode_cursor(check: CheckHistory) -> str:
+    raw = f"{check.created_at.isoformat()}|{check.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, check_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(check_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid page cursor.") from None
+
+
+def search_history(
+    session: Session,
+    user_id: int,
+    filters: HistoryFilters,
+    limit: int = 50,
+    cursor: str | None = None,
+    with_total: bool = True,
+) -> dict:
+    """One page of matching checks, newest first, using (created_at, id) keyset pagination."""
+    limit = max(1, min(MAX_PAGE_SIZE, limit))
+    conds = filters.conditions(user_id)
+    page_conds = list(conds)
+    if cursor:
+        page_conds.append(tuple_(_checks.created_at, _checks.id) < tuple_(*decode_cursor(cursor)))
+
+    rows = session.exec(
+        select(CheckHistory)
+        .where(*page_conds)
+        .order_by(CheckHistory.created_at.desc(), CheckHistory.id.desc())
+        .limit(limit + 1)
+    ).all()
+    items = list(rows[:limit])
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+
+    total = None
+    if with_total:
+        matches = select(_checks.id).where(*conds).limit(COUNT_CAP + 1).subquery()
+        total = session.exec(select(func.count()).select_from(matches)).one()
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "total": min(total, COUNT_CAP) if total is not None else None,
+        "total_capped": total is not None and total > COUNT_CAP,
+    }
+
+
+def check_view(check: CheckHistory) -> dict:
+    return {
+        "id": check.id,
+        "created_at": check.created_at.isoformat(),
+        "status": check.status,
+        "net_income": check.net_income,
+        "fixed_expenses": check.fixed_expenses,
+        "today_expense": check.today_expense,
+        "daily_budget": check.daily_budget,
+        "days_left": check.days_left,
+        "overspend_pct": round(check.overspend_ratio * 100, 1) if check.overspend_ratio is not None else None,
+        "message": check.message,
+    }
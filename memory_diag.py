@@ -0,0 +1,300 @@
+import argparse
+import gc
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+# Everything here is off unless enabled; nothing is hooked into requests when it is.
+MEMORY_DIAG_ENABLED = os.getenv("MEMORY_DIAG_ENABLED", "false").lower() == "true"
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "10"))
+MEMORY_TRACE_AT_STARTUP = os.getenv("MEMORY_TRACE_AT_STARTUP", "false").lower() == "true"
+# Fraction of requests whose net traced allocation is attributed to their route (needs tracing on).
+MEMORY_ROUTE_SAMPLE_RATE = float(os.getenv("MEMORY_ROUTE_SAMPLE_RATE", "0")) if MEMORY_DIAG_ENABLED else 0.0
+MEMORY_GAUGE_INTERVAL = float(os.getenv("MEMORY_GAUGE_INTERVAL", "15"))
+MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR", "memory_snapshots")
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "8"))
+
+GROUP_BY = ("lineno", "filename", "traceback")
+# Allocations made by the profiler and the import machinery are noise in every diff.
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_lock = threading.Lock()
+_snapshots = OrderedDict()  # id -> {"id", "label", "path", "taken_at", "traced_bytes"}
+_next_id = 1
+_routes = {}  # route -> [samples, net bytes, largest net bytes]
+_watches = {}
+_gauges = {}
+_sampler = None
+
+
+class MemoryDiagError(Exception):
+    pass
+
+
+def enabled() -> bool:
+    return MEMORY_DIAG_ENABLED
+
+
+def start_tracing(frames: int = MEMORY_TRACE_FRAMES):
+    """Start tracemalloc; costs CPU and memory on every allocation until stopped."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, min(100, int(frames))))
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    with _lock:
+        _routes.clear()
+
+
+def take_snapshot(label: str = "") -> dict:
+    """Write a filtered snapshot to disk; only the newest MEMORY_MAX_SNAPSHOTS are kept."""
+    global _next_id
+    if not tracemalloc.is_tracing():
+        raise MemoryDiagError("Start tracing before taking a snapshot.")
+    snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+    os.makedirs(MEMORY_SNAPSHOT_DIR, exist_ok=True)
+    with _lock:
+        snapshot_id = _next_id
+        _next_id += 1
+    path = os.path.join(MEMORY_SNAPSHOT_DIR, f"{os.getpid()}-{snapshot_id}.snap")
+    snapshot.dump(path)
+    info = {
+        "id": snapshot_id,
+        "label": label[:80],
+        "path": path,
+        "taken_at": time.time(),
+        "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+    }
+    with _lock:
+        _snapshots[snapshot_id] = info
+        while len(_snapshots) > MEMORY_MAX_SNAPSHOTS:
+            _, old = _snapshots.popitem(last=False)
+            if os.path.exists(old["path"]):
+                os.remove(old["path"])
+    return info
+
+
+def snapshots() -> list[dict]:
+    with _lock:
+        return list(_snapshots.values())
+
+
+def _load(snapshot_id: int):
+    with _lock:
+        info = _snapshots.get(snapshot_id)
+    if info is None:
+        raise MemoryDiagError(f"No snapshot {snapshot_id} in this worker.")
+    return tracemalloc.Snapshot.load(info["path"])
+
+
+def _where(stat, group_by: str):
+    frames = stat.traceback if group_by == "traceback" else stat.traceback[:1]
+    return [f"{frame.filename}:{frame.lineno}" for frame in frames]
+
+
+def _group_by(group_by: str) -> str:
+    if group_by not in GROUP_BY:
+        raise MemoryDiagError(f"group_by must be one of {', '.join(GROUP_BY)}.")
+    return group_by
+
+
+def top_stats(snapshot, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+    group_by = _group_by(group_by)
+    return [
+        {"where": _where(stat, group_by), "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def diff_stats(old, new, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+    """Allocation sites that grew (or shrank) the most between two snapshots."""
+    group_by = _group_by(group_by)
+    return [
+        {
+            "where": _where(stat, group_by),
+            "size_bytes": stat.size,
+            "size_diff_bytes": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        }
+        for stat in new.compare_to(old, group_by)[:limit]
+    ]
+
+
+def top(snapshot_id: int, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+    return top_stats(_load(snapshot_id), limit, group_by)
+
+
+def diff(old_id: int, new_id: int, limit: int = 20, group_by: str = "lineno") -> list[dict]:
+    return diff_stats(_load(old_id), _load(new_id), limit, group_by)
+
+
+def should_sample() -> bool:
+    return random.random() < MEMORY_ROUTE_SAMPLE_RATE and tracemalloc.is_tracing()
+
+
+def traced_bytes() -> int:
+    return tracemalloc.get_traced_memory()[0]
+
+
+def observe_route(route: str, net_bytes: int):
+    """Approximate: concurrent requests' allocations land in whichever sample is open."""
+    with _lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = [0, 0, 0]
+        stats[0] += 1
+        stats[1] += net_bytes
+        stats[2] = max(stats[2], net_bytes)
+
+
+def route_stats() -> list[dict]:
+    with _lock:
+        rows = [
+            {"route": route, "samples": n, "net_bytes": total, "mean_net_bytes": total // n, "max_net_bytes": largest}
+            for route, (n, total, largest) in _routes.items()
+        ]
+    return sorted(rows, key=lambda row: -row["net_bytes"])
+
+
+def watch(name: str, size_fn):
+    """Report `size_fn()` (e.g. a cache's length) as a gauge on every sample."""
+    _watches[name] = size_fn
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the high-water mark (KiB on Linux, bytes on macOS).
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def sample() -> dict:
+    gauges = {
+        "rss_bytes": rss_bytes(),
+        "gc_pending": gc.get_count(),
+        "gc_collections": tuple(gen["collections"] for gen in gc.get_stats()),
+        "gc_uncollectable": tuple(gen["uncollectable"] for gen in gc.get_stats()),
+        "traced_bytes": tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None,
+        "watches": {},
+    }
+    for name, size_fn in list(_watches.items()):
+        try:
+            gauges["watches"][name] = size_fn()
+        except Exception:
+            continue
+    gauges["sampled_at"] = time.time()
+    _gauges.update(gauges)
+    return gauges
+
+
+def _run_sampler():
+    while True:
+        sample()
+        time.sleep(MEMORY_GAUGE_INTERVAL)
+
+
+def start():
+    """Called at startup: the gauge thread, plus tracemalloc if asked for."""
+    global _sampler
+    if not MEMORY_DIAG_ENABLED:
+        return
+    if MEMORY_TRACE_AT_STARTUP:
+        start_tracing()
+    if _sampler is None:
+        _sampler = threading.Thread(target=_run_sampler, name="memory-gauges", daemon=True)
+        _sampler.start()
+
+
+def status() -> dict:
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+        "route_sample_rate": MEMORY_ROUTE_SAMPLE_RATE,
+        "gauges": dict(_gauges),
+        "snapshots": snapshots(),
+        "routes": route_stats(),
+    }
+
+
+def metrics_lines() -> list[str]:
+    """Prometheus text exposition lines from the last periodic sample."""
+    if not MEMORY_DIAG_ENABLED or not _gauges:
+        return []
+    gauges = _gauges
+    lines = [
+        "# TYPE qbc_process_rss_bytes gauge",
+        f"qbc_process_rss_bytes {gauges['rss_bytes']}",
+        "# TYPE qbc_gc_pending_objects gauge",
+        "# TYPE qbc_gc_collections_total counter",
+        "# TYPE qbc_gc_uncollectable_total counter",
+    ]
+    for gen, (pending, collections, uncollectable) in enumerate(
+        zip(gauges["gc_pending"], gauges["gc_collections"], gauges["gc_uncollectable"])
+    ):
+        lines.append(f'qbc_gc_pending_objects{{generation="{gen}"}} {pending}')
+        lines.append(f'qbc_gc_collections_total{{generation="{gen}"}} {collections}')
+        lines.append(f'qbc_gc_uncollectable_total{{generation="{gen}"}} {uncollectable}')
+    if gauges["traced_bytes"] is not None:
+        current, peak = gauges["traced_bytes"]
+        lines += [
+            "# TYPE qbc_tracemalloc_bytes gauge",
+            f'qbc_tracemalloc_bytes{{kind="current"}} {current}',
+            f'qbc_tracemalloc_bytes{{kind="peak"}} {peak}',
+        ]
+    if gauges["watches"]:
+        lines.append("# TYPE qbc_memory_watch_size gauge")
+        for name, size in gauges["watches"].items():
+            lines.append(f'qbc_memory_watch_size{{name="{name}"}} {size}')
+    routes = route_stats()
+    if routes:
+        lines.append("# TYPE qbc_route_net_alloc_bytes_total counter")
+        lines.append("# TYPE qbc_route_alloc_samples_total counter")
+        for row in routes:
+            label = f'route="{row["route"]}"'
+            lines.append(f"qbc_route_net_alloc_bytes_total{{{label}}} {row['net_bytes']}")
+            lines.append(f"qbc_route_alloc_samples_total{{{label}}} {row['samples']}")
+    return lines
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Inspect tracemalloc snapshots written by /admin/memory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("top", help="largest allocation sites in one snapshot file")
+    p.add_argument("snapshot")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--group-by", choices=GROUP_BY, default="lineno")
+    p = sub.add_parser("diff", help="allocation sites that grew between two snapshot files")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--group-by", choices=GROUP_BY, default="lineno")
+    args = parser.parse_args(argv)
+    if args.command == "top":
+        for row in top_stats(tracemalloc.Snapshot.load(args.snapshot), args.limit, args.group_by):
+            print(f"{row['size_bytes'] / 1024:10.1f} KiB  {row['count']:8d}  {' <- '.join(row['where'])}")
+    else:
+        old, new = tracemalloc.Snapshot.load(args.old), tracemalloc.Snapshot.load(args.new)
+        for row in diff_stats(old, new, args.limit, args.group_by):
+            print(
+                f"{row['size_diff_bytes'] / 1024:+10.1f} KiB  {row['count_diff']:+8d}  "
+                f"{' <- '.join(row['where'])}"
+            )
+
+
+if __name__ == "__main__":
+    main()
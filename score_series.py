@@ -0,0 +1,282 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from db import HealthScoreHistory, ScoreRollup
+import shards
+
+# Raw scores stay queryable for a week, then roll down hour -> day -> week.
+RAW_RETENTION = timedelta(days=int(os.getenv("SCORE_RAW_RETENTION_DAYS", "7")))
+HOURLY_RETENTION = timedelta(days=int(os.getenv("SCORE_HOURLY_RETENTION_DAYS", "30")))
+DAILY_RETENTION = timedelta(days=int(os.getenv("SCORE_DAILY_RETENTION_DAYS", "365")))
+DEFAULT_MAX_POINTS = 120
+MAX_POINTS_LIMIT = 500
+
+BUCKET_WIDTH = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(days=7),
+}
+
+
+def bucket_start(ts: datetime, resolution: str) -> datetime:
+    if resolution == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def _accumulate(groups: dict, bucket: datetime, count: int, lo: int, hi: int, total: int):
+    acc = groups.get(bucket)
+    if acc is None:
+        groups[bucket] = [count, lo, hi, total]
+        return
+    acc[0] += count
+    acc[1] = min(acc[1], lo)
+    acc[2] = max(acc[2], hi)
+    acc[3] += total
+
+
+def _merge_into(session: Session, user_id: int, resolution: str, groups: dict):
+    if not groups:
+        return
+    existing = session.exec(
+        select(ScoreRollup)
+        .where(ScoreRollup.user_id == user_id)
+        .where(ScoreRollup.resolution == resolution)
+        .where(ScoreRollup.bucket_start.in_(list(groups)))
+    ).all()
+    by_bucket = {row.bucket_start: row for row in existing}
+    for bucket, (count, lo, hi, total) in groups.items():
+        row = by_bucket.get(bucket)
+        if row is None:
+            row = ScoreRollup(
+                user_id=user_id,
+                resolution=resolution,
+                bucket_start=bucket,
+                count=count,
+                score_min=lo,
+                score_max=hi,
+                score_sum=total,
+            )
+        else:
+            row.count += count
+            row.score_min = min(row.score_min, lo)
+            row.score_max = max(row.score_max, hi)
+            row.score_sum += total
+        session.add(row)
+
+
+def compact_user_scores(session: Session, user_id: int, now: datetime | None = None) -> int:
+    """Roll aged-out scores into coarser buckets. Returns the number of rows folded."""
+    now = now or datetime.utcnow()
+    latest_id = session.exec(
+        select(HealthScoreHistory.id)
+        .where(HealthScoreHistory.user_id == user_id)
+        .order_by(HealthScoreHistory.created_at.desc())
+        .limit(1)
+    ).first()
+    if latest_id is None:
+        return 0
+
+    # The newest raw row is always kept: the dashboard reads it as "last score".
+    raw = session.exec(
+        select(HealthScoreHistory)
+        .where(HealthScoreHistory.user_id == user_id)
+        .where(HealthScoreHistory.created_at < now - RAW_RETENTION)
+        .where(HealthScoreHistory.id != latest_id)
+    ).all()
+    groups = {}
+    for row in raw:
+        _accumulate(groups, bucket_start(row.created_at, "hour"), 1, row.score, row.score, row.score)
+        session.delete(row)
+    _merge_into(session, user_id, "hour", groups)
+    folded = len(raw)
+
+    for source, target, retention in (("hour", "day", HOURLY_RETENTION), ("day", "week", DAILY_RETENTION)):
+        rows = session.exec(
+            select(ScoreRollup)
+            .where(ScoreRollup.user_id == user_id)
+            .where(ScoreRollup.resolution == source)
+            .where(ScoreRollup.bucket_start < now - retention)
+        ).all()
+        groups = {}
+        for row in rows:
+            _accumulate(groups, bucket_start(row.bucket_start, target), row.count, row.score_min, row.score_max, row.score_sum)
+            session.delete(row)
+        _merge_into(session, user_id, target, groups)
+        folded += len(rows)
+    return folded
+
+
+def lttb(points: list, threshold: int, x, y) -> list:
+    """Largest-Triangle-Three-Buckets downsampling; keeps first and last points."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        if avg_start >= avg_end:
+            avg_start = avg_end - 1
+        span = avg_end - avg_start
+        avg_x = sum(x(points[j]) for j in range(avg_start, avg_end)) / span
+        avg_y = sum(y(points[j]) for j in range(avg_start, avg_end)) / span
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = x(points[a]), y(points[a])
+        chosen = range_start
+        max_area = -1.0
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        sampled.append(points[chosen])
+        a = chosen
+    sampled.append(points[-1])
+    return sampled
+
+
+def score_series(
+    session: Session,
+    user_id: int,
+    start: datetime,
+    end: datetime,
+    max_points: int = DEFAULT_MAX_POINTS,
+) -> list[dict]:
+    max_points = max(3, min(MAX_POINTS_LIMIT, int(max_points)))
+    points = []
+
+    rollups = session.exec(
+        select(ScoreRollup)
+        .where(ScoreRollup.user_id == user_id)
+        .where(ScoreRollup.bucket_start >= start - BUCKET_WIDTH["week"])
+        .where(ScoreRollup.bucket_start <= end)
+    ).all()
+    for row in rollups:
+        if row.bucket_start + BUCKET_WIDTH[row.resolution] <= start:
+            continue
+        points.append(
+            {
+                "t": row.bucket_start,
+                "mean": round(row.score_sum / max(1, row.count), 2),
+                "min": row.score_min,
+                "max": row.score_max,
+                "n": row.count,
+                "resolution": row.resolution,
+            }
+        )
+
+    raw = session.exec(
+        select(HealthScoreHistory.created_at, HealthScoreHistory.score)
+        .where(HealthScoreHistory.user_id == user_id)
+        .where(HealthScoreHistory.created_at >= start)
+        .where(HealthScoreHistory.created_at <= end)
+    ).all()
+    for created_at, score in raw:
+        points.append({"t": created_at, "mean": float(score), "min": score, "max": score, "n": 1, "resolution": "raw"})
+
+    points.sort(key=lambda p: p["t"])
+    points = lttb(points, max_points, x=lambda p: p["t"].timestamp(), y=lambda p: p["mean"])
+    for p in points:
+        p["t"] = p["t"].isoformat()
+    return points
+
+
+def _final_bucket(ts: datetime, now: datetime) -> tuple[str, datetime]:
+    """Where compact_user_scores ends up putting an aged-out raw score: hour, then day, then week."""
+    bucket = bucket_start(ts, "hour")
+    if bucket >= now - HOURLY_RETENTION:
+        return "hour", bucket
+    bucket = bucket_start(bucket, "day")
+    if bucket >= now - DAILY_RETENTION:
+        return "day", bucket
+    return "week", bucket_start(bucket, "week")
+
+
+def compact_database(conn, now: datetime | None = None) -> int:
+    """compact_user_scores for every user in one database, in one set-based pass.
+
+    For offline rebuilds (event log replay) and the nightly job, where the per-user
+    ORM loop costs milliseconds a user. Runs in the caller's transaction.
+    """
+    now = now or datetime.utcnow()
+    scores = HealthScoreHistory.__table__
+    rollups = ScoreRollup.__table__
+    ranked = select(
+        scores.c.id,
+        func.row_number()
+        .over(partition_by=scores.c.user_id, order_by=(scores.c.created_at.desc(), scores.c.id.desc()))
+        .label("rn"),
+    ).subquery()
+    # The newest raw row is always kept: the dashboard reads it as "last score".
+    latest = select(ranked.c.id).where(ranked.c.rn == 1)
+    aged = (scores.c.created_at < now - RAW_RETENTION) & scores.c.id.not_in(latest)
+
+    groups = {}
+    folded = 0
+    for user_id, score, created_at in conn.execute(select(scores.c.user_id, scores.c.score, scores.c.created_at).where(aged)):
+        resolution, bucket = _final_bucket(created_at, now)
+        _accumulate(groups, (user_id, resolution, bucket), 1, score, score, score)
+        folded += 1
+    conn.execute(delete(scores).where(aged))
+
+    # Rollups that have since aged past their own retention move down too.
+    stale = (
+        ((rollups.c.resolution == "hour") & (rollups.c.bucket_start < now - HOURLY_RETENTION))
+        | ((rollups.c.resolution == "day") & (rollups.c.bucket_start < now - DAILY_RETENTION))
+    )
+    for user_id, resolution, bucket, count, lo, hi, total in conn.execute(
+        select(rollups.c.user_id, rollups.c.resolution, rollups.c.bucket_start, rollups.c.count,
+               rollups.c.score_min, rollups.c.score_max, rollups.c.score_sum).where(stale)
+    ):
+        target = "day" if resolution == "hour" else "week"
+        bucket = bucket_start(bucket, target)
+        if target == "day" and bucket < now - DAILY_RETENTION:
+            target, bucket = "week", bucket_start(bucket, "week")
+        _accumulate(groups, (user_id, target, bucket), count, lo, hi, total)
+        folded += 1
+    conn.execute(delete(rollups).where(stale))
+
+    if groups:
+        rows = [
+            {"user_id": user_id, "resolution": resolution, "bucket_start": bucket,
+             "count": count, "score_min": lo, "score_max": hi, "score_sum": total}
+            for (user_id, resolution, bucket), (count, lo, hi, total) in groups.items()
+        ]
+        stmt = sqlite_insert(rollups)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[rollups.c.user_id, rollups.c.resolution, rollups.c.bucket_start],
+            set_={
+                "count": rollups.c.count + stmt.excluded.count,
+                "score_min": func.min(rollups.c.score_min, stmt.excluded.score_min),
+                "score_max": func.max(rollups.c.score_max, stmt.excluded.score_max),
+                "score_sum": rollups.c.score_sum + stmt.excluded.score_sum,
+            },
+        )
+        for i in range(0, len(rows), 10_000):
+            conn.execute(stmt, rows[i:i + 10_000])
+    return folded
+
+
+def compact_all(now: datetime | None = None) -> int:
+    folded = 0
+    for eng in shards.all_engines():
+        with eng.begin() as conn:
+            folded += compact_database(conn, now=now)
+    return folded
+
+
+if __name__ == "__main__":
+    print(f"Folded {compact_all()} score rows")
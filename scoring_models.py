@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+# name@version of the model new scores use; switching it leaves old memo entries to age out.
+SCORING_MODEL = os.getenv("SCORING_MODEL", "baseline@1")
+# Optional JSON list of extra models, read once at import.
+SCORING_MODELS_FILE = os.getenv("SCORING_MODELS_FILE", "")
+SCORE_MEMO_SIZE = int(os.getenv("SCORE_MEMO_SIZE", "4096"))
+
+
+@dataclass(frozen=True)
+class ScoringModel:
+    name: str
+    version: int
+    weights: dict = field(default_factory=lambda: {
+        "stability": 0.2,
+        "acceleration": 0.18,
+        "buffer": 0.18,
+        "affordability": 0.14,
+        "goal_alignment": 0.12,
+        "consistency": 0.1,
+        "shock": 0.08,
+    })
+    # How much a caution check counts towards goal alignment, next to ok (1) and danger (0).
+    caution_credit: float = 0.5
+    empty_score: int = 62
+    # Trend compares the newest `trend_window` checks with the ones before them.
+    trend_window: int = 5
+    # (minimum score, risk, label), best first.
+    bands: tuple = ((75, "low", "Steady"), (55, "moderate", "Building"), (0, "high", "Alert"))
+    # Breakdown values below these explain the score, in this order.
+    reasons: tuple = (
+        ("cushion", 40, "Low cushion ratio"),
+        ("affordability", 45, "Fixed expenses are heavy"),
+        ("runway", 45, "Short runway vs days left"),
+        ("acceleration", 45, "High drift acceleration"),
+        ("consistency", 50, "Irregular budget pattern"),
+        ("drift_baseline", 60, "Overspending is a long-run habit"),
+    )
+    steps: tuple = (
+        ("cushion", 45, "Add a small buffer transfer this week."),
+        ("acceleration", 50, "Set a 48‑hour soft cap to reduce drift."),
+        ("consistency", 55, "Pick a single weekly pace and stick to it."),
+        ("affordability", 45, "Review fixed costs for a quick trim."),
+    )
+    drivers: int = 3
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+    def band(self, score: int) -> tuple:
+        for minimum, risk, label in self.bands:
+            if score >= minimum:
+                return risk, label
+        return self.bands[-1][1:]
+
+
+def client_config(model: ScoringModel) -> dict:
+    """The parts of `model` quickCheckEngine.js scores with; rendered into the quick check page."""
+    return {
+        "key": model.key,
+        "weights": model.weights,
+        "caution_credit": model.caution_credit,
+        "empty_score": model.empty_score,
+        "trend_window": model.trend_window,
+        "bands": [[minimum, risk] for minimum, risk, _label in model.bands],
+    }
+
+
+_registry: dict[str, ScoringModel] = {}
+
+
+def register(model: ScoringModel) -> ScoringModel:
+    if abs(sum(model.weights.values()) - 1.0) > 1e-6:
+        raise ValueError(f"{model.key}: weights must add up to 1.")
+    _registry[model.key] = model
+    return model
+
+
+def _from_json(data: dict) -> ScoringModel:
+    data = dict(data)
+    for name in ("bands", "reasons", "steps"):
+        if name in data:
+            data[name] = tuple(tuple(item) for item in data[name])
+    return ScoringModel(**data)
+
+
+def load_models(path: str) -> list[ScoringModel]:
+    with open(path, encoding="utf-8") as fh:
+        return [register(_from_json(item)) for item in json.load(fh)]
+
+
+def get_model(key: str | None = None) -> ScoringModel:
+    key = key or SCORING_MODEL
+    try:
+        return _registry[key]
+    except KeyError:
+        raise KeyError(f"Unknown scoring model {key!r}; known: {', '.join(sorted(_registry))}") from None
+
+
+def models() -> list[ScoringModel]:
+    return sorted(_registry.values(), key=lambda m: (m.name, m.version))
+
+
+register(ScoringModel("baseline", 1))
+if SCORING_MODELS_FILE:
+    load_models(SCORING_MODELS_FILE)
+
+
+# Memo
+
+_STATUS = {"ok": 0, "caution": 1}
+_ROW = struct.Struct("<Bddddd")
+_NAN = float("nan")
+
+
+def _num(value) -> float:
+    return _NAN if value is None else float(value)
+
+
+def fingerprint(history) -> bytes:
+    """Digest of exactly the fields scoring reads; None stays distinct from zero."""
+    digest = hashlib.blake2b(digest_size=16)
+    for h in history:
+        digest.update(_ROW.pack(
+            _STATUS.get(h.status, 2),
+            _num(h.net_income),
+            _num(h.fixed_expenses),
+            _num(h.today_expense),
+            _num(h.daily_budget),
+            _num(h.days_left),
+        ))
+    return digest.digest()
+
+
+class ScoreMemo:
+    """Bounded LRU of (model key, history fingerprint) -> (score, meta)."""
+
+    def __init__(self, size: int = SCORE_MEMO_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, model: ScoringModel, history, compute):
+        if self.size <= 0:
+            return compute(history, model)
+        key = (model.key, fingerprint(history))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+        result = compute(history, model)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+memo = ScoreMemo()
+
+
+def metrics_lines() -> list[str]:
+    return [
+        "# TYPE qbc_score_memo_entries gauge",
+        f"qbc_score_memo_entries {len(memo)}",
+        "# TYPE qbc_score_memo_lookups_total counter",
+        f'qbc_score_memo_lookups_total{{result="hit"}} {memo.hits}',
+        f'qbc_score_memo_lookups_total{{result="miss"}} {memo.misses}',
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Registered health-score models.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="every registered model; * marks SCORING_MODEL")
+    p = sub.add_parser("show", help="one model's weights and thresholds as JSON")
+    p.add_argument("model", nargs="?", default=None, help="name@version (default SCORING_MODEL)")
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for model in models():
+            print(f"{'*' if model.key == SCORING_MODEL else ' '} {model.key}")
+    else:
+        print(json.dumps(asdict(get_model(args.model)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
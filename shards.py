@@ -0,0 +1,303 @@
+import argparse
+import os
+import threading
+
+from sqlalchemy import delete, event, func, insert, select, union
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import db
+from db import (
+    engine,
+    async_engine,
+    AlertOutbox,
+    AlertRule,
+    CheckArchive,
+    CheckHistory,
+    DailyCheckRollup,
+    DashboardSnapshot,
+    Goal,
+    GoalContribution,
+    HealthScoreHistory,
+    ReplayCheckpoint,
+    ScoreRollup,
+    SpendStats,
+    UserStreak,
+    WalletLedger,
+)
+
+# 0 keeps everything in app.db. Changing it needs `python -m shards rebalance` first.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_DIR = os.getenv("SHARD_DIR", "shards")
+
+# Per-user tables, parents before children. User, Profile and billing stay in app.db.
+USER_MODELS = (
+    CheckHistory,
+    HealthScoreHistory,
+    ScoreRollup,
+    CheckArchive,
+    DashboardSnapshot,
+    UserStreak,
+    SpendStats,
+    WalletLedger,
+    AlertRule,
+    AlertOutbox,
+    Goal,
+    GoalContribution,
+)
+# Fleet rollups are partial per shard; analytics adds them up. Replay checkpoints are per shard.
+SHARDED_MODELS = USER_MODELS + (DailyCheckRollup, ReplayCheckpoint)
+# Foreign keys to re-point when rows get new ids on another shard.
+_PARENT_KEYS = {AlertOutbox: ("rule_id", AlertRule), GoalContribution: ("goal_id", Goal)}
+
+_engines = {}
+_async_engines = {}
+_engine_hooks = []
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return SHARD_COUNT > 0
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash: growing from n to m buckets moves ~(m-n)/m of keys."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_for(user_id: int, count: int | None = None) -> int:
+    return jump_hash(int(user_id), count if count is not None else SHARD_COUNT)
+
+
+def shard_path(index: int, directory: str | None = None) -> str:
+    return os.path.join(directory or SHARD_DIR, f"shard-{index:02d}.db")
+
+
+def _set_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    # WAL lets readers run alongside this shard's single writer.
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.close()
+
+
+def make_engine(path: str):
+    eng = create_engine(f"sqlite:///{path}", echo=False, connect_args={"timeout": 30})
+    event.listen(eng, "connect", _set_pragmas)
+    return eng
+
+
+def add_engine_hook(hook):
+    """Run `hook(sync_engine)` on every shard engine, including ones created later."""
+    with _lock:
+        _engine_hooks.append(hook)
+        existing = list(_engines.values()) + [e.sync_engine for e in _async_engines.values()]
+    for eng in existing:
+        hook(eng)
+
+
+def shard_engine(index: int):
+    with _lock:
+        eng = _engines.get(index)
+        if eng is None:
+            eng = _engines[index] = make_engine(shard_path(index))
+            for hook in _engine_hooks:
+                hook(eng)
+        return eng
+
+
+def async_shard_engine(index: int):
+    with _lock:
+        eng = _async_engines.get(index)
+        if eng is None:
+            eng = create_async_engine(f"sqlite+aiosqlite:///{shard_path(index)}", echo=False, connect_args={"timeout": 30})
+            event.listen(eng.sync_engine, "connect", _set_pragmas)
+            _async_engines[index] = eng
+            for hook in _engine_hooks:
+                hook(eng.sync_engine)
+        return eng
+
+
+def engine_for(user_id: int):
+    return shard_engine(shard_for(user_id)) if enabled() else engine
+
+
+def async_engine_for(user_id: int):
+    return async_shard_engine(shard_for(user_id)) if enabled() else async_engine
+
+
+def all_engines() -> list:
+    return [shard_engine(i) for i in range(SHARD_COUNT)] if enabled() else [engine]
+
+
+def user_session(user_id: int) -> Session:
+    """A session whose per-user tables live on this user's shard; other tables use app.db.
+
+    Writes that span both commit one database after the other, not atomically.
+    """
+    if not enabled():
+        return Session(engine)
+    shard = engine_for(user_id)
+    return Session(engine, binds={model: shard for model in SHARDED_MODELS})
+
+
+def async_user_session(user_id: int) -> AsyncSession:
+    if not enabled():
+        return AsyncSession(async_engine)
+    shard = async_engine_for(user_id)
+    return AsyncSession(async_engine, binds={model: shard for model in SHARDED_MODELS})
+
+
+def connection_for(session: Session):
+    """The session's connection to the database holding check history, for Core reads."""
+    return session.connection(bind_arguments={"mapper": CheckHistory})
+
+
+def user_ids(model=CheckHistory) -> list[int]:
+    """Distinct user ids with rows in `model`, across every shard."""
+    found = set()
+    for eng in all_engines():
+        with eng.connect() as conn:
+            found.update(conn.execute(select(model.user_id).distinct()).scalars())
+    return sorted(found)
+
+
+def migrate(bind):
+    """Bring one shard's schema up to date; the same steps init_db runs on app.db."""
+    SQLModel.metadata.create_all(bind, tables=[model.__table__ for model in SHARDED_MODELS])
+    db._ensure_columns(bind.url.database)
+    db._ensure_indexes(bind)
+
+
+def init_shards() -> int:
+    if not enabled():
+        return 0
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    for eng in all_engines():
+        migrate(eng)
+    return SHARD_COUNT
+
+
+def _users_on(eng) -> list[int]:
+    with eng.connect() as conn:
+        query = union(*(select(model.user_id) for model in USER_MODELS))
+        return sorted(conn.execute(query).scalars())
+
+
+def move_user(user_id: int, source, target) -> int:
+    """Copy one user's rows to `target`, then delete them from `source`.
+
+    Safe to re-run after an interruption: the target copy is replaced each time.
+    """
+    with source.connect() as src:
+        rows_by_model = {
+            model: [dict(row) for row in src.execute(select(model.__table__).where(model.__table__.c.user_id == user_id)).mappings()]
+            for model in USER_MODELS
+        }
+    moved = sum(len(rows) for rows in rows_by_model.values())
+    if not moved:
+        return 0
+
+    with target.begin() as dst:
+        for model in reversed(USER_MODELS):
+            dst.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+        new_ids = {}
+        for model, rows in rows_by_model.items():
+            if not rows:
+                continue
+            table = model.__table__
+            parent_key = _PARENT_KEYS.get(model)
+            if parent_key:
+                column, parent = parent_key
+                parent_ids = new_ids.get(parent, {})
+                for row in rows:
+                    row[column] = parent_ids[row[column]]
+            if model in (AlertRule, Goal):
+                # Children point at these ids, so note where each row lands.
+                ids = new_ids[model] = {}
+                for row in rows:
+                    old_id = row.pop("id")
+                    ids[old_id] = dst.execute(insert(table).values(**row)).inserted_primary_key[0]
+            else:
+                if "id" in table.c:
+                    for row in rows:
+                        row.pop("id")
+                dst.execute(insert(table), rows)
+    with source.begin() as conn:
+        for model in reversed(USER_MODELS):
+            conn.execute(delete(model.__table__).where(model.__table__.c.user_id == user_id))
+    return moved
+
+
+def _engines_for_count(count: int) -> list:
+    if count <= 0:
+        return [engine]
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    engines = [shard_engine(i) for i in range(count)]
+    for eng in engines:
+        migrate(eng)
+    return engines
+
+
+def rebalance(old_count: int, new_count: int, log=print) -> int:
+    """Move every user whose shard differs between the two counts; run with the app stopped."""
+    sources = _engines_for_count(old_count)
+    targets = _engines_for_count(new_count)
+    users = 0
+    for source in sources:
+        for user_id in _users_on(source):
+            target = targets[shard_for(user_id, new_count)] if new_count > 0 else engine
+            if target is source:
+                continue
+            rows = move_user(user_id, source, target)
+            users += 1
+            log(f"user {user_id}: {rows} rows -> {target.url.database}")
+    # Rollups are per-database partial sums; analytics rebuilds them from the checks.
+    # Replay checkpoints no longer describe what each database holds.
+    for eng in set(sources) | set(targets):
+        with eng.begin() as conn:
+            conn.execute(delete(DailyCheckRollup.__table__))
+            conn.execute(delete(ReplayCheckpoint.__table__))
+    return users
+
+
+def stats() -> list[dict]:
+    rows = []
+    for index, eng in enumerate(all_engines()):
+        with eng.connect() as conn:
+            rows.append({
+                "shard": index if enabled() else None,
+                "path": eng.url.database,
+                "users": len(_users_on(eng)),
+                "checks": conn.execute(select(func.count()).select_from(CheckHistory.__table__)).scalar(),
+            })
+    return rows
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Per-user SQLite shards for check history and derived state.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="create or migrate every shard for SHARD_COUNT")
+    p = sub.add_parser("rebalance", help="move users between shard layouts (0 means app.db)")
+    p.add_argument("--from", dest="old", type=int, required=True, help="shard count the data is laid out for now")
+    p.add_argument("--to", dest="new", type=int, default=SHARD_COUNT, help="target shard count (default SHARD_COUNT)")
+    sub.add_parser("stats", help="users and checks per shard")
+    args = parser.parse_args(argv)
+    if args.command == "init":
+        print(f"Migrated {init_shards()} shards in {SHARD_DIR}")
+    elif args.command == "rebalance":
+        print(f"Moved {rebalance(args.old, args.new)} users; now set SHARD_COUNT={args.new}")
+    else:
+        for row in stats():
+            print(f"{row['path']}: {row['users']} users, {row['checks']} checks")
+
+
+if __name__ == "__main__":
+    main()
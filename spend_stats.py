@@ -0,0 +1,139 @@
+import argparse
+import math
+import os
+from datetime import datetime
+
+from sqlmodel import Session
+
+from dashboard_snapshot import invalidate_snapshot
+from db import SpendStats, insert_or_ignore
+import shards
+from history_archive import iter_user_checks
+
+SPEND_EWMA_ALPHA = float(os.getenv("SPEND_EWMA_ALPHA", "0.2"))
+ANOMALY_Z = float(os.getenv("SPEND_ANOMALY_Z", "3.0"))
+# No verdicts until we know what normal looks like for this user.
+ANOMALY_MIN_CHECKS = 5
+# Floors so a perfectly regular user doesn't turn every cent into a huge z-score.
+SPEND_STD_FLOOR = 0.1
+DRIFT_STD_FLOOR = 0.05
+
+
+def _sample_std(n: int, m2: float) -> float:
+    return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+
+def observe(stats: SpendStats, today: float, budget: float):
+    """Fold one check into the running statistics in O(1).
+
+    The check is scored against the user's statistics *before* it is added.
+    """
+    spend = float(today or 0)
+    drift = (spend - budget) / budget if budget and budget > 0 else None
+
+    z = 0.0
+    if stats.spend_n >= ANOMALY_MIN_CHECKS:
+        spend_std = max(_sample_std(stats.spend_n, stats.spend_m2), SPEND_STD_FLOOR * abs(stats.spend_mean), 1.0)
+        z = (spend - stats.spend_mean) / spend_std
+    if drift is not None and stats.drift_n >= ANOMALY_MIN_CHECKS:
+        drift_std = max(math.sqrt(stats.drift_ewvar), DRIFT_STD_FLOOR)
+        z = max(z, (drift - stats.drift_ewma) / drift_std)
+    # Only unusually high spend is an anomaly; a frugal day is not.
+    stats.last_z = z
+    stats.last_anomaly = z > ANOMALY_Z
+    if stats.last_anomaly:
+        stats.anomalies += 1
+
+    alpha = SPEND_EWMA_ALPHA
+    stats.spend_n += 1
+    delta = spend - stats.spend_mean
+    stats.spend_mean += delta / stats.spend_n
+    stats.spend_m2 += delta * (spend - stats.spend_mean)
+    stats.spend_ewma = spend if stats.spend_n == 1 else stats.spend_ewma + alpha * (spend - stats.spend_ewma)
+
+    if drift is not None:
+        stats.drift_n += 1
+        delta = drift - stats.drift_mean
+        stats.drift_mean += delta / stats.drift_n
+        stats.drift_m2 += delta * (drift - stats.drift_mean)
+        if stats.drift_n == 1:
+            stats.drift_ewma = drift
+        else:
+            diff = drift - stats.drift_ewma
+            step = alpha * diff
+            stats.drift_ewma += step
+            stats.drift_ewvar = (1 - alpha) * (stats.drift_ewvar + diff * step)
+    stats.updated_at = datetime.utcnow()
+
+
+def rebuild_spend_stats(session: Session, user_id: int) -> SpendStats:
+    fresh = SpendStats(user_id=user_id)
+    checks = [(h.today_expense, h.daily_budget) for h in iter_user_checks(session, user_id)]
+    for today, budget in reversed(checks):
+        observe(fresh, today, budget)
+    stats = session.get(SpendStats, user_id)
+    if stats is None:
+        stats = fresh
+    else:
+        for name in SpendStats.model_fields:
+            setattr(stats, name, getattr(fresh, name))
+    session.add(stats)
+    return stats
+
+
+def record_check_spend(session: Session, user_id: int, today: float, budget: float) -> SpendStats:
+    """O(1) update for a freshly inserted (and flushed) check."""
+    stats = session.get(SpendStats, user_id)
+    if stats is None:
+        if insert_or_ignore(session, SpendStats(user_id=user_id)):
+            # First time we see this user: backfill, which already includes this check.
+            return rebuild_spend_stats(session, user_id)
+        # Another transaction created the row first; its backfill could not see this check.
+        stats = session.get(SpendStats, user_id)
+    observe(stats, today, budget)
+    session.add(stats)
+    return stats
+
+
+def spend_view(stats: SpendStats) -> dict:
+    return {
+        "checks": stats.spend_n,
+        "spend_mean": round(stats.spend_mean, 2),
+        "spend_std": round(_sample_std(stats.spend_n, stats.spend_m2), 2),
+        "spend_ewma": round(stats.spend_ewma, 2),
+        "drift_mean": round(stats.drift_mean, 4),
+        "drift_std": round(_sample_std(stats.drift_n, stats.drift_m2), 4),
+        "drift_ewma": round(stats.drift_ewma, 4),
+        "anomaly": stats.last_anomaly,
+        "z": round(stats.last_z, 2),
+        "anomalies": stats.anomalies,
+    }
+
+
+def get_spend_stats(session: Session, user_id: int) -> dict | None:
+    stats = session.get(SpendStats, user_id)
+    return spend_view(stats) if stats is not None and stats.spend_n else None
+
+
+def rebuild_all(user_id: int | None = None) -> int:
+    user_ids = [user_id] if user_id is not None else shards.user_ids()
+    for uid in user_ids:
+        with shards.user_session(uid) as session:
+            rebuild_spend_stats(session, uid)
+            invalidate_snapshot(session, uid)
+            session.commit()
+    return len(user_ids)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Maintain per-user online spend statistics.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute statistics from the full check history")
+    rebuild.add_argument("--user", type=int, default=None, help="only this user id")
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        print(f"Rebuilt spend statistics for {rebuild_all(args.user)} users")
+
+
+if __name__ == "__main__":
+    main()
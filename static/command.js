@@ -62,6 +62,7 @@ const updateFilter = (value) => {
 };
 
 document.addEventListener("keydown", (e) => {
+  if (!commandOverlay) return;
   if ((e.ctrlKey || e.metaKey) && e.key.toLowerCase() === "k") {
     e.preventDefault();
     openCommand();
@@ -10,22 +10,63 @@ const appendMsg = (text, cls = "") => {
   div.textContent = text;
   thread.appendChild(div);
   thread.scrollTop = thread.scrollHeight;
+  return div;
+};
+
+// Parses "event:"/"data:" frames from the /companion/stream body as they arrive.
+const readEvents = async (res, onEvent) => {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf("\n\n")) >= 0) {
+      const frame = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = "message";
+      let data = "";
+      frame.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      onEvent(event, data ? JSON.parse(data) : {});
+    }
+  }
 };
 
 const sendMessage = async (text) => {
   if (!text) return;
   appendMsg(text, "user");
   if (input) input.value = "";
+  let bubble = null;
   try {
     const body = new URLSearchParams({ message: text });
-    const res = await fetch("/companion", {
+    const res = await fetch("/companion/stream", {
       method: "POST",
       headers: { "Content-Type": "application/x-www-form-urlencoded" },
       body,
     });
-    const data = await res.json();
-    appendMsg(data.reply || "I’m here to help.");
+    const type = res.headers.get("Content-Type") || "";
+    if (!res.ok || !res.body || !type.startsWith("text/event-stream")) {
+      const data = await res.json();
+      appendMsg(data.reply || data.error || "I’m here to help.");
+      return;
+    }
+    bubble = appendMsg("", "pending");
+    await readEvents(res, (event, data) => {
+      if (!bubble) return;
+      if (event === "segment") bubble.textContent += data.text;
+      else if (event === "done" || event === "error") {
+        bubble.textContent = data.reply || bubble.textContent;
+        bubble.classList.remove("pending");
+      }
+      if (thread) thread.scrollTop = thread.scrollHeight;
+    });
   } catch {
+    if (bubble) bubble.remove();
     appendMsg("I couldn’t reach the Companion. Try again.");
   }
 };
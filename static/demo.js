@@ -1,18 +1,19 @@
+// Only the inputs are scripted; outcomes come from the shared quick-check engine.
 const stepsByPeriod = {
   monthly: [
-    { income: 3200, fixed: 2100, days: 12, today: 30, status: "OK", budget: 91, msg: "You’re within your expected pace." },
-    { income: 3400, fixed: 2300, days: 14, today: 160, status: "ATTENTION", budget: 78, msg: "This puts serious pressure on your month." },
-    { income: 3100, fixed: 1950, days: 11, today: 95, status: "CAUTION", budget: 105, msg: "You’re a bit above the safe pace." },
+    { income: 3200, fixed: 2100, days: 12, today: 30 },
+    { income: 3400, fixed: 2300, days: 14, today: 160 },
+    { income: 3100, fixed: 1950, days: 11, today: 120 },
   ],
   fortnightly: [
-    { income: 1600, fixed: 1050, days: 10, today: 20, status: "OK", budget: 55, msg: "You’re within your expected pace." },
-    { income: 1700, fixed: 1200, days: 9, today: 95, status: "ATTENTION", budget: 40, msg: "This puts serious pressure on your period." },
-    { income: 1500, fixed: 980, days: 8, today: 60, status: "CAUTION", budget: 58, msg: "You’re a bit above the safe pace." },
+    { income: 1600, fixed: 1050, days: 10, today: 20 },
+    { income: 1700, fixed: 1200, days: 9, today: 95 },
+    { income: 1500, fixed: 980, days: 8, today: 75 },
   ],
   weekly: [
-    { income: 800, fixed: 520, days: 5, today: 15, status: "OK", budget: 53, msg: "You’re within your expected pace." },
-    { income: 820, fixed: 600, days: 4, today: 55, status: "ATTENTION", budget: 35, msg: "This puts serious pressure on your week." },
-    { income: 760, fixed: 480, days: 4, today: 35, status: "CAUTION", budget: 45, msg: "You’re a bit above the safe pace." },
+    { income: 800, fixed: 520, days: 5, today: 15 },
+    { income: 820, fixed: 600, days: 4, today: 80 },
+    { income: 760, fixed: 480, days: 4, today: 80 },
   ],
 };
 
@@ -95,13 +96,14 @@ function render(s){
   if (demoTodayLabel) demoTodayLabel.textContent = p.todayLabel;
   if (demoDaysLabel) demoDaysLabel.textContent = p.daysLabel;
 
-  document.getElementById("d_budget").textContent = `$${s.budget}/day`;
-  document.getElementById("d_msg").textContent    = s.msg;
+  const result = window.QuickCheck.analyse(s.income, s.fixed, s.today, s.days);
+  document.getElementById("d_budget").textContent = `$${Math.round(result.daily_budget)}/day`;
+  document.getElementById("d_msg").textContent    = result.message;
 
   const box = document.getElementById("d_box");
   box.style.borderColor =
-    s.status === "ATTENTION" ? "rgba(255,80,80,.35)" :
-    s.status === "CAUTION" ? "rgba(255,190,80,.35)" :
+    result.status === "danger" ? "rgba(255,80,80,.35)" :
+    result.status === "caution" ? "rgba(255,190,80,.35)" :
     "rgba(80,255,160,.28)";
 }
 
@@ -0,0 +1,35 @@
+(() => {
+  const selectors = "#healthScore, .momentum-aura, .projection-chart, .streak-glow";
+  if (!document.querySelector(selectors)) return;
+
+  const REFRESH_MS = 60000;
+  let etag = null;
+  let cached = null;
+
+  const publish = (data) => {
+    if (!data) return;
+    document.dispatchEvent(new CustomEvent("qbc:dashboard", { detail: data }));
+  };
+
+  const load = async () => {
+    const headers = etag ? { "If-None-Match": etag } : {};
+    try {
+      const res = await fetch("/api/v1/dashboard", { credentials: "same-origin", headers });
+      if (res.status === 304) return null;
+      if (!res.ok) return null;
+      etag = res.headers.get("ETag");
+      cached = await res.json();
+      return cached;
+    } catch {
+      return null;
+    }
+  };
+
+  window.qbcDashboard = () => cached;
+
+  // Revalidation is a 304 with no scoring work until the user's data changes.
+  load().then(publish);
+  setInterval(() => {
+    if (document.visibilityState === "visible") load().then(publish);
+  }, REFRESH_MS);
+})();
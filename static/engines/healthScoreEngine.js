@@ -1,25 +1,35 @@
 (() => {
   const el = document.getElementById("healthScore");
   if (!el) return;
-  const target = parseInt(el.dataset.score || el.textContent || "0", 10);
-  const trend = parseInt(el.dataset.trend || "0", 10);
   const trendEl = document.getElementById("healthTrend");
   let current = 0;
+  let target = 0;
 
   const animate = () => {
-    current = Math.min(target, current + 2);
+    current = current < target ? Math.min(target, current + 2) : Math.max(target, current - 2);
     el.textContent = current;
-    if (current < target) requestAnimationFrame(animate);
+    if (current !== target) requestAnimationFrame(animate);
   };
-  requestAnimationFrame(animate);
 
-  if (trendEl) {
-    trendEl.textContent = `${trend > 0 ? "▲ +" : trend < 0 ? "▼ " : ""}${trend}`;
-  }
+  const render = (score, trend) => {
+    target = score;
+    requestAnimationFrame(animate);
 
-  const ring = el.closest(".score-ring");
-  if (ring) {
-    ring.classList.add("pulse");
-    setTimeout(() => ring.classList.remove("pulse"), 260);
-  }
+    if (trendEl) {
+      trendEl.textContent = `${trend > 0 ? "▲ +" : trend < 0 ? "▼ " : ""}${trend}`;
+    }
+
+    const ring = el.closest(".score-ring");
+    if (ring) {
+      ring.classList.add("pulse");
+      setTimeout(() => ring.classList.remove("pulse"), 260);
+    }
+  };
+
+  render(parseInt(el.dataset.score || el.textContent || "0", 10), parseInt(el.dataset.trend || "0", 10));
+
+  document.addEventListener("qbc:dashboard", (e) => {
+    const { score, trend } = e.detail;
+    if (score !== target) render(score, trend);
+  });
 })();
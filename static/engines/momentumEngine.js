@@ -1,9 +1,15 @@
 (() => {
   const auras = document.querySelectorAll(".momentum-aura");
   if (!auras.length) return;
-  auras.forEach((aura) => {
-    const status = aura.dataset.status || "ok";
-    aura.classList.remove("ok", "caution", "danger");
-    aura.classList.add(status);
-  });
+
+  const apply = (override) => {
+    auras.forEach((aura) => {
+      const status = override || aura.dataset.status || "ok";
+      aura.classList.remove("ok", "caution", "danger");
+      aura.classList.add(status);
+    });
+  };
+
+  apply();
+  document.addEventListener("qbc:dashboard", (e) => apply(e.detail.pace_status));
 })();
@@ -2,7 +2,7 @@
   const chart = document.querySelector(".projection-chart");
   if (!chart) return;
   const bars = Array.from(chart.querySelectorAll("span"));
-  const base = bars.map((b) => parseFloat(b.style.getPropertyValue("--p")) || 55);
+  let base = bars.map((b) => parseFloat(b.style.getPropertyValue("--p")) || 55);
   const income = document.getElementById("projIncome");
   const expense = document.getElementById("projExpense");
 
@@ -18,4 +18,11 @@
 
   if (income) income.addEventListener("input", apply);
   if (expense) expense.addEventListener("input", apply);
+
+  document.addEventListener("qbc:dashboard", (e) => {
+    const points = e.detail.projection && e.detail.projection.points;
+    if (!points) return;
+    base = bars.map((_, i) => points[i] ?? base[i]);
+    apply();
+  });
 })();
@@ -0,0 +1,180 @@
+// Client-side port of analyser_depense and compute_health_score (app.py).
+// Parity with the Python versions is checked against tests/quick_check_vectors.json.
+// The page passes the active scoring model in data-model (scoring_models.client_config);
+// without it the engine scores like baseline@1.
+(() => {
+  const MESSAGES = {
+    ok: "You’re on track.",
+    caution: "You still have funds — just stay mindful.",
+    danger: "Funds are low — careful planning helps here.",
+  };
+
+  let model = {
+    key: "baseline@1",
+    weights: {
+      stability: 0.2,
+      acceleration: 0.18,
+      buffer: 0.18,
+      affordability: 0.14,
+      goal_alignment: 0.12,
+      consistency: 0.1,
+      shock: 0.08,
+    },
+    caution_credit: 0.5,
+    empty_score: 62,
+    trend_window: 5,
+    bands: [[75, "low"], [55, "moderate"], [0, "high"]],
+  };
+
+  const configure = (config) => {
+    model = { ...model, ...config };
+  };
+
+  const band = (score) => {
+    const found = model.bands.find(([minimum]) => score >= minimum);
+    return (found || model.bands[model.bands.length - 1])[1];
+  };
+
+  // Python's round() is round-half-to-even.
+  const pyRound = (x) => {
+    const f = Math.floor(x);
+    const diff = x - f;
+    if (diff > 0.5) return f + 1;
+    if (diff < 0.5) return f;
+    return f % 2 === 0 ? f : f + 1;
+  };
+
+  const clamp = (x, lo, hi) => Math.max(lo, Math.min(hi, x));
+  const sum = (xs) => xs.reduce((a, b) => a + b, 0);
+
+  // Mirrors check_input_error.
+  const inputError = (income, fixed, today, days) => {
+    if (![income, fixed, today, days].every(Number.isFinite)) return "Please check your inputs.";
+    if (income <= 0 || fixed < 0 || today < 0 || days <= 0) return "Please check your inputs.";
+    if (income > 1000000 || fixed > 1000000 || today > 1000000 || days > 365) return "Inputs look out of range.";
+    return null;
+  };
+
+  const analyse = (revenu, fixes, depense, jours) => {
+    const budgetRest = revenu - fixes;
+    const budgetJour = jours > 0 ? budgetRest / jours : 0;
+    let status;
+    if (budgetJour <= 0) status = "danger";
+    else if (depense <= budgetJour) status = "ok";
+    else if (depense <= budgetJour * 1.3) status = "caution";
+    else status = "danger";
+    return { daily_budget: budgetJour, status, message: MESSAGES[status] };
+  };
+
+  // history: newest first, rows shaped like HistoryRecord.
+  const healthScore = (history) => {
+    if (!history.length) return { score: model.empty_score, trend: 0, breakdown: {}, risk: band(model.empty_score) };
+
+    const drifts = [];
+    const cushions = [];
+    const budgets = [];
+    const fixedRatios = [];
+    const runwayRatios = [];
+    let ok = 0;
+    let caution = 0;
+    let danger = 0;
+
+    history.forEach((h) => {
+      const budget = Number(h.daily_budget || 0);
+      budgets.push(budget);
+      if (h.status === "ok") ok += 1;
+      else if (h.status === "caution") caution += 1;
+      else danger += 1;
+
+      const income = Number(h.net_income || 0);
+      const fixed = Number(h.fixed_expenses || 0);
+      if (income > 0) {
+        cushions.push(clamp((income - fixed) / income, 0, 1));
+        fixedRatios.push(clamp(fixed / income, 0, 1));
+      }
+      if (budget && h.today_expense !== null && h.today_expense !== undefined) {
+        if (budget > 0) drifts.push((Number(h.today_expense) - budget) / budget);
+        if (income - fixed > 0 && h.days_left > 0) {
+          const runway = (budget * Number(h.days_left)) / Math.max(1, income - fixed);
+          runwayRatios.push(clamp(runway, 0, 1));
+        }
+      }
+    });
+
+    const total = Math.max(1, ok + caution + danger);
+    const stability = ok / total;
+    const shock = (ok + caution) / total;
+    const avgDrift = sum(drifts.map(Math.abs)) / Math.max(1, drifts.length);
+    const acceleration = Math.max(0, 1 - Math.min(1, avgDrift));
+    const cushion = sum(cushions) / Math.max(1, cushions.length);
+    const fixedRatio = fixedRatios.length ? sum(fixedRatios) / fixedRatios.length : 0;
+    const runwayRatio = runwayRatios.length ? sum(runwayRatios) / runwayRatios.length : cushion;
+
+    let consistency = stability;
+    const mean = sum(budgets) / budgets.length;
+    if (budgets.length > 2 && mean > 0) {
+      const variance = sum(budgets.map((b) => (b - mean) ** 2)) / budgets.length;
+      consistency = Math.max(0, 1 - Math.min(1, Math.sqrt(variance) / mean));
+    }
+
+    const goalAlignment = (ok + caution * model.caution_credit) / total;
+    const affordability = Math.max(0, 1 - fixedRatio);
+    const buffer = clamp((cushion + runwayRatio) / 2, 0, 1);
+
+    const weights = model.weights;
+    const raw = (
+      stability * weights.stability
+      + acceleration * weights.acceleration
+      + buffer * weights.buffer
+      + affordability * weights.affordability
+      + goalAlignment * weights.goal_alignment
+      + consistency * weights.consistency
+      + shock * weights.shock
+    ) * 100;
+    const score = clamp(pyRound(raw), 0, 100);
+
+    const previous = history.slice(model.trend_window, model.trend_window * 2);
+    const trend = previous.length ? score - healthScore(previous).score : 0;
+
+    const pct = (x) => pyRound(x * 100);
+    const breakdown = {
+      stability: pct(stability),
+      acceleration: pct(acceleration),
+      cushion: pct(cushion),
+      buffer: pct(buffer),
+      affordability: pct(affordability),
+      runway: pct(runwayRatio),
+      goal_alignment: pct(goalAlignment),
+      consistency: pct(consistency),
+      shock: pct(shock),
+    };
+    return { score, trend, breakdown, risk: band(score) };
+  };
+
+  // One-check score preview for the anonymous quick check.
+  const preview = (revenu, fixes, depense, jours) => {
+    const result = analyse(revenu, fixes, depense, jours);
+    const row = {
+      status: result.status,
+      net_income: revenu,
+      fixed_expenses: fixes,
+      today_expense: depense,
+      daily_budget: result.daily_budget,
+      days_left: jours,
+    };
+    return { ...result, ...healthScore([row]) };
+  };
+
+  const tag = typeof document !== "undefined" ? document.currentScript : null;
+  if (tag && tag.dataset.model) {
+    try {
+      configure(JSON.parse(tag.dataset.model));
+    } catch {
+      // Keep the baseline model rather than breaking the quick check.
+    }
+  }
+
+  const api = { analyse, healthScore, preview, inputError, configure };
+  if (typeof module !== "undefined" && module.exports) module.exports = api;
+  if (typeof window !== "undefined") window.QuickCheck = api;
+})();
@@ -1,8 +1,16 @@
 (() => {
   const streakGlow = document.querySelector(".streak-glow");
   if (!streakGlow) return;
-  const streak = parseInt(streakGlow.dataset.streak || "0", 10);
-  if (streak >= 3) {
-    streakGlow.classList.add("active");
-  }
+
+  const apply = (streak) => {
+    streakGlow.classList.toggle("active", streak >= 3);
+  };
+
+  apply(parseInt(streakGlow.dataset.streak || "0", 10));
+
+  // Persisted counters are exact for any history length; the data attribute is only a first paint.
+  document.addEventListener("qbc:dashboard", (e) => {
+    const streaks = e.detail.streaks;
+    if (streaks && typeof streaks.stable === "number") apply(streaks.stable);
+  });
 })();
@@ -0,0 +1,97 @@
+import argparse
+from datetime import datetime
+
+from sqlmodel import Session
+
+import shards
+from dashboard_snapshot import invalidate_snapshot
+from db import UserStreak, insert_or_ignore
+from history_archive import iter_user_checks
+
+# Which statuses keep each streak alive.
+STREAK_STATUSES = {
+    "stable": ("ok",),
+    "adjust": ("ok", "caution"),
+    "goal": ("ok",),
+}
+
+
+def advance(streak: UserStreak, status: str):
+    for name, statuses in STREAK_STATUSES.items():
+        current = getattr(streak, f"{name}_current") + 1 if status in statuses else 0
+        setattr(streak, f"{name}_current", current)
+        if current > getattr(streak, f"{name}_best"):
+            setattr(streak, f"{name}_best", current)
+    streak.updated_at = datetime.utcnow()
+
+
+def rebuild_streak(session: Session, user_id: int) -> UserStreak:
+    streak = session.get(UserStreak, user_id) or UserStreak(user_id=user_id)
+    for name in STREAK_STATUSES:
+        setattr(streak, f"{name}_current", 0)
+        setattr(streak, f"{name}_best", 0)
+    statuses = [h.status for h in iter_user_checks(session, user_id)]
+    for status in reversed(statuses):
+        advance(streak, status)
+    streak.updated_at = datetime.utcnow()
+    session.add(streak)
+    return streak
+
+
+def record_check_streak(session: Session, user_id: int, status: str) -> UserStreak:
+    """O(1) update for a freshly inserted (and flushed) check."""
+    streak = session.get(UserStreak, user_id)
+    if streak is None:
+        if insert_or_ignore(session, UserStreak(user_id=user_id)):
+            # First time we see this user: backfill, which already includes this check.
+            return rebuild_streak(session, user_id)
+        # Another transaction created the row first; its backfill could not see this check.
+        streak = session.get(UserStreak, user_id)
+    advance(streak, status)
+    session.add(streak)
+    return streak
+
+
+def streak_view(streak: UserStreak) -> dict:
+    return {
+        "stable": streak.stable_current,
+        "adjust": streak.adjust_current,
+        "goal": streak.goal_current,
+        "best": {
+            "stable": streak.stable_best,
+            "adjust": streak.adjust_best,
+            "goal": streak.goal_best,
+        },
+    }
+
+
+def get_streaks(session: Session, user_id: int) -> dict:
+    streak = session.get(UserStreak, user_id)
+    if streak is None:
+        created = insert_or_ignore(session, UserStreak(user_id=user_id))
+        streak = rebuild_streak(session, user_id) if created else session.get(UserStreak, user_id)
+    return streak_view(streak)
+
+
+def rebuild_all(user_id: int | None = None) -> int:
+    user_ids = [user_id] if user_id is not None else shards.user_ids()
+    for uid in user_ids:
+        with shards.user_session(uid) as session:
+            rebuild_streak(session, uid)
+            invalidate_snapshot(session, uid)
+            session.commit()
+    return len(user_ids)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Maintain persistent streak counters.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute streaks from the full check history")
+    rebuild.add_argument("--user", type=int, default=None, help="only this user id")
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        print(f"Rebuilt streaks for {rebuild_all(args.user)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import threading
+from collections import OrderedDict
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+# Rendered fragments kept per worker; 0 renders every fragment every time.
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+# Compiled templates shared by every worker and kept across restarts; empty turns it off.
+TEMPLATE_BYTECODE_DIR = os.getenv("TEMPLATE_BYTECODE_DIR", ".jinja_cache")
+
+
+class FragmentCache:
+    """Bounded LRU of (template, fragment name, declared inputs) -> rendered markup."""
+
+    def __init__(self, size: int = FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FragmentCacheExtension(Extension):
+    """`{% cache "name", input, ... %}...{% endcache %}` renders the body once per distinct inputs.
+
+    List every variable the body reads as an input; anything left out is frozen
+    at whatever the first render saw.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        inputs = []
+        while parser.stream.skip_if("comma"):
+            inputs.append(parser.parse_expression())
+        args.append(nodes.List(inputs))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template, name, inputs, caller):
+        cache = self.environment.fragment_cache
+        if cache.size <= 0:
+            return caller()
+        key = (template, name, tuple(inputs))
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.put(key, value)
+        return value
+
+
+def install(env: jinja2.Environment, bytecode_dir: str = TEMPLATE_BYTECODE_DIR) -> jinja2.Environment:
+    env.add_extension(FragmentCacheExtension)
+    if bytecode_dir:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        env.bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_dir)
+    return env
+
+
+def warm(env: jinja2.Environment) -> int:
+    """Load every template up front (from bytecode when cached) so no request pays for compiling."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def metrics_lines(env: jinja2.Environment) -> list[str]:
+    cache = env.fragment_cache
+    return [
+        "# TYPE qbc_fragment_cache_entries gauge",
+        f"qbc_fragment_cache_entries {len(cache)}",
+        "# TYPE qbc_fragment_cache_lookups_total counter",
+        f'qbc_fragment_cache_lookups_total{{result="hit"}} {cache.hits}',
+        f'qbc_fragment_cache_lookups_total{{result="miss"}} {cache.misses}',
+    ]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Template bytecode cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("compile", help="compile every template into the bytecode cache, e.g. at deploy")
+    p.add_argument("--templates", default="templates")
+    sub.add_parser("clear", help="drop the bytecode cache")
+    args = parser.parse_args(argv)
+    if not TEMPLATE_BYTECODE_DIR:
+        parser.error("TEMPLATE_BYTECODE_DIR is empty")
+    if args.command == "compile":
+        env = install(jinja2.Environment(loader=jinja2.FileSystemLoader(args.templates), autoescape=True))
+        print(f"Compiled {warm(env)} templates into {TEMPLATE_BYTECODE_DIR}")
+    else:
+        jinja2.FileSystemBytecodeCache(TEMPLATE_BYTECODE_DIR).clear()
+        print(f"Cleared {TEMPLATE_BYTECODE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
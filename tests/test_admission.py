@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from admission import Gate, Overloaded, gate_for
+
+
+def test_only_expensive_routes_are_gated():
+    assert gate_for("POST", "/login").name == "auth"
+    assert gate_for("POST", "/check").name == "write"
+    assert gate_for("GET", "/dashboard") is None
+    assert gate_for("GET", "/pricing") is None
+
+
+def test_gate_queues_then_sheds():
+    gate = Gate("write", limit=1, queue=1, wait_seconds=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with gate.admit():
+            await release.wait()
+
+    async def scenario():
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert gate.in_flight == 1 and gate.waiting == 1
+
+        with pytest.raises(Overloaded) as exc:
+            async with gate.admit():
+                pass
+        assert exc.value.reason == "queue_full" and exc.value.retry_after == 1
+
+        with pytest.raises(Overloaded):
+            await waiter
+        assert gate.shed == {"queue_full": 1, "deadline": 1}
+
+        release.set()
+        await holder
+        async with gate.admit():
+            assert gate.in_flight == 1
+        assert gate.in_flight == 0 and gate.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_middleware_holds_the_permit_until_the_body_is_sent():
+    from starlette.responses import StreamingResponse
+    from starlette.testclient import TestClient
+
+    from admission import GATES, AdmissionMiddleware
+
+    gate = GATES["write"]
+    seen = []
+
+    async def body():
+        for chunk in (b"a", b"b"):
+            seen.append(gate.in_flight)
+            yield chunk
+
+    async def app(scope, receive, send):
+        await StreamingResponse(body())(scope, receive, send)
+
+    client = TestClient(AdmissionMiddleware(app, headers={"X-Frame-Options": "DENY"}))
+    assert client.post("/account/export").content == b"ab"
+    assert seen == [1, 1] and gate.in_flight == 0
+
+    saved = gate.limit, gate.queue
+    gate.limit, gate.queue = 0, 0
+    gate._loop = None
+    try:
+        resp = client.post("/check")
+    finally:
+        gate.limit, gate.queue = saved
+        gate._loop = None
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "2" and resp.headers["x-frame-options"] == "DENY"
+    assert "set-cookie" not in resp.headers
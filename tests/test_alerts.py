@@ -0,0 +1,73 @@
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from alerts import RuleError, add_rule, delete_rule, evaluate_check
+from db import AlertOutbox, AlertRule
+
+
+def test_rules_fire_on_edges_and_rearm():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        add_rule(session, 1, "non_ok_streak", 2)
+        add_rule(session, 1, "drift_above", 25)
+        add_rule(session, 2, "score_below", 90)
+        session.flush()
+
+        # (status, today spend vs a 100/day budget)
+        checks = [("caution", 110), ("danger", 150), ("danger", 160), ("ok", 90), ("caution", 130), ("danger", 140)]
+        fired = [
+            [a.kind for a in evaluate_check(session, 1, status, 3000, 1000, today, 100.0, score=70)]
+            for status, today in checks
+        ]
+        assert fired == [[], ["non_ok_streak", "drift_above"], [], [], ["drift_above"], ["non_ok_streak"]]
+
+        session.commit()
+        assert len(session.exec(select(AlertOutbox).where(AlertOutbox.user_id == 1)).all()) == 4
+        assert session.exec(select(AlertOutbox).where(AlertOutbox.user_id == 2)).all() == []
+
+        # A deleted rule takes its alerts with it.
+        rule = session.exec(select(AlertRule).where(AlertRule.kind == "drift_above")).one()
+        delete_rule(session, rule)
+        session.commit()
+        assert [a.kind for a in session.exec(select(AlertOutbox))] == ["non_ok_streak", "non_ok_streak"]
+
+
+def test_rule_validation():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        with pytest.raises(RuleError):
+            add_rule(session, 1, "score_below", 140)
+        with pytest.raises(RuleError):
+            add_rule(session, 1, "nope", 1)
+
+
+def test_orphan_alert_cleanup_runs_once(tmp_path):
+    import sqlite3
+
+    from db import DATA_VERSION, _ensure_columns
+
+    path = str(tmp_path / "alerts.db")
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+
+    def add_orphan():
+        with Session(engine) as session:
+            session.add(AlertOutbox(user_id=1, rule_id=99, kind="score_below", value=40, message="x"))
+            session.commit()
+
+    def outbox_rows():
+        with Session(engine) as session:
+            return len(session.exec(select(AlertOutbox)).all())
+
+    add_orphan()
+    _ensure_columns(path)
+    assert outbox_rows() == 0
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone() == (DATA_VERSION,)
+
+    # Later startups skip the scan.
+    add_orphan()
+    _ensure_columns(path)
+    assert outbox_rows() == 1
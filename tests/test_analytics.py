@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlmodel import SQLModel, create_engine
+
+import analytics
+from analytics import refresh_daily_rollups, to_csv
+from db import CheckHistory, DailyCheckRollup, HealthScoreHistory
+
+
+def add_checks(conn, when, statuses, user_id=1):
+    conn.execute(
+        insert(CheckHistory.__table__),
+        [
+            {
+                "user_id": user_id,
+                "net_income": 3000.0,
+                "fixed_expenses": 1500.0,
+                "today_expense": 40.0,
+                "days_left": 10,
+                "daily_budget": 150.0,
+                "status": status,
+                "message": "test",
+                "created_at": when,
+            }
+            for status in statuses
+        ],
+    )
+
+
+def test_daily_rollups_are_incremental():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    day1 = datetime(2026, 5, 1, 9, 0)
+    day2 = day1 + timedelta(days=1)
+    rollups = DailyCheckRollup.__table__
+
+    with engine.begin() as conn:
+        add_checks(conn, day1, ["ok", "caution", "danger"])
+        assert refresh_daily_rollups(conn, now=day1) == 1
+
+        add_checks(conn, day1 + timedelta(hours=3), ["ok"], user_id=2)
+        add_checks(conn, day2, ["danger"])
+        # The last rolled-up day is recomputed, older days are left alone.
+        assert refresh_daily_rollups(conn, now=day2) == 2
+
+        rows = conn.execute(select(rollups).order_by(rollups.c.day)).mappings().all()
+
+    assert [(r["day"], r["checks"], r["ok"], r["caution"], r["danger"], r["users"]) for r in rows] == [
+        ("2026-05-01", 4, 2, 1, 1, 2),
+        ("2026-05-02", 1, 0, 0, 1, 1),
+    ]
+    csv_text = to_csv({"daily": [dict(r) for r in rows]})
+    assert csv_text.splitlines()[1] == "2026-05-01,4,2,1,1,2"
+
+
+def add_score(conn, user_id, score, when):
+    conn.execute(
+        insert(HealthScoreHistory.__table__),
+        [{"user_id": user_id, "score": score, "label": "x", "reason": "x", "created_at": when}],
+    )
+
+
+def test_fleet_analytics_adds_up_shards_and_uses_each_users_latest_score(monkeypatch):
+    shard_a, shard_b = create_engine("sqlite://"), create_engine("sqlite://")
+    for eng in (shard_a, shard_b):
+        SQLModel.metadata.create_all(eng)
+    monkeypatch.setattr(analytics, "all_engines", lambda: [shard_a, shard_b])
+    now = datetime(2026, 5, 10, 12, 0)
+
+    with shard_a.begin() as conn:
+        # Day 7 falls outside a 3-day window ending on day 10.
+        add_checks(conn, datetime(2026, 5, 7, 9), ["danger", "danger"], user_id=1)
+        add_checks(conn, datetime(2026, 5, 8, 9), ["ok", "caution"], user_id=1)
+        add_score(conn, 1, 40, datetime(2026, 5, 7, 9))
+        add_score(conn, 1, 72, datetime(2026, 5, 8, 9))
+    with shard_b.begin() as conn:
+        add_checks(conn, datetime(2026, 5, 8, 18), ["ok"], user_id=2)
+        add_checks(conn, datetime(2026, 5, 10, 8), ["danger"], user_id=3)
+        add_score(conn, 2, 78, datetime(2026, 5, 8, 18))
+        add_score(conn, 3, 35, datetime(2026, 5, 9, 8))
+        add_score(conn, 3, 48, datetime(2026, 5, 10, 8))
+
+    result = analytics.fleet_analytics(days=3, now=now)
+
+    assert [(d["day"], d["checks"], d["users"]) for d in result["daily"]] == [("2026-05-08", 3, 2), ("2026-05-10", 1, 1)]
+    assert result["checks"] == 4
+    assert result["status_distribution"] == {"ok": 2, "caution": 1, "danger": 1}
+    assert [(b["from"], b["users"]) for b in result["score_histogram"]] == [(40, 1), (70, 2)]
+    assert (result["users_scored"], result["high_risk_users"], result["high_risk_share"]) == (3, 1, 0.3333)
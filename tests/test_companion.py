@@ -0,0 +1,36 @@
+from companion_service import CompanionContext, respond, respond_stream
+from conversation_store import ConversationStore
+
+
+def make_ctx(score=62):
+    return CompanionContext("Ann", "calm", score, "moderate", 1, 2, 3, [("Stability", "38%")])
+
+
+def test_stream_segments_join_to_reply():
+    ctx = make_ctx()
+    segments = list(respond_stream("explain score", ctx))
+    assert segments[0] == "Calm check‑in:"
+    assert len(segments) > 2
+    assert "".join(segments) == respond("explain score", ctx)
+
+
+def test_follow_up_uses_previous_topic():
+    history = [("user", "Show risk drivers"), ("assistant", "...")]
+    reply = respond("why?", make_ctx(), history)
+    assert "Fixed costs" in reply
+
+
+def test_store_ring_buffer_ttl_and_global_cap():
+    now = [0.0]
+    store = ConversationStore(max_turns=3, ttl_seconds=60, max_users=2, max_chars=1000, clock=lambda: now[0])
+    for i in range(5):
+        store.append(1, "user", f"m{i}")
+    assert [text for _, text in store.history(1)] == ["m2", "m3", "m4"]
+    assert store.chars == 6
+
+    store.append(2, "user", "hi")
+    store.append(3, "user", "hey")
+    assert len(store) == 2 and store.history(1) == []
+
+    now[0] = 120
+    assert store.history(2) == [] and len(store) == 0 and store.chars == 0
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+import dashboard_snapshot
+
+
+def test_dashboard_waits_for_an_in_flight_login_warmup():
+    future = dashboard_snapshot.begin_warmup(7)
+    assert future is not None
+    # A second login while the first warm-up runs doesn't schedule another.
+    assert dashboard_snapshot.begin_warmup(7) is None
+
+    threading.Timer(0.05, dashboard_snapshot.finish_warmup, args=(7,)).start()
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(7, timeout=2)) is True
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(7, timeout=2)) is False
+    assert dashboard_snapshot.begin_warmup(7) is not None
+    dashboard_snapshot.finish_warmup(7)
+
+
+def test_slow_warmup_does_not_hold_the_dashboard(monkeypatch):
+    monkeypatch.setattr(dashboard_snapshot, "LOGIN_WARMUP_ENABLED", True)
+    future = dashboard_snapshot.begin_warmup(8)
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(8, timeout=0.01)) is False
+    # The timed-out wait leaves the warm-up itself untouched.
+    assert not future.cancelled()
+    dashboard_snapshot.finish_warmup(8, ok=False)
+    assert future.result() is False
+
+
+def test_abandoned_warmup_claims_expire(monkeypatch):
+    monkeypatch.setattr(dashboard_snapshot, "LOGIN_WARMUP_ENABLED", True)
+    monkeypatch.setattr(dashboard_snapshot, "WARMUP_WAIT_SECONDS", 0.05)
+    # The background task never runs, so nothing calls finish_warmup.
+    abandoned = dashboard_snapshot.begin_warmup(9)
+    time.sleep(0.06)
+
+    started = time.monotonic()
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(9, timeout=2)) is False
+    assert time.monotonic() - started < 0.05
+    assert abandoned.result() is False
+    assert dashboard_snapshot.begin_warmup(9) is not None
+    dashboard_snapshot.finish_warmup(9)
+
+
+def test_switching_the_scoring_model_makes_snapshots_stale(monkeypatch):
+    from sqlmodel import SQLModel, Session, create_engine
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        snapshot = dashboard_snapshot.save_snapshot(session, 1, {"health_score": 70})
+        etag = dashboard_snapshot.snapshot_etag(snapshot)
+        assert dashboard_snapshot.is_fresh(snapshot)
+
+        monkeypatch.setattr(dashboard_snapshot.scoring_models, "SCORING_MODEL", "cautious@2")
+        assert not dashboard_snapshot.is_fresh(snapshot)
+        assert dashboard_snapshot.load_snapshot(session, 1) is None
+        snapshot = dashboard_snapshot.save_snapshot(session, 1, {"health_score": 64})
+        assert dashboard_snapshot.is_fresh(snapshot)
+        assert dashboard_snapshot.snapshot_etag(snapshot) != etag
+
+
+def test_concurrent_first_builds_do_not_collide(tmp_path):
+    from sqlmodel import SQLModel, Session, create_engine, select
+
+    from db import DashboardSnapshot
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'snap.db'}")
+    SQLModel.metadata.create_all(engine)
+    # A login warm-up and the dashboard request both build the first snapshot.
+    ready = threading.Barrier(2)
+    errors = []
+
+    def build(score: int):
+        try:
+            with Session(engine) as session:
+                ready.wait()
+                dashboard_snapshot.save_snapshot(session, 1, {"health_score": score})
+                session.commit()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=build, args=(score,)) for score in (70, 71)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with Session(engine) as session:
+        assert [s.version for s in session.exec(select(DashboardSnapshot))] == [2]
+
+
+def test_snapshots_from_an_earlier_day_rebuild():
+    from datetime import timedelta
+
+    from sqlmodel import SQLModel, Session, create_engine
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        snapshot = dashboard_snapshot.save_snapshot(session, 1, {"goals": [{"status": "on_track"}]})
+        built = snapshot.built_at.date()
+        assert dashboard_snapshot.is_fresh(snapshot, today=built)
+        # A goal can go overdue overnight without a new check.
+        assert not dashboard_snapshot.is_fresh(snapshot, today=built + timedelta(days=1))
+
+
+def test_dashboard_waits_for_a_warmup_in_another_worker(monkeypatch, tmp_path):
+    from sqlmodel import SQLModel, Session, create_engine
+
+    from db import DashboardSnapshot
+
+    monkeypatch.setattr(dashboard_snapshot, "WARMUP_POLL_SECONDS", 0.01)
+    engine = create_engine(f"sqlite:///{tmp_path / 'snap.db'}")
+    SQLModel.metadata.create_all(engine)
+
+    def reader(user_id):
+        async def read():
+            with Session(engine) as session:
+                return session.get(DashboardSnapshot, user_id)
+
+        return read
+
+    def warm():
+        with Session(engine) as session:
+            dashboard_snapshot.save_snapshot(session, 10, {"health_score": 70})
+            session.commit()
+
+    # No claim in this process: the warm-up runs in the worker that served login.
+    threading.Timer(0.05, warm).start()
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(10, timeout=2, read=reader(10))) is True
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(11, timeout=0.03, read=reader(11))) is False
+    # Without the login marker there is nothing to wait for.
+    assert asyncio.run(dashboard_snapshot.wait_for_warmup(11, timeout=2)) is False
@@ -0,0 +1,51 @@
+import io
+import json
+import zipfile
+from datetime import datetime, timedelta
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+import data_export
+from db import CheckHistory, HealthScoreHistory, User
+from history_archive import archive_user_checks
+
+
+def test_export_streams_every_table_including_archived_checks(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(data_export, "engine", engine)
+    monkeypatch.setattr(data_export, "engine_for", lambda user_id: engine)
+    monkeypatch.setattr(data_export, "EXPORT_CHUNK_ROWS", 7)
+
+    start = datetime(2025, 1, 1)
+    with Session(engine) as session:
+        session.add(User(id=1, email="a@b.com", password_hash="secret"))
+        for i in range(60):
+            session.add(
+                CheckHistory(
+                    user_id=1, net_income=3000, fixed_expenses=1500, today_expense=40 + i,
+                    days_left=10, daily_budget=150.0, status="ok", message="x",
+                    created_at=start + timedelta(days=i),
+                )
+            )
+            session.add(HealthScoreHistory(user_id=1, score=60, label="Steady", reason="x"))
+        session.commit()
+        archived = archive_user_checks(session, 1, before=start + timedelta(days=45))
+        session.commit()
+    assert archived > 0
+
+    chunks = list(data_export.iter_export(1))
+    assert len(chunks) > 1
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+    user = json.loads(archive.read("user.ndjson"))
+    assert user["email"] == "a@b.com" and "password_hash" not in user
+    checks = [json.loads(line) for line in archive.read("check_history.ndjson").splitlines()]
+    assert len(checks) == 60
+    assert sum(c["archived"] for c in checks) == archived
+    # Chronological throughout: archived months first, then the hot rows.
+    assert [c["today_expense"] for c in checks] == [40 + i for i in range(60)]
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["rows"]["health_score_history.ndjson"] == 60
+    assert data_export.export_row_count(1) == 120
@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine, select
+
+import event_log
+from db import HealthScoreHistory, ReplayCheckpoint, SpendStats, UserStreak
+
+
+def _event(user_id: int, i: int):
+    return event_log.CheckEvent(
+        user_id=user_id,
+        created_at=datetime(2026, 3, 1) + timedelta(hours=6 * i),
+        net_income=3000.0,
+        fixed_expenses=1000.0,
+        today_expense=40.0 + 25 * (i % 4),
+        daily_budget=100.0,
+        days_left=20 - i // 4,
+        status=("ok", "ok", "caution", "danger")[i % 4],
+        message="m",
+    )
+
+
+def test_append_and_read_back_across_segments(tmp_path):
+    log = event_log.EventLog(str(tmp_path), segment_bytes=200)
+    events = [_event(1 + i % 2, i) for i in range(10)]
+    for event in events:
+        log.append(event_log.encode_check(event))
+    log.close()
+
+    assert len(event_log.segments(str(tmp_path))) > 1
+    assert [event for _, event in event_log.iter_checks(str(tmp_path))] == events
+
+
+def test_torn_tail_ends_the_log_but_damage_in_the_middle_raises(tmp_path):
+    log = event_log.EventLog(str(tmp_path))
+    for i in range(3):
+        log.append(event_log.encode_check(_event(1, i)))
+    log.close()
+    path = event_log.segment_path(str(tmp_path), 0)
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00")
+    assert len(list(event_log.iter_records(str(tmp_path)))) == 3
+
+    with open(path, "r+b") as f:
+        f.seek(12)
+        f.write(b"\xff")
+    with pytest.raises(event_log.CorruptLog):
+        list(event_log.iter_records(str(tmp_path)))
+
+
+def test_replay_matches_inline_projections(tmp_path, monkeypatch):
+    import app
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(event_log, "EVENT_LOG_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(event_log, "_log", None)
+    monkeypatch.setattr(app.shards, "connection_for", lambda session: session.connection())
+    monkeypatch.setattr(app, "refresh_dashboard_snapshot", lambda session, user_id: None)
+
+    with Session(engine) as session:
+        for i in range(12):
+            event = _event(1, i)
+            app.record_check(
+                session, 1, event.net_income, event.fixed_expenses, event.today_expense,
+                event.days_left, event.daily_budget, event.status, event.message,
+            )
+            session.commit()
+        live_scores = [s.score for s in session.exec(select(HealthScoreHistory).order_by(HealthScoreHistory.id))]
+        live_spend = session.get(SpendStats, 1).model_dump(exclude={"updated_at"})
+        live_streak = session.get(UserStreak, 1).model_dump(exclude={"updated_at"})
+
+    rebuilt = create_engine(f"sqlite:///{tmp_path / 'rebuilt.db'}")
+    SQLModel.metadata.create_all(rebuilt)
+    result = event_log.replay(
+        ["scores", "spend", "streaks"], directory=str(tmp_path / "events"), batch=5,
+        engines=[rebuilt], route=lambda _user_id: rebuilt, log=lambda _msg: None,
+    )
+    assert result["events"] == 12 and result["users"] == 1
+
+    with Session(rebuilt) as session:
+        assert [s.score for s in session.exec(select(HealthScoreHistory).order_by(HealthScoreHistory.id))] == live_scores
+        assert session.get(SpendStats, 1).model_dump(exclude={"updated_at"}) == live_spend
+        assert session.get(UserStreak, 1).model_dump(exclude={"updated_at"}) == live_streak
+        assert session.get(ReplayCheckpoint, "scores+spend+streaks").events == 12
+
+
+def test_only_committed_checks_reach_the_log(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(event_log, "EVENT_LOG_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(event_log, "_log", None)
+
+    with Session(engine) as session:
+        session.connection()
+        event_log.append_on_commit(session, _event(1, 0))
+        session.rollback()
+        event_log.append_on_commit(session, _event(1, 1))
+        session.commit()
+
+    assert [event for _, event in event_log.iter_checks(str(tmp_path / "events"))] == [_event(1, 1)]
+
+
+def test_replay_refuses_history_missing_from_the_log_until_bootstrapped(tmp_path):
+    from db import CheckHistory
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    SQLModel.metadata.create_all(engine)
+    directory = str(tmp_path / "events")
+    with Session(engine) as session:
+        for i in range(6):
+            event = _event(1, i)
+            session.add(CheckHistory(**event._asdict(), overspend_ratio=0.0))
+            session.add(HealthScoreHistory(user_id=1, score=70, label="Steady", reason="r", created_at=event.created_at))
+        session.commit()
+    old = event_log.EventLog(directory)
+    old.append(event_log.encode_check(_event(1, 5)))
+    old.close()
+
+    run = dict(names=["scores"], directory=directory, engines=[engine], route=lambda _user_id: engine, log=lambda _msg: None)
+    with pytest.raises(event_log.UnloggedHistory) as exc:
+        event_log.replay(**run)
+    assert exc.value.users == [1]
+    with Session(engine) as session:
+        assert len(session.exec(select(HealthScoreHistory)).all()) == 6
+
+    result = event_log.bootstrap(directory, engines=[engine], log=lambda _msg: None)
+    assert result["events"] == 6 and result["replaced"]
+    assert [event for _, event in event_log.iter_checks(directory)] == [_event(1, i) for i in range(6)]
+    assert event_log.replay(**run)["events"] == 6
+
+
+def test_score_window_matches_a_full_rescore():
+    import random
+
+    import app
+    from history_records import HistoryRecord
+
+    rng = random.Random(7)
+    model = app.get_scoring_model()
+    window = event_log.ScoreWindow()
+    history = []
+    for _ in range(300):
+        row = (
+            rng.choice(["ok", "caution", "danger"]),
+            rng.choice([0.0, 900.0, 2400.0, rng.uniform(1000, 6000)]),
+            rng.choice([0.0, 1200.0, rng.uniform(0, 7000)]),
+            round(rng.uniform(0, 250), 2),
+            rng.choice([0.0, -15.0, 100.0, rng.uniform(10, 200)]),
+            rng.randint(0, 30),
+        )
+        window.push(event_log._window_terms(*row))
+        history.insert(0, HistoryRecord(*row))
+        score, meta = app._score_window(history[:event_log.SCORE_WINDOW], model)
+        assert window.score(model) == (score, meta["breakdown"])
+
+
+def test_checkpoint_state_round_trips_through_json(tmp_path):
+    user = event_log._new_user(3)
+    for i in range(25):
+        event = _event(3, i)
+        user.window.push(event_log._window_terms(
+            event.status, event.net_income, event.fixed_expenses, event.today_expense, event.daily_budget, event.days_left,
+        ))
+        event_log.spend_stats.observe(user.spend, event.today_expense, event.daily_budget)
+        event_log.streaks.advance(user.streak, event.status)
+        event_log.wallet_ledger.observe(
+            user.wallet, event.created_at.date(), event.net_income, event.fixed_expenses, event.today_expense, event.days_left,
+        )
+    path = str(tmp_path / "checkpoints" / "scores.json")
+    event_log._save_checkpoint(path, (2, 4096), 25, {3: user})
+
+    position, events, users = event_log._load_checkpoint(path)
+    assert (position, events) == ((2, 4096), 25)
+    loaded = users[3]
+    assert list(loaded.window.terms) == list(user.window.terms)
+    assert loaded.window.sums == user.window.sums
+    for attr in ("spend", "streak", "wallet"):
+        assert vars(getattr(loaded, attr)) == vars(getattr(user, attr))
+
+
+def test_async_commits_append_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    monkeypatch.setattr(event_log, "EVENT_LOG_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(event_log, "_log", None)
+    writers = []
+    append_checks = event_log.append_checks
+    monkeypatch.setattr(event_log, "append_checks", lambda checks: writers.append(threading.get_ident()) or append_checks(checks))
+
+    async def commit_two():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'live.db'}")
+        async with AsyncSession(engine) as session:
+            for i in range(2):
+                await session.connection()
+                event_log.append_on_commit(session.sync_session, _event(1, i))
+                await session.commit()
+        await engine.dispose()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(commit_two())
+    event_log.drain()
+    assert writers and loop_thread not in writers
+    assert [event for _, event in event_log.iter_checks(str(tmp_path / "events"))] == [_event(1, 0), _event(1, 1)]
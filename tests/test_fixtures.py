@@ -0,0 +1,73 @@
+import random
+from datetime import datetime
+
+from sqlmodel import SQLModel, Session, create_engine, select
+from sqlalchemy import func
+
+import app
+import fixtures
+from db import CheckHistory, HealthScoreHistory, Profile, SpendStats, User, UserStreak
+
+
+def test_check_rows_are_deterministic_and_varied():
+    now = datetime(2026, 3, 15)
+    rows = fixtures.check_rows(1, 90, random.Random(3), now)
+    assert rows == fixtures.check_rows(1, 90, random.Random(3), now)
+    assert [r["created_at"] for r in rows] == sorted(r["created_at"] for r in rows)
+    assert {r["status"] for r in rows} >= {"ok", "danger"}
+    assert all(1 <= r["days_left"] <= 31 for r in rows)
+
+
+def test_seeding_is_batched_idempotent_and_plan_lookup_is_read_only(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(fixtures, "engine", engine)
+    monkeypatch.setattr(fixtures.shards, "engine_for", lambda user_id: engine)
+    monkeypatch.setattr(fixtures.shards, "user_session", lambda user_id: Session(engine))
+    monkeypatch.setattr(fixtures.event_log, "EVENT_LOG_DIR", str(tmp_path / "events"))
+    monkeypatch.setattr(fixtures.event_log, "_log", None)
+    # One hash per run; the cheap scheme keeps the test fast.
+    monkeypatch.setattr(app.pwd_context, "hash", lambda password: f"hashed:{password}")
+
+    result = fixtures.seed_sandbox(5, 12, batch=2, log=lambda _msg: None)
+    assert result["users"] == 5 and result["checks"] == 60
+    assert fixtures.seed_sandbox(6, 12, batch=2, log=lambda _msg: None)["users"] == 1
+
+    assert fixtures.seed_demo(password="demo-pass") is True
+    assert fixtures.seed_demo(password="demo-pass") is False
+
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(User)).one() == 7
+        assert session.exec(select(func.count()).select_from(Profile)).one() == 7
+        assert session.exec(select(func.count()).select_from(CheckHistory)).one() == 6 * 12 + len(fixtures.DEMO_RUNS)
+        # Older scores are already folded into rollups, as record_check would have done.
+        assert session.exec(select(func.count(func.distinct(HealthScoreHistory.user_id)))).one() == 7
+        assert session.exec(select(func.count()).select_from(SpendStats)).one() == 7
+        assert session.exec(select(func.count()).select_from(UserStreak)).one() == 7
+
+        demo = session.exec(select(User).where(User.email == app.DEMO_PRO_EMAIL)).one()
+        assert app._plan_state(session, demo.id) == "pro"
+        assert not session.new and not session.dirty
+
+    # Every seeded check is in the event log, so a replay keeps these accounts' projections.
+    assert fixtures.event_log.unlogged_users(str(tmp_path / "events"), [engine]) == []
+
+
+def test_seeded_scores_match_a_replay_of_the_same_checks(tmp_path, monkeypatch):
+    event_log = fixtures.event_log
+    # Seed 29 has days where the long-run drift decides the reason.
+    rows = fixtures.check_rows(1, 40, random.Random(29), datetime(2026, 3, 15))
+    directory = str(tmp_path / "events")
+    log = event_log.EventLog(directory)
+    log.append_many([
+        event_log.encode_check(event_log.CheckEvent(*(row[name] for name in event_log.CheckEvent._fields))) for row in rows
+    ])
+    log.close()
+    engine = create_engine(f"sqlite:///{tmp_path / 'replayed.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(event_log, "compact_database", lambda conn: None)
+    event_log.replay(["scores"], directory=directory, engines=[engine], route=lambda _user_id: engine, log=lambda _msg: None)
+
+    with Session(engine) as session:
+        replayed = [(s.score, s.reason) for s in session.exec(select(HealthScoreHistory).order_by(HealthScoreHistory.id))]
+    assert [(s["score"], s["reason"]) for s in fixtures.score_rows(rows)] == replayed
@@ -0,0 +1,69 @@
+from datetime import date, datetime
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+from goals import GoalError, add_contribution, create_goal, goal_view, list_goals, rebuild_goal, record_check_goals
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_contributions_update_progress_and_forecast():
+    with _session() as session:
+        goal = create_goal(session, 1, "Laptop", 700, "2026-03-31")
+        goal.created_at = datetime(2026, 1, 1)
+        session.flush()
+
+        add_contribution(session, goal, 70, now=datetime(2026, 1, 10))
+        assert goal.saved_amount == 70 and goal.contributions == 1
+        # 70 over the first 10 days -> 7/day, 630 left -> 90 more days, past the deadline.
+        assert goal.pace_basis == "contributions"
+        assert goal.projected_date == date(2026, 4, 10)
+        assert goal.forecast_status == "behind"
+
+        add_contribution(session, goal, 630, now=datetime(2026, 1, 20))
+        view = goal_view(goal)
+        assert view["pct"] == 100 and view["status"] == "done"
+        assert view["projected_date"] == "2026-01-20"
+
+        add_contribution(session, goal, -100, now=datetime(2026, 1, 21))
+        assert goal.completed_at is None and goal.forecast_status != "done"
+        with pytest.raises(GoalError):
+            add_contribution(session, goal, -1000)
+
+        goal.saved_amount = 0
+        rebuild_goal(session, goal)
+        assert goal.saved_amount == 600 and goal.contributions == 3
+
+
+def test_checks_feed_headroom_and_forecast_is_cached():
+    with _session() as session:
+        goal = create_goal(session, 1, "Trip", 300)
+        session.flush()
+        record_check_goals(session, 1, 80, 100, today=date(2026, 2, 1))
+        assert goal.pace_basis == "headroom" and goal.pace_per_day == 20
+        assert goal.projected_date == date(2026, 2, 16)
+
+        key = goal.forecast_key
+        record_check_goals(session, 1, 80.4, 100, today=date(2026, 2, 1))
+        assert goal.checks == 2 and goal.forecast_key == key
+
+        # A new day is a new input: the forecast is recomputed on read.
+        list_goals(session, 1, today=date(2026, 2, 2))
+        assert goal.forecast_key != key
+        # 19.92/day after the second check -> 16 days.
+        assert goal.projected_date == date(2026, 2, 18)
+
+
+def test_goal_validation():
+    with _session() as session:
+        with pytest.raises(GoalError):
+            create_goal(session, 1, "", 100)
+        with pytest.raises(GoalError):
+            create_goal(session, 1, "Car", -5)
+        with pytest.raises(GoalError):
+            create_goal(session, 1, "Car", 100, "next spring")
@@ -52,3 +52,14 @@ def test_top_drivers_and_next_steps():
     steps = next_steps(meta["breakdown"])
     assert len(drivers) == 3
     assert len(steps) >= 1
+
+
+def test_history_records_score_like_orm_rows():
+    from app import compute_projection, compute_streaks
+    from history_records import HistoryRecord
+
+    history = make_history()
+    records = [HistoryRecord.from_check(h) for h in history]
+    assert compute_health_score(records) == compute_health_score(history)
+    assert compute_streaks(records) == compute_streaks(history)
+    assert compute_projection(records) == compute_projection(history)
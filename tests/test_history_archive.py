@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from db import CheckArchive, CheckHistory
+from history_archive import MIN_HOT_ROWS, archive_user_checks, iter_user_checks, pack_checks, unpack_checks
+
+
+def make_check(created_at, status="ok", today=80.5):
+    return CheckHistory(
+        user_id=1,
+        net_income=3200,
+        fixed_expenses=1900,
+        today_expense=today,
+        days_left=12,
+        daily_budget=108.25,
+        status=status,
+        message="x",
+        created_at=created_at,
+    )
+
+
+def test_pack_round_trip():
+    now = datetime(2026, 3, 4, 5, 6, 7, 8)
+    rows = [make_check(now, "ok"), make_check(now + timedelta(hours=1), "caution", 140.0)]
+    restored = unpack_checks(pack_checks(rows), user_id=1)
+    assert [r.status for r in restored] == ["ok", "caution"]
+    assert restored[0].created_at == now
+    assert restored[1].today_expense == 140.0
+    assert restored[0].daily_budget == 108.25
+
+
+def test_pack_keeps_large_amounts_to_the_cent_and_reads_old_packs(monkeypatch):
+    import history_archive
+
+    now = datetime(2026, 3, 4)
+    row = make_check(now, today=1234567.89)
+    row.net_income = 250000.01
+    restored = unpack_checks(pack_checks([row]), user_id=1)[0]
+    assert (restored.net_income, restored.today_expense) == (250000.01, 1234567.89)
+    assert restored.message == history_archive.STATUS_MESSAGES["ok"]
+
+    # A version 1 (float32) pack written before the format change.
+    monkeypatch.setattr(history_archive, "PACK_VERSION", 1)
+    old = pack_checks([make_check(now, today=80.5)])
+    monkeypatch.undo()
+    assert unpack_checks(old, user_id=1)[0].daily_budget == 108.25
+
+
+def test_archive_keeps_hot_rows_and_reads_through():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2025, 1, 1)
+    with Session(engine) as session:
+        for i in range(MIN_HOT_ROWS + 40):
+            session.add(make_check(start + timedelta(days=i)))
+        session.commit()
+
+        moved = archive_user_checks(session, 1, before=start + timedelta(days=365))
+        session.commit()
+
+        assert moved == 40
+        assert len(session.exec(select(CheckHistory)).all()) == MIN_HOT_ROWS
+        assert {a.month for a in session.exec(select(CheckArchive)).all()} == {"2025-01", "2025-02"}
+        everything = list(iter_user_checks(session, 1))
+        assert len(everything) == MIN_HOT_ROWS + 40
+        assert everything[0].created_at > everything[-1].created_at
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+from db import overspend_ratio, CheckHistory
+from history_search import HistoryFilters, search_history
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    start = datetime(2026, 3, 1, 9, 0)
+    for i in range(45):
+        today = 60.0 + (i * 17) % 90
+        session.add(
+            CheckHistory(
+                user_id=1 + i % 3 // 2,
+                net_income=3000, fixed_expenses=1500, today_expense=today, days_left=10,
+                daily_budget=100.0, status=("ok", "caution", "danger")[i % 3], message="x",
+                overspend_ratio=overspend_ratio(today, 100.0),
+                # Pairs of checks share a timestamp so the id tie-break matters.
+                created_at=start + timedelta(hours=i // 2),
+            )
+        )
+    session.commit()
+    return session
+
+
+def test_keyset_pages_cover_every_match_once():
+    with make_session() as session:
+        filters = HistoryFilters()
+        seen, cursor = [], None
+        while True:
+            page = search_history(session, 1, filters, limit=4, cursor=cursor)
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert page["total"] == len(seen) == len({c.id for c in seen})
+        keys = [(c.created_at, c.id) for c in seen]
+        assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_combine():
+    with make_session() as session:
+        filters = HistoryFilters.from_params({"status": "danger", "min_overspend": "30", "end": "2026-03-01"})
+        page = search_history(session, 2, filters)
+        assert page["items"]
+        for c in page["items"]:
+            assert c.status == "danger" and c.today_expense >= 130 and c.created_at.day == 1
+        assert page["total"] == len(page["items"])
+
+
+def test_bad_params_are_rejected():
+    with pytest.raises(ValueError):
+        HistoryFilters.from_params({"status": "great"})
+    with pytest.raises(ValueError):
+        HistoryFilters.from_params({"start": "2026-04-01", "end": "2026-03-01"})
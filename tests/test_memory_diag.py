@@ -0,0 +1,58 @@
+import tracemalloc
+
+import pytest
+
+import memory_diag
+
+
+def _allocate_lots():
+    return [bytearray(1024) for _ in range(500)]
+
+
+def test_snapshot_diff_points_at_the_allocating_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_diag, "MEMORY_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(memory_diag, "MEMORY_MAX_SNAPSHOTS", 2)
+    was_tracing = tracemalloc.is_tracing()
+    memory_diag.start_tracing(5)
+    try:
+        first = memory_diag.take_snapshot("before")
+        kept = _allocate_lots()
+        second = memory_diag.take_snapshot("after")
+        grown = memory_diag.diff(first["id"], second["id"], limit=5)
+        assert grown[0]["size_diff_bytes"] >= 500 * 1024
+        assert "test_memory_diag.py" in grown[0]["where"][0]
+        assert memory_diag.top(second["id"], limit=3)
+
+        # Only the newest snapshots stay on disk.
+        third = memory_diag.take_snapshot()
+        assert [s["id"] for s in memory_diag.snapshots()] == [second["id"], third["id"]]
+        assert len(list(tmp_path.iterdir())) == 2
+        with pytest.raises(memory_diag.MemoryDiagError):
+            memory_diag.top(first["id"])
+        del kept
+    finally:
+        if not was_tracing:
+            memory_diag.stop_tracing()
+
+
+def test_gauges_and_route_counters_export_as_metrics(monkeypatch):
+    monkeypatch.setattr(memory_diag, "MEMORY_DIAG_ENABLED", True)
+    monkeypatch.setattr(memory_diag, "_gauges", {})
+    monkeypatch.setattr(memory_diag, "_routes", {})
+    monkeypatch.setattr(memory_diag, "_watches", {})
+    memory_diag.watch("example_cache", lambda: 3)
+    memory_diag.observe_route("GET /dashboard", 2048)
+    memory_diag.observe_route("GET /dashboard", 0)
+    memory_diag.sample()
+
+    lines = memory_diag.metrics_lines()
+    assert any(line.startswith("qbc_process_rss_bytes ") and int(line.split()[1]) > 0 for line in lines)
+    assert 'qbc_gc_pending_objects{generation="2"}' in "\n".join(lines)
+    assert 'qbc_memory_watch_size{name="example_cache"} 3' in lines
+    assert 'qbc_route_net_alloc_bytes_total{route="GET /dashboard"} 2048' in lines
+    assert memory_diag.route_stats()[0]["mean_net_bytes"] == 1024
+
+
+def test_disabled_exports_nothing(monkeypatch):
+    monkeypatch.setattr(memory_diag, "MEMORY_DIAG_ENABLED", False)
+    assert memory_diag.metrics_lines() == []
@@ -0,0 +1,73 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app import analyser_depense, compute_health_score
+from history_records import HistoryRecord
+
+ROOT = Path(__file__).resolve().parent.parent
+VECTORS = json.loads((Path(__file__).parent / "quick_check_vectors.json").read_text(encoding="utf-8"))
+ENGINE = ROOT / "static" / "engines" / "quickCheckEngine.js"
+
+
+def test_python_matches_vectors():
+    for v in VECTORS["checks"]:
+        budget, status, message = analyser_depense(v["income"], v["fixed"], v["today"], v["days_left"])
+        assert budget == pytest.approx(v["daily_budget"])
+        assert (status, message) == (v["status"], v["message"])
+        score, meta = compute_health_score([HistoryRecord(status, v["income"], v["fixed"], v["today"], budget, v["days_left"])])
+        assert score == v["preview_score"]
+        assert meta["breakdown"] == v["preview_breakdown"]
+    for v in VECTORS["histories"]:
+        score, meta = compute_health_score([HistoryRecord(**row) for row in v["rows"]])
+        assert (score, meta["trend"], meta["risk"]) == (v["score"], v["trend"], v["risk"])
+        assert meta["breakdown"] == v["breakdown"]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_js_engine_matches_vectors():
+    script = f"""
+const engine = require({json.dumps(str(ENGINE))});
+const vectors = {json.dumps(VECTORS)};
+const out = {{
+  checks: vectors.checks.map((v) => engine.preview(v.income, v.fixed, v.today, v.days_left)),
+  histories: vectors.histories.map((v) => engine.healthScore(v.rows)),
+}};
+process.stdout.write(JSON.stringify(out));
+"""
+    result = json.loads(subprocess.run(["node", "-e", script], check=True, capture_output=True, text=True).stdout)
+    for v, got in zip(VECTORS["checks"], result["checks"]):
+        assert got["daily_budget"] == pytest.approx(v["daily_budget"])
+        assert (got["status"], got["message"]) == (v["status"], v["message"])
+        assert got["score"] == v["preview_score"]
+        assert got["breakdown"] == v["preview_breakdown"]
+    for v, got in zip(VECTORS["histories"], result["histories"]):
+        assert (got["score"], got["trend"], got["risk"]) == (v["score"], v["trend"], v["risk"])
+        assert got["breakdown"] == v["breakdown"]
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_js_engine_follows_the_configured_model():
+    from scoring_models import ScoringModel, client_config
+
+    model = ScoringModel(
+        "cautious", 2,
+        weights={"stability": 0.3, "acceleration": 0.1, "buffer": 0.2, "affordability": 0.1,
+                 "goal_alignment": 0.1, "consistency": 0.1, "shock": 0.1},
+        caution_credit=0.25, empty_score=50, trend_window=3,
+        bands=((80, "low", "Steady"), (60, "moderate", "Building"), (0, "high", "Alert")),
+    )
+    script = f"""
+const engine = require({json.dumps(str(ENGINE))});
+engine.configure({json.dumps(client_config(model))});
+process.stdout.write(JSON.stringify([engine.healthScore([])].concat({json.dumps(VECTORS["histories"])}.map((v) => engine.healthScore(v.rows)))));
+"""
+    result = json.loads(subprocess.run(["node", "-e", script], check=True, capture_output=True, text=True).stdout)
+    assert (result[0]["score"], result[0]["risk"]) == (50, "high")
+    for v, got in zip(VECTORS["histories"], result[1:]):
+        score, meta = compute_health_score([HistoryRecord(**row) for row in v["rows"]], model=model)
+        assert (got["score"], got["trend"], got["risk"]) == (score, meta["trend"], meta["risk"])
+        assert got["breakdown"] == meta["breakdown"]
@@ -19,3 +19,54 @@ def test_auth_required_routes_redirect():
 def test_settings_redirect():
     resp = client.get("/settings", allow_redirects=False)
     assert resp.status_code in (302, 303)
+
+
+def test_dashboard_loads_the_hydration_script_and_its_hooks(monkeypatch):
+    import app as app_module
+
+    async def empty_view(user_id):
+        return app_module.dashboard_view([], None, None, "free")
+
+    monkeypatch.setattr(app_module, "load_dashboard_view_async", empty_view)
+    client.cookies.set("qbc_auth", app_module.cookie_signer.dumps({"user_id": 1}))
+    try:
+        html = client.get("/dashboard").text
+    finally:
+        client.cookies.clear()
+    assert "/static/engines/dashboardData.js" in html
+    assert "/static/companion.js" in html and 'id="assistantThread"' in html
+    for hook in ('id="healthScore"', 'class="momentum-aura', 'class="projection-chart', 'class="streak-glow'):
+        assert hook in html
+
+
+def test_fresh_dashboard_snapshot_is_read_without_the_threadpool(tmp_path, monkeypatch):
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel import SQLModel, Session, create_engine
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    import app as app_module
+    from dashboard_snapshot import save_snapshot
+
+    path = tmp_path / "dash.db"
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        save_snapshot(session, 1, {"health_score": 70})
+        session.commit()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(app_module, "async_user_session", lambda user_id: AsyncSession(async_engine))
+
+    def no_rebuild(user_id):
+        raise AssertionError("a fresh snapshot should not be rebuilt")
+
+    monkeypatch.setattr(app_module, "_dashboard_view_for", no_rebuild)
+
+    async def load():
+        try:
+            return await app_module.load_dashboard_view_async(1)
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(load()) == {"health_score": 70}
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from db import HealthScoreHistory, ScoreRollup
+from score_series import compact_user_scores, lttb, score_series
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    return Session(engine)
+
+
+def test_lttb_keeps_endpoints_and_bound():
+    points = [(i, (i * 7) % 13) for i in range(500)]
+    sampled = lttb(points, 50, x=lambda p: p[0], y=lambda p: p[1])
+    assert len(sampled) == 50
+    assert sampled[0] == points[0]
+    assert sampled[-1] == points[-1]
+
+
+def test_compaction_rolls_scores_down_and_keeps_latest():
+    now = datetime(2026, 6, 1, 12, 0)
+    with make_session() as session:
+        for days_ago in (400, 200, 40, 10, 1):
+            session.add(
+                HealthScoreHistory(
+                    user_id=1,
+                    score=50 + days_ago % 40,
+                    label="Building",
+                    reason="test",
+                    created_at=now - timedelta(days=days_ago),
+                )
+            )
+        session.commit()
+
+        assert compact_user_scores(session, 1, now=now) > 0
+        session.commit()
+
+        raw = session.exec(select(HealthScoreHistory)).all()
+        assert [r.created_at for r in raw] == [now - timedelta(days=1)]
+        resolutions = sorted(r.resolution for r in session.exec(select(ScoreRollup)).all())
+        assert resolutions == ["day", "day", "hour", "week"]
+
+        series = score_series(session, 1, now - timedelta(days=500), now, max_points=3)
+        assert len(series) == 3
+        assert sum(p["n"] for p in series) <= 5
+
+
+def test_database_compaction_matches_the_per_user_pass():
+    from score_series import compact_database
+
+    now = datetime(2026, 6, 1, 12, 0)
+    sessions = [make_session(), make_session()]
+    for session in sessions:
+        for user_id in (1, 2, 3):
+            for days_ago in (420, 400, 200, 199.9, 40, 39.95, 10, 3, 1):
+                if user_id == 3 and days_ago < 300:
+                    continue
+                session.add(HealthScoreHistory(
+                    user_id=user_id, score=40 + (user_id * 7 + int(days_ago)) % 50, label="Building", reason="test",
+                    created_at=now - timedelta(days=days_ago),
+                ))
+        # An older hourly rollup that has since aged past its retention.
+        session.add(ScoreRollup(
+            user_id=1, resolution="hour", bucket_start=datetime(2026, 4, 1, 9), count=2, score_min=50, score_max=60, score_sum=110,
+        ))
+        session.commit()
+
+    by_user, whole = sessions
+    for user_id in (1, 2, 3):
+        compact_user_scores(by_user, user_id, now=now)
+    by_user.commit()
+    with whole.bind.begin() as conn:
+        compact_database(conn, now=now)
+
+    def state(session):
+        raw = sorted((r.user_id, r.created_at, r.score) for r in session.exec(select(HealthScoreHistory)))
+        rollups = sorted(
+            (r.user_id, r.resolution, r.bucket_start, r.count, r.score_min, r.score_max, r.score_sum)
+            for r in session.exec(select(ScoreRollup))
+        )
+        return raw, rollups
+
+    assert state(whole) == state(by_user)
+    assert len(state(whole)[0]) == 5
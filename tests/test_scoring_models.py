@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import scoring_models
+from app import compute_health_score, health_label
+from history_records import HistoryRecord
+from scoring_models import ScoreMemo, ScoringModel
+
+
+def _history():
+    return [
+        HistoryRecord("ok", 3000, 1800, 90, 100, 12),
+        HistoryRecord("caution", 3000, 1800, 140, 100, 10),
+        HistoryRecord("danger", 3000, 1800, 180, 100, 9),
+    ]
+
+
+def test_identical_inputs_are_scored_once(monkeypatch):
+    memo = ScoreMemo(size=8)
+    monkeypatch.setattr(scoring_models, "memo", memo)
+    first = compute_health_score(_history())
+    # Fresh objects with the same values hit the memo.
+    second = compute_health_score(_history())
+    assert first == second
+    assert (memo.hits, memo.misses) == (1, 1)
+
+    # Callers can't corrupt the cached result.
+    second[1]["breakdown"]["stability"] = -1
+    assert compute_health_score(_history())[1]["breakdown"]["stability"] != -1
+
+    # A different row is a different fingerprint.
+    changed = _history()
+    changed[0] = HistoryRecord("ok", 3000, 1800, None, 100, 12)
+    compute_health_score(changed)
+    assert memo.misses == 2
+
+
+def test_new_model_version_scores_separately_and_memo_is_bounded(monkeypatch):
+    memo = ScoreMemo(size=2)
+    monkeypatch.setattr(scoring_models, "memo", memo)
+    v1 = scoring_models.get_model("baseline@1")
+    with pytest.raises(ValueError):
+        scoring_models.register(ScoringModel("baseline", 2, weights={**v1.weights, "stability": 0.9}))
+
+    v2 = ScoringModel("baseline", 2, bands=((90, "low", "Great"), (0, "high", "Alert")))
+    score_v1, meta_v1 = compute_health_score(_history(), model=v1)
+    score_v2, meta_v2 = compute_health_score(_history(), model=v2)
+    # Same weights, different bands: one score, two readings of it.
+    assert score_v1 == score_v2 and (meta_v1["risk"], meta_v2["risk"]) == ("moderate", "high")
+    assert health_label(95, v1) == "Steady" and health_label(95, v2) == "Great"
+    assert memo.misses == 2
+    compute_health_score(_history()[:2], model=v1)
+    assert len(memo) == 2
+
+
+def test_models_load_from_json(tmp_path):
+    path = tmp_path / "models.json"
+    path.write_text(json.dumps([{"name": "gentle", "version": 3, "bands": [[50, "low", "Fine"], [0, "high", "Alert"]]}]))
+    try:
+        (model,) = scoring_models.load_models(str(path))
+        assert scoring_models.get_model("gentle@3") is model
+        assert model.band(60) == ("low", "Fine")
+    finally:
+        scoring_models._registry.pop("gentle@3", None)
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from sqlmodel import Session, select
+
+import shards
+from db import AlertOutbox, AlertRule, CheckHistory, Goal, GoalContribution
+
+
+def test_jump_hash_is_stable_and_moves_few_users():
+    users = range(1, 5001)
+    before = [shards.jump_hash(u, 4) for u in users]
+    after = [shards.jump_hash(u, 5) for u in users]
+    assert before == [shards.jump_hash(u, 4) for u in users]
+    assert all(0 <= s < 4 for s in before)
+    moved = [(b, a) for b, a in zip(before, after) if b != a]
+    # Growing 4 -> 5 only moves users onto the new shard, about a fifth of them.
+    assert all(a == 4 for _, a in moved)
+    assert 0.15 < len(moved) / len(before) < 0.25
+
+
+def test_move_user_copies_rows_and_repoints_children(tmp_path):
+    source = shards.make_engine(str(tmp_path / "a.db"))
+    target = shards.make_engine(str(tmp_path / "b.db"))
+    shards.migrate(source)
+    shards.migrate(target)
+    with Session(target) as session:
+        # Ids already taken on the target force the moved parents onto new ids.
+        session.add(Goal(user_id=9, name="Other", target_amount=10))
+        session.add(AlertRule(user_id=9, kind="score_below", threshold=50))
+        session.commit()
+    with Session(source) as session:
+        goal = Goal(user_id=1, name="Fund", target_amount=500, saved_amount=25)
+        rule = AlertRule(user_id=1, kind="score_below", threshold=60)
+        session.add_all([goal, rule])
+        session.flush()
+        session.add(GoalContribution(goal_id=goal.id, user_id=1, amount=25))
+        session.add(AlertOutbox(user_id=1, rule_id=rule.id, kind="score_below", value=55, message="m"))
+        session.add(CheckHistory(
+            user_id=1, net_income=3000, fixed_expenses=1000, today_expense=50, days_left=10,
+            daily_budget=200, status="ok", message="", created_at=datetime(2026, 1, 1),
+        ))
+        session.commit()
+
+    assert shards.move_user(1, source, target) == 5
+    # Nothing left to move, and the copy on the target is left alone.
+    assert shards.move_user(1, source, target) == 0
+
+    with Session(target) as session:
+        goal = session.exec(select(Goal).where(Goal.user_id == 1)).one()
+        rule = session.exec(select(AlertRule).where(AlertRule.user_id == 1)).one()
+        assert goal.id != 1 and rule.id != 1
+        assert session.exec(select(GoalContribution)).one().goal_id == goal.id
+        assert session.exec(select(AlertOutbox)).one().rule_id == rule.id
+        assert len(session.exec(select(CheckHistory)).all()) == 1
@@ -0,0 +1,29 @@
+import statistics
+
+from db import SpendStats
+from spend_stats import observe, spend_view
+
+
+def test_welford_matches_batch_statistics():
+    spends = [50, 55, 48, 52, 60, 45, 51, 49]
+    stats = SpendStats(user_id=1)
+    for spend in spends:
+        observe(stats, spend, 60.0)
+    view = spend_view(stats)
+    assert view["checks"] == len(spends)
+    assert abs(stats.spend_mean - statistics.mean(spends)) < 1e-9
+    assert abs(view["spend_std"] - round(statistics.stdev(spends), 2)) < 0.01
+    assert view["anomalies"] == 0
+
+
+def test_spike_is_flagged_against_the_users_own_normal():
+    stats = SpendStats(user_id=1)
+    for spend in [50, 55, 48, 52, 60, 45]:
+        observe(stats, spend, 60.0)
+    observe(stats, 200, 60.0)
+    assert stats.last_anomaly and stats.anomalies == 1
+    observe(stats, 58, 60.0)
+    assert not stats.last_anomaly
+    # Underspending is never an anomaly.
+    observe(stats, 0, 60.0)
+    assert not stats.last_anomaly
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from app import compute_streaks
+from db import CheckHistory
+from history_records import HistoryRecord
+from streaks import get_streaks, record_check_streak
+
+STATUSES = ["ok", "ok", "caution", "danger", "ok", "caution", "ok", "ok", "ok"]
+
+
+def test_incremental_streaks_match_full_scan():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    start = datetime(2026, 1, 1)
+    with Session(engine) as session:
+        for i, status in enumerate(STATUSES):
+            session.add(
+                CheckHistory(
+                    user_id=1,
+                    net_income=3000,
+                    fixed_expenses=1800,
+                    today_expense=90,
+                    days_left=12,
+                    daily_budget=100,
+                    status=status,
+                    message=status,
+                    created_at=start + timedelta(days=i),
+                )
+            )
+            session.flush()
+            record_check_streak(session, 1, status)
+
+        streaks = get_streaks(session, 1)
+
+    newest_first = [HistoryRecord(s, 3000, 1800, 90, 100, 12) for s in reversed(STATUSES)]
+    window = compute_streaks(newest_first)
+    assert {k: streaks[k] for k in ("stable", "adjust", "goal")} == window
+    assert streaks["best"] == {"stable": 3, "adjust": 5, "goal": 3}
+
+
+def test_first_check_reuses_a_row_another_transaction_just_created(tmp_path):
+    from datetime import date
+
+    from db import SpendStats, UserStreak, WalletLedger
+    from spend_stats import record_check_spend
+    from wallet_ledger import record_check_wallet
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'race.db'}")
+    SQLModel.metadata.create_all(engine)
+    day = datetime(2026, 1, 5)
+    rivals = {
+        UserStreak: UserStreak(user_id=1, stable_current=4, stable_best=4),
+        SpendStats: SpendStats(user_id=1),
+        WalletLedger: WalletLedger(user_id=1, period_start=date(2026, 1, 1), period_end=date(2026, 1, 31), day=date(2026, 1, 4), checks=3),
+    }
+
+    def first_check(update):
+        with Session(engine) as session:
+            get = session.get
+
+            def get_after_rival_commits(model, user_id, **kwargs):
+                # The row is missing when this session looks, then a concurrent first check commits it.
+                found = get(model, user_id, **kwargs)
+                rival = rivals.pop(model, None)
+                if rival is not None:
+                    with Session(engine) as other:
+                        other.add(rival)
+                        other.commit()
+                return found
+
+            session.get = get_after_rival_commits
+            row = update(session)
+            session.commit()
+            session.refresh(row)
+            return row
+
+    streak = first_check(lambda session: record_check_streak(session, 1, "ok"))
+    stats = first_check(lambda session: record_check_spend(session, 1, 90.0, 100.0))
+    ledger = first_check(lambda session: record_check_wallet(session, 1, day, 3000, 1800, 90, 27))
+
+    assert (streak.stable_current, streak.stable_best) == (5, 5)
+    assert stats.spend_n == 1
+    assert ledger.checks == 4
@@ -0,0 +1,41 @@
+import jinja2
+
+import template_cache
+
+
+def _env(templates: dict, bytecode_dir: str = "", size: int = 8):
+    env = template_cache.install(jinja2.Environment(loader=jinja2.DictLoader(templates)), bytecode_dir)
+    env.fragment_cache.size = size
+    return env
+
+
+def test_fragment_renders_once_per_declared_input():
+    calls = []
+    env = _env({"page.html": '{% cache "nav", active %}{{ active }}:{{ tick() }}{% endcache %}'})
+    env.globals["tick"] = lambda: calls.append(1) or len(calls)
+    page = env.get_template("page.html")
+
+    assert page.render(active="home") == "home:1"
+    assert page.render(active="home") == "home:1"
+    assert page.render(active="history") == "history:2"
+    assert env.fragment_cache.hits == 1 and env.fragment_cache.misses == 2
+
+
+def test_cache_is_bounded_and_size_zero_turns_it_off():
+    env = _env({"page.html": '{% cache "nav", n %}{{ n }}{% endcache %}'}, size=2)
+    page = env.get_template("page.html")
+    for n in range(5):
+        page.render(n=n)
+    assert len(env.fragment_cache) == 2
+
+    env.fragment_cache.clear()
+    env.fragment_cache.size = 0
+    assert page.render(n=7) == "7"
+    assert len(env.fragment_cache) == 0
+
+
+def test_compiled_templates_land_in_the_bytecode_cache(tmp_path):
+    templates = {"a.html": "{{ 1 + 1 }}", "b.html": "{% cache 'x' %}b{% endcache %}"}
+    assert template_cache.warm(_env(templates, str(tmp_path))) == 2
+    assert len(list(tmp_path.iterdir())) == 2
+    assert _env(templates, str(tmp_path)).get_template("b.html").render() == "b"
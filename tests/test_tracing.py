@@ -0,0 +1,39 @@
+import tracing
+
+
+def test_spans_are_noops_outside_a_trace():
+    assert tracing.span("db") is tracing._NOOP
+    assert tracing.traced("score")(lambda x: x + 1)(1) == 2
+
+
+def test_trace_nests_spans_and_exports(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "spans.jsonl"))
+    monkeypatch.setattr(tracing, "_exporter", None)
+
+    root = tracing.start_trace("GET /dashboard")
+    with root:
+        with tracing.span("db", statement="SELECT"):
+            pass
+        with tracing.span("render", template="dashboard.html") as render:
+            with tracing.span("db", statement="SELECT") as inner:
+                pass
+    tracing.finish_trace(root)
+
+    assert inner.parent_id == render.span_id
+    assert render.parent_id == root.span_id
+    header = root.trace.server_timing()
+    assert 'db;dur=' in header and 'desc="2x"' in header and "total;dur=" in header
+
+    for handler in list(tracing._exporter.handlers):
+        tracing._exporter.removeHandler(handler)
+        handler.close()
+    summary = tracing.summarize(str(tmp_path / "spans.jsonl"))
+    assert summary.startswith("GET /dashboard  n=1")
+    assert "render dashboard.html" in summary
+
+
+def test_unsampled_requests_are_not_traced_by_default(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    assert tracing.SERVER_TIMING_ENABLED is False
+    assert tracing.start_trace("GET /") is None
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+from sqlmodel import SQLModel, Session, create_engine
+
+from db import CheckHistory, WalletLedger
+from wallet_ledger import rebuild_ledger, record_check_wallet, wallet_view
+
+
+def _check(day: int, today: float, days_left: int, income: float = 3000):
+    return CheckHistory(
+        user_id=1,
+        net_income=income,
+        fixed_expenses=1000,
+        today_expense=today,
+        days_left=days_left,
+        daily_budget=(income - 1000) / days_left,
+        status="ok",
+        message="",
+        created_at=datetime(2026, 3, day, 12),
+    )
+
+
+def test_running_balance_with_same_day_updates_and_rollover():
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    # Mar 1-3 in a period ending Mar 20, with the Mar 2 figure corrected once,
+    # then a new pay period starting Mar 21.
+    checks = [_check(1, 50, 20), _check(2, 40, 19), _check(2, 70, 19), _check(3, 30, 18), _check(21, 10, 30)]
+    with Session(engine) as session:
+        for check in checks[:4]:
+            session.add(check)
+            session.flush()
+            ledger = record_check_wallet(
+                session, 1, check.created_at, check.net_income, check.fixed_expenses, check.today_expense, check.days_left
+            )
+
+        view = wallet_view(ledger, today=date(2026, 3, 3))
+        assert view["spent"] == 150 and view["remaining"] == 1850
+        assert view["period_end"] == "2026-03-20" and view["days_tracked"] == 3
+        # 50/day over the 17 days after Mar 3.
+        assert view["projected_end_balance"] == 1850 - 50 * 17
+
+        check = checks[4]
+        session.add(check)
+        session.flush()
+        ledger = record_check_wallet(session, 1, check.created_at, 3000, 1000, 10, 30)
+        view = wallet_view(ledger, today=date(2026, 3, 21))
+        assert view["period_start"] == "2026-03-21" and view["spent"] == 10
+        assert view["previous_period_end"] == "2026-03-20" and view["previous_remaining"] == 1850
+
+        incremental = {name: getattr(ledger, name) for name in WalletLedger.model_fields if name != "updated_at"}
+        rebuilt = rebuild_ledger(session, 1)
+        assert {name: getattr(rebuilt, name) for name in incremental} == incremental
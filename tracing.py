@@ -0,0 +1,265 @@
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+import jinja2
+from sqlalchemy import event
+
+# Fraction of requests whose spans are written to TRACE_FILE (0 disables the exporter).
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces/spans.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", "3"))
+# Traces every request and shows its timing breakdown to any client; for local profiling only.
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+_current: ContextVar = ContextVar("qbc_trace", default=None)
+_exporter = None
+
+
+class Trace:
+    __slots__ = ("trace_id", "name", "sampled", "spans", "start_ns")
+
+    def __init__(self, name: str, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.name = name
+        self.sampled = sampled
+        self.spans = []
+        self.start_ns = time.time_ns()
+
+    def server_timing(self) -> str:
+        """Span durations summed per name, e.g. `db;dur=3.1;desc="4x"`."""
+        totals = {}
+        counts = defaultdict(int)
+        for span in self.spans:
+            if span.parent_id is None:
+                continue
+            metric = span.name.split(" ", 1)[0].replace(".", "-")
+            totals[metric] = totals.get(metric, 0) + span.duration_ns
+            counts[metric] += 1
+        parts = []
+        for metric, total in totals.items():
+            entry = f"{metric};dur={total / 1e6:.1f}"
+            if counts[metric] > 1:
+                entry += f';desc="{counts[metric]}x"'
+            parts.append(entry)
+        root = next((s for s in self.spans if s.parent_id is None), None)
+        if root is not None:
+            parts.append(f"total;dur={root.duration_ns / 1e6:.1f}")
+        return ", ".join(parts)
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "attributes", "start_ns", "duration_ns", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: str | None, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.duration_ns = 0
+        self.error = None
+
+    def __enter__(self):
+        self._token = _current.set((self.trace, self.span_id))
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.time_ns() - self.start_ns
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current.reset(self._token)
+        self.trace.spans.append(self)
+        return False
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_json(self) -> dict:
+        # OpenTelemetry (OTLP/JSON) span field names.
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL" if self.parent_id else "SPAN_KIND_SERVER",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + self.duration_ns,
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """A child span of the current trace, or a shared no-op when nothing is being traced."""
+    current = _current.get()
+    if current is None:
+        return _NOOP
+    trace, parent_id = current
+    return Span(trace, name, parent_id, attributes)
+
+
+def traced(name: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_trace(name: str, **attributes):
+    """Root span for a request, or None when neither Server-Timing nor sampling wants it."""
+    sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+    if not (sampled or SERVER_TIMING_ENABLED):
+        return None
+    return Span(Trace(name, sampled), name, None, attributes)
+
+
+def finish_trace(root: Span):
+    trace = root.trace
+    if trace.sampled:
+        exporter = _get_exporter()
+        for item in trace.spans:
+            exporter.info(json.dumps(item.to_json(), separators=(",", ":")))
+
+
+def _get_exporter():
+    global _exporter
+    if _exporter is None:
+        os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+        handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        exporter = logging.getLogger("qbc.traces")
+        exporter.setLevel(logging.INFO)
+        exporter.propagate = False
+        exporter.addHandler(handler)
+        _exporter = exporter
+    return _exporter
+
+
+def instrument_engine(engine):
+    """One `db` span per statement executed on a traced request."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        current = span("db", statement=statement.split(None, 1)[0].upper() if statement else "")
+        if current is not _NOOP:
+            conn.info.setdefault("qbc_spans", []).append(current.__enter__())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("qbc_spans")
+        if stack:
+            stack.pop().__exit__(None, None, None)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        stack = context.connection.info.get("qbc_spans") if context.connection is not None else None
+        if stack:
+            error = context.original_exception
+            stack.pop().__exit__(type(error), error, None)
+
+
+class _TracedTemplate(jinja2.Template):
+    def render(self, *args, **kwargs):
+        if _current.get() is None:
+            return super().render(*args, **kwargs)
+        with span("render", template=self.name):
+            return super().render(*args, **kwargs)
+
+
+def instrument_jinja(env: jinja2.Environment):
+    env.template_class = _TracedTemplate
+
+
+def _load_spans(path: str):
+    paths = [f"{path}.{i}" for i in range(TRACE_FILE_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding="utf-8") as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def summarize(path: str = TRACE_FILE, top: int = 5) -> str:
+    """Per route: request latency and the child spans with the largest total time."""
+    spans = list(_load_spans(path))
+    routes = {s["traceId"]: s for s in spans if not s["parentSpanId"]}
+    per_route = defaultdict(lambda: {"requests": [], "children": defaultdict(list)})
+    for s in spans:
+        root = routes.get(s["traceId"])
+        if root is None:
+            continue
+        ms = (s["endTimeUnixNano"] - s["startTimeUnixNano"]) / 1e6
+        bucket = per_route[root["name"]]
+        if s is root:
+            bucket["requests"].append(ms)
+        else:
+            label = s["name"]
+            for attr in s["attributes"]:
+                if attr["key"] in ("template", "statement"):
+                    label = f"{label} {attr['value']['stringValue']}"
+            bucket["children"][label].append(ms)
+
+    lines = []
+    for route, data in sorted(per_route.items(), key=lambda kv: -max(kv[1]["requests"] or [0])):
+        reqs = sorted(data["requests"])
+        if not reqs:
+            continue
+        p95 = reqs[min(len(reqs) - 1, int(len(reqs) * 0.95))]
+        lines.append(f"{route}  n={len(reqs)}  p50={statistics.median(reqs):.1f}ms  p95={p95:.1f}ms  max={reqs[-1]:.1f}ms")
+        children = sorted(data["children"].items(), key=lambda kv: -sum(kv[1]))[:top]
+        for label, values in children:
+            lines.append(
+                f"    {label:40} total={sum(values):9.1f}ms  max={max(values):7.1f}ms  "
+                f"per-request={sum(values) / len(reqs):7.2f}ms"
+            )
+    return "\n".join(lines) or "No sampled traces."
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Inspect sampled request traces.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("summarize", help="slowest spans per route")
+    p.add_argument("--file", default=TRACE_FILE)
+    p.add_argument("--top", type=int, default=5)
+    args = parser.parse_args(argv)
+    print(summarize(args.file, top=args.top))
+
+
+if __name__ == "__main__":
+    main()
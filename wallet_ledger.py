@@ -0,0 +1,174 @@
+import argparse
+from datetime import date, datetime, timedelta
+
+from sqlmodel import Session
+
+from db import WalletLedger, insert_or_ignore
+import shards
+from history_archive import iter_user_checks
+
+# A period end that moves out by more than this is a new pay period, not a corrected check.
+ROLLOVER_SLACK_DAYS = 3
+
+
+def _period_end(day: date, days_left: int) -> date:
+    # days_left counts today.
+    return day + timedelta(days=max(1, int(days_left)) - 1)
+
+
+def _start_period(ledger: WalletLedger, day: date, period_end: date):
+    if ledger.checks:
+        ledger.previous_period_end = ledger.period_end
+        ledger.previous_remaining = round(remaining(ledger), 2)
+    ledger.period_start = day
+    ledger.period_end = period_end
+    ledger.spent_before = 0.0
+    ledger.day = day
+    ledger.day_spent = 0.0
+    ledger.days_tracked = 1
+    ledger.checks = 0
+
+
+def observe(ledger: WalletLedger, day: date, income: float, fixed: float, today: float, days_left: int):
+    """Fold one check into the running balance in O(1).
+
+    A later check on the same day replaces that day's spend rather than adding to it.
+    """
+    period_end = _period_end(day, days_left)
+    if not ledger.checks or day > ledger.period_end or (period_end - ledger.period_end).days > ROLLOVER_SLACK_DAYS:
+        _start_period(ledger, day, period_end)
+    elif day > ledger.day:
+        ledger.spent_before += ledger.day_spent
+        ledger.day = day
+        ledger.day_spent = 0.0
+        ledger.days_tracked += 1
+    elif day < ledger.day:
+        # Out-of-order replay (e.g. an archived check); count it as already spent.
+        ledger.spent_before += float(today or 0)
+        ledger.checks += 1
+        return
+    ledger.day_spent = float(today or 0)
+    ledger.period_end = period_end
+    ledger.income = float(income)
+    ledger.fixed = float(fixed)
+    ledger.days_left = int(days_left)
+    ledger.checks += 1
+    ledger.updated_at = datetime.utcnow()
+
+
+def spent(ledger: WalletLedger) -> float:
+    return ledger.spent_before + ledger.day_spent
+
+
+def remaining(ledger: WalletLedger) -> float:
+    return ledger.income - ledger.fixed - spent(ledger)
+
+
+def rebuild_ledger(session: Session, user_id: int) -> WalletLedger | None:
+    checks = [
+        (h.created_at.date(), h.net_income, h.fixed_expenses, h.today_expense, h.days_left)
+        for h in iter_user_checks(session, user_id)
+    ]
+    ledger = session.get(WalletLedger, user_id)
+    if not checks:
+        if ledger is not None:
+            session.delete(ledger)
+        return None
+    fresh = WalletLedger(user_id=user_id, period_start=checks[-1][0], period_end=checks[-1][0], day=checks[-1][0])
+    for check in reversed(checks):
+        observe(fresh, *check)
+    if ledger is None:
+        ledger = fresh
+    else:
+        for name in WalletLedger.model_fields:
+            setattr(ledger, name, getattr(fresh, name))
+    session.add(ledger)
+    return ledger
+
+
+def _placeholder(user_id: int, day: date) -> WalletLedger:
+    # Claims the row; rebuild_ledger then fills it in, or deletes it if there are no checks.
+    return WalletLedger(user_id=user_id, period_start=day, period_end=day, day=day)
+
+
+def record_check_wallet(
+    session: Session,
+    user_id: int,
+    created_at: datetime,
+    income: float,
+    fixed: float,
+    today: float,
+    days_left: int,
+) -> WalletLedger:
+    """O(1) update for a freshly inserted (and flushed) check."""
+    ledger = session.get(WalletLedger, user_id)
+    if ledger is None:
+        if insert_or_ignore(session, _placeholder(user_id, created_at.date())):
+            # First time we see this user: backfill, which already includes this check.
+            return rebuild_ledger(session, user_id)
+        # Another transaction created the row first; its backfill could not see this check.
+        ledger = session.get(WalletLedger, user_id)
+    observe(ledger, created_at.date(), income, fixed, today, days_left)
+    session.add(ledger)
+    return ledger
+
+
+def wallet_view(ledger: WalletLedger, today: date | None = None) -> dict:
+    today = today or datetime.utcnow().date()
+    spendable = ledger.income - ledger.fixed
+    spent_total = spent(ledger)
+    left = remaining(ledger)
+    daily_pace = spent_total / max(1, ledger.days_tracked)
+    # Days after the last check day that still need money this period.
+    days_after = max(0, (ledger.period_end - max(today, ledger.day)).days)
+    return {
+        "period_start": ledger.period_start.isoformat(),
+        "period_end": ledger.period_end.isoformat(),
+        "period_over": today > ledger.period_end,
+        "income": round(ledger.income, 2),
+        "fixed": round(ledger.fixed, 2),
+        "spendable": round(spendable, 2),
+        "spent": round(spent_total, 2),
+        "remaining": round(left, 2),
+        "spent_pct": min(100, max(0, int(spent_total / spendable * 100))) if spendable > 0 else 100,
+        "daily_pace": round(daily_pace, 2),
+        "projected_end_balance": round(left - daily_pace * days_after, 2),
+        "days_remaining": days_after,
+        "days_tracked": ledger.days_tracked,
+        "checks": ledger.checks,
+        "previous_period_end": ledger.previous_period_end.isoformat() if ledger.previous_period_end else None,
+        "previous_remaining": ledger.previous_remaining,
+    }
+
+
+def get_wallet(session: Session, user_id: int) -> dict | None:
+    ledger = session.get(WalletLedger, user_id)
+    if ledger is None:
+        if insert_or_ignore(session, _placeholder(user_id, datetime.utcnow().date())):
+            ledger = rebuild_ledger(session, user_id)
+        else:
+            ledger = session.get(WalletLedger, user_id)
+    return wallet_view(ledger) if ledger is not None else None
+
+
+def rebuild_all(user_id: int | None = None) -> int:
+    user_ids = [user_id] if user_id is not None else shards.user_ids()
+    for uid in user_ids:
+        with shards.user_session(uid) as session:
+            rebuild_ledger(session, uid)
+            session.commit()
+    return len(user_ids)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Maintain per-user wallet balances.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute balances from the full check history")
+    rebuild.add_argument("--user", type=int, default=None, help="only this user id")
+    args = parser.parse_args(argv)
+    if args.command == "rebuild":
+        print(f"Rebuilt wallet ledgers for {rebuild_all(args.user)} users")
+
+
+if __name__ == "__main__":
+    main()